@@ -1,24 +1,31 @@
 # app.py
 
 import os
+import hmac
 import json
+import time
 import logging
-from flask import Flask, request, jsonify, send_from_directory
+import threading
+from contextlib import contextmanager
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-from langchain.chains import LLMChain
-from langchain.prompts import (
-    ChatPromptTemplate,
-    HumanMessagePromptTemplate,
-    MessagesPlaceholder,
-)
-from langchain.schema import SystemMessage
-from langchain.memory import ConversationBufferWindowMemory
-from langchain_groq import ChatGroq
 from dotenv import load_dotenv
-import numpy as np
-import faiss
 from sentence_transformers import SentenceTransformer
-import re
+from embedding_store import load_embeddings
+from vector_index import load_search_index
+from query_cache import QueryCache
+from retrieval import create_retriever, retrieval_options
+from session_store import SessionStore
+from fake_llm import FakeStreamingChatModel
+from response_cache import SemanticResponseCache
+from prompt_builder import NOT_RELATED_RESPONSE, SYSTEM_PROMPT, PromptBuilder
+from response_format import NumberedListStreamFormatter, format_numbered_lists
+from metadata_index import validate_filters
+from suggestion_graph import SuggestionIndex, load_suggestion_graph
+from snapshot import CorpusSnapshot, SnapshotManager
+from metrics import REGISTRY, current_trace, record_stage, stage, start_trace
+from llm_gateway import LLMGateway, LLMOverloadedError, LLMTimeoutError
+from werkzeug.exceptions import BadRequest
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -26,9 +33,11 @@ logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
+# LLM_BACKEND=fake swaps Groq for a local model that streams canned tokens (no API key needed)
+llm_backend = os.getenv('LLM_BACKEND', 'groq')
 groq_api_key = os.getenv('GROQ_API_KEY')
 
-if not groq_api_key:
+if llm_backend == 'groq' and not groq_api_key:
     logger.error("Environment variable GROQ_API_KEY is missing. Please set it in your environment or .env file.")
     raise ValueError("Missing environment variable: GROQ_API_KEY")
 
@@ -36,64 +45,271 @@ if not groq_api_key:
 app = Flask(__name__)
 CORS(app)
 
-# Initialize ChatGroq model
-try:
-    model_name = 'llama3-8b-8192'
-    groq_chat = ChatGroq(groq_api_key=groq_api_key, model_name=model_name)
-    logger.info("ChatGroq model initialized successfully.")
-except Exception as e:
-    logger.error(f"Failed to initialize ChatGroq: {e}")
-    raise
-
-# Load embeddings data
-try:
-    embeddings_file = 'embeddings.json'
-    with open(embeddings_file, 'r', encoding='utf-8') as f:
-        embeddings_data = json.load(f)
-    logger.info("Embeddings data loaded successfully.")
-except FileNotFoundError:
-    logger.error(f"Embeddings file '{embeddings_file}' not found.")
-    raise
-except json.JSONDecodeError as e:
-    logger.error(f"Error decoding JSON in '{embeddings_file}': {e}")
-    raise
-
-# Initialize FAISS index
-try:
-    embedding_dim = len(embeddings_data[0]['embedding'])
-    index = faiss.IndexFlatL2(embedding_dim)
-    embedding_vectors = np.array([item['embedding'] for item in embeddings_data]).astype('float32')
-    index.add(embedding_vectors)
-    logger.info("FAISS index initialized and embeddings added.")
-except Exception as e:
-    logger.error(f"Error initializing FAISS index: {e}")
-    raise
+# Per-request metrics, exposed on /metrics; TIMING_HEADER=1 also adds a Server-Timing header to responses
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+REQUESTS = REGISTRY.counter('pai_requests', 'Requests by endpoint and how they were answered.', ('endpoint', 'outcome'))
+REQUEST_SECONDS = REGISTRY.histogram('pai_request_duration_seconds', 'Request duration by endpoint.', ('endpoint',))
+PROMPT_TOKENS = REGISTRY.histogram('pai_prompt_tokens', 'Tokens in prompts sent to the LLM.', (), buckets=TOKEN_BUCKETS)
+RESPONSE_TOKENS = REGISTRY.histogram('pai_response_tokens', 'Tokens in LLM answers.', (), buckets=TOKEN_BUCKETS)
+timing_header = os.getenv('TIMING_HEADER', '0') == '1'
+
+# Startup phases are timed; /ready reports them once warm-up has finished
+startup_timings = {}
+ready = threading.Event()
+
+@contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    yield
+    startup_timings[name] = round(time.perf_counter() - start, 3)
+    logger.info(f"Startup phase '{name}' finished in {startup_timings[name]:.2f}s.")
+
+def create_chat_model():
+    """
+    Creates the chat model. Its HTTP client must not cross a fork, so preforked
+    workers call this again in init_worker.
+    """
+    try:
+        if llm_backend == 'fake':
+            chat_model = FakeStreamingChatModel(
+                first_token_delay=float(os.getenv('FAKE_LLM_FIRST_TOKEN_DELAY', '0')),
+                token_delay=float(os.getenv('FAKE_LLM_TOKEN_DELAY', '0')),
+            )
+            logger.info("Fake streaming chat model initialized.")
+        else:
+            # Any OpenAI-compatible API; llm_stub_server.py serves one locally for testing
+            hedge_after = os.getenv('LLM_HEDGE_AFTER')
+            chat_model = LLMGateway(
+                base_url=os.getenv('LLM_BASE_URL', 'https://api.groq.com/openai/v1'),
+                api_key=groq_api_key,
+                model=os.getenv('LLM_MODEL', 'llama3-8b-8192'),
+                max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '8')),
+                max_queue=int(os.getenv('LLM_MAX_QUEUE', '32')),
+                timeout=float(os.getenv('LLM_TIMEOUT', '30')),
+                max_retries=int(os.getenv('LLM_MAX_RETRIES', '2')),
+                hedge_after=float(hedge_after) if hedge_after else None,
+            )
+            logger.info(f"LLM gateway initialized for model '{chat_model.model}' at {chat_model.base_url}.")
+        return chat_model
+    except Exception as e:
+        logger.error(f"Failed to initialize the chat model: {e}")
+        raise
+
+def configure_torch_threads():
+    """
+    Applies TORCH_THREADS to this process; torch's thread pool settings are per process.
+    """
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(int(os.getenv('TORCH_THREADS', '1')))
+
+# Initialize the chat model
+with startup_phase('chat_model'):
+    groq_chat = create_chat_model()
 
 # Load SentenceTransformer model
-try:
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    logger.info("SentenceTransformer model loaded successfully.")
-except Exception as e:
-    logger.error(f"Error loading SentenceTransformer model: {e}")
-    raise
-
-# Set up chat memory and prompts
-system_prompt = 'You are a friendly conversational chatbot only responding to AI use cases and related topics.'
-memory = ConversationBufferWindowMemory(k=5, memory_key="chat_history", return_messages=True)
-
-prompt_template = ChatPromptTemplate.from_messages([
-    SystemMessage(content=system_prompt),
-    MessagesPlaceholder(variable_name="chat_history"),
-    HumanMessagePromptTemplate.from_template("{human_input}"),
-])
-
-conversation = LLMChain(
-    llm=groq_chat,
-    prompt=prompt_template,
-    verbose=False,
-    memory=memory,
+with startup_phase('embedding_model'):
+    configure_torch_threads()
+    try:
+        embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        logger.info("SentenceTransformer model loaded successfully.")
+    except Exception as e:
+        logger.error(f"Error loading SentenceTransformer model: {e}")
+        raise
+
+# Concurrent cache misses are encoded and searched together in micro-batches
+query_batching = None
+if os.getenv('QUERY_BATCHING', '1') != '0':
+    query_batching = {
+        'max_batch_size': int(os.getenv('QUERY_BATCH_SIZE', '16')),
+        'max_wait_ms': float(os.getenv('QUERY_BATCH_WAIT_MS', '2')),
+    }
+
+# RETRIEVAL_MODE, FILTER_DETECTION and LEXICAL_* settings, shared with the batch mode of chatbot.py
+retrieval_settings = retrieval_options()
+
+def load_snapshot(version):
+    """
+    Loads one version of the corpus with the index, retriever and caches built on it.
+
+    Every snapshot gets fresh caches, so results of an old corpus are never served for a new one.
+
+    :param version: Version id from the snapshot marker (None without a marker).
+    :return: CorpusSnapshot.
+    """
+    # Load embeddings from the memory-mapped binary store (falls back to embeddings.jsonl/.json).
+    # records holds only content and metadata, so /chat and /suggestions look up text without the raw vectors;
+    # the memory-mapped matrix is only read to build small per-filter sub-indexes.
+    try:
+        embedding_vectors, records = load_embeddings('embeddings.json')
+        logger.info("Embeddings data loaded successfully.")
+    except FileNotFoundError as e:
+        logger.error(f"Embeddings file not found: {e}")
+        raise
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Error loading embeddings: {e}")
+        raise
+
+    # Initialize FAISS index
+    try:
+        index = load_search_index(embedding_vectors)
+        logger.info("FAISS index ready.")
+    except Exception as e:
+        logger.error(f"Error initializing FAISS index: {e}")
+        raise
+
+    # Query results are cached so /chat and /suggestions encode and search each message only once.
+    query_cache = QueryCache(
+        max_size=int(os.getenv('QUERY_CACHE_SIZE', '1024')),
+        ttl=float(os.getenv('QUERY_CACHE_TTL', '3600')),
+    )
+    retriever = create_retriever(
+        index, records, embedding_vectors, embedding_model, query_cache=query_cache, batching=query_batching,
+        **retrieval_settings,
+    )
+
+    # Suggestions come from a table precomputed at ingestion plus a small title-level index, without the encoder
+    suggestion_index = SuggestionIndex(
+        load_suggestion_graph(embedding_vectors, records), records, embedding_vectors,
+        min_similarity=float(os.getenv('SUGGESTION_MIN_SIMILARITY', '0.5')),
+    )
+
+    # Opt-in semantic cache of LLM answers for turns without conversation history
+    response_cache = None
+    if os.getenv('RESPONSE_CACHE', '0') == '1':
+        response_cache = SemanticResponseCache(
+            threshold=float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.95')),
+            max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '512')),
+            ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+        )
+    return CorpusSnapshot(version, records, embedding_vectors, index, retriever, suggestion_index, response_cache)
+
+# The corpus is swapped atomically when process_data.py publishes a new snapshot or /admin/reload is called
+with startup_phase('corpus'):
+    snapshots = SnapshotManager(
+        load_snapshot,
+        poll_interval=float(os.getenv('SNAPSHOT_POLL_INTERVAL', '10')),
+        retire_delay=float(os.getenv('SNAPSHOT_RETIRE_DELAY', '60')),
+        startup_timeout=float(os.getenv('SNAPSHOT_STARTUP_TIMEOUT', '300')),
+    )
+admin_token = os.getenv('ADMIN_TOKEN')
+
+@app.before_request
+def start_snapshot_watcher():
+    snapshots.ensure_watching()
+
+@app.before_request
+def start_request_trace():
+    start_trace()
+
+def endpoint_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.after_request
+def record_request_metrics(response):
+    trace = current_trace()
+    if trace is None:
+        return response
+    if timing_header:
+        response.headers['Server-Timing'] = trace.server_timing()
+    # A streamed response is still running here; its generator records the duration when it ends
+    if not response.is_streamed:
+        REQUEST_SECONDS.observe(trace.elapsed(), endpoint=endpoint_label())
+    return response
+
+# Set up per-session chat memory
+session_store = SessionStore(
+    max_sessions=int(os.getenv('SESSION_MAX', '1000')),
+    idle_ttl=float(os.getenv('SESSION_IDLE_TTL', '1800')),
+    max_messages=int(os.getenv('SESSION_MAX_MESSAGES', '20')),
+    window=5,
+    persist_path=os.getenv('SESSION_STORE_PATH') or None,
+    purge_interval=float(os.getenv('SESSION_PURGE_INTERVAL', '300')),
 )
 
+def warm_up():
+    """
+    Encodes and searches once so the first request doesn't pay for lazy initialization.
+    Runs directly on the model and index, not through the batching thread, so no
+    thread is started before a preforking server forks.
+    """
+    with startup_phase('warm_up'):
+        embedding_model.encode('AI use cases')
+        snapshots.current.warm_up()
+    ready.set()
+
+def init_worker():
+    """
+    Re-creates the state that must not be shared across fork, in a worker forked from a
+    preloaded master (see gunicorn.conf.py). The model, vectors and index stay shared copy-on-write;
+    batching and snapshot-watcher threads start by themselves on first use in each worker.
+    """
+    global groq_chat
+    ready.clear()
+    with startup_phase('worker_init'):
+        configure_torch_threads()
+        groq_chat = create_chat_model()
+        session_store.reopen()
+    logger.info(f"Worker {os.getpid()} ready.")
+    ready.set()
+
+def collect_server_metrics():
+    """
+    Reports counters the caches, batcher, session store and LLM gateway already keep, at scrape time.
+    """
+    snapshot = snapshots.current
+    caches = snapshot.caches()
+    totals = snapshots.counters()
+    families = [
+        ('pai_cache_hits', 'counter', 'Cache hits since the worker started, over every corpus snapshot.',
+         [({'cache': name}, totals['hits', name]) for name, _ in caches]),
+        ('pai_cache_misses', 'counter', 'Cache misses since the worker started, over every corpus snapshot.',
+         [({'cache': name}, totals['misses', name]) for name, _ in caches]),
+        ('pai_cache_entries', 'gauge', 'Entries held by each cache of the current corpus snapshot.',
+         [({'cache': name}, cache.stats()['size']) for name, cache in caches]),
+        ('pai_sessions', 'gauge', 'Live chat sessions in this worker.', [({}, session_store.stats()['sessions'])]),
+    ]
+    if snapshot.retriever.searcher is not None:
+        families += [
+            ('pai_batching_queue_depth', 'gauge', 'Queries waiting for the batching thread.',
+             [({}, snapshot.retriever.searcher.stats()['queue_depth'])]),
+            ('pai_batching_batches', 'counter', 'Encode/search batches run.', [({}, totals['batches', None])]),
+            ('pai_batching_queries', 'counter', 'Queries served in batches.', [({}, totals['queries', None])]),
+        ]
+    if hasattr(groq_chat, 'collect_metrics'):
+        families += groq_chat.collect_metrics()
+    return families
+
+REGISTRY.add_collector(collect_server_metrics)
+
+# Prompts carry the system prompt, this turn's retrieved context and as much history as fits the budget
+prompt_builder = PromptBuilder(
+    SYSTEM_PROMPT,
+    token_budget=int(os.getenv('PROMPT_TOKEN_BUDGET', '3000')),
+    context_budget=int(os.getenv('CONTEXT_TOKEN_BUDGET', '1200')),
+)
+
+def get_filters(data):
+    """
+    Returns the optional metadata filters of a request, e.g. {"industry": "Banking & Financial Services"}.
+    """
+    filters = data.get('filters') or None
+    if filters is None:
+        return None
+    try:
+        return validate_filters(filters)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+def get_session_id(data):
+    """
+    Returns the client's session id from the JSON body or the X-Session-Id header.
+    Clients that send neither share the 'default' session.
+    """
+    return str(data.get('session_id') or request.headers.get('X-Session-Id') or 'default')
+
 # Mapping value chain keywords to image filenames
 value_chain_images = {
     "asset reconstruction": "2.jpg",
@@ -114,43 +330,221 @@ value_chain_images = {
 def value_chain_image(filename):
     return send_from_directory('frontend/src/assets/value_chain', filename)
 
+def value_chain_reply(user_message):
+    """
+    Returns the value chain image reply if the message asks for a known value chain, else None.
+    """
+    # Explicitly check if the user is asking for a value chain
+    if "value chain" in user_message:
+        for keyword, filename in value_chain_images.items():
+            if keyword in user_message:
+                image_url = f"{request.url_root}value_chain_image/{filename}"
+                return {
+                    'response': f"Here is the {keyword.replace('_', ' ').title()} value chain.",
+                    'image': image_url
+                }
+    return None
+
+def cached_response(snapshot, history_free, query_embedding, context_ids):
+    """
+    Returns a cached LLM answer for a history-free turn, or None if caching is off or it misses.
+    Turns answered by the lexical fast path have no query embedding and are not cached.
+    """
+    if not history_free or snapshot.response_cache is None or query_embedding is None:
+        return None
+    return snapshot.response_cache.lookup(query_embedding, context_ids)
+
+def prepare_turn(snapshot, session, user_message, query_embedding, context_ids):
+    """
+    Builds the prompt for a turn and looks up a cached answer for history-free turns.
+
+    Must be called with the session lock held.
+
+    :return: Tuple of (prompt messages, usage dictionary, cached answer or None).
+    """
+    history = list(session.messages)
+    with stage('prompt'):
+        messages, usage = prompt_builder.build(user_message, history, [snapshot.records[i] for i in context_ids])
+    PROMPT_TOKENS.observe(usage['prompt_tokens'])
+    logger.info(
+        f"Prompt uses {usage['prompt_tokens']}/{usage['token_budget']} tokens "
+        f"(context {usage['context_tokens']}, history {usage['history_tokens']} "
+        f"in {usage['history_messages']} messages, {usage['history_messages_dropped']} dropped)."
+    )
+    if usage['user_message_truncated']:
+        logger.warning("User message was shortened to leave room for the retrieved context.")
+    return messages, usage, cached_response(snapshot, not history, query_embedding, context_ids)
+
+def finish_turn(snapshot, session, user_message, response, cache_key=None):
+    """
+    Records a finished turn in the session. Call with the session lock held.
+
+    :param cache_key: Optional (query embedding, context ids) under which to cache a
+        freshly generated answer of a history-free turn.
+    """
+    RESPONSE_TOKENS.observe(prompt_builder.counter.count(response))
+    session.memory.chat_memory.add_user_message(user_message)
+    session.memory.chat_memory.add_ai_message(response)
+    session_store.save(session)
+    if cache_key is not None and cache_key[0] is not None and snapshot.response_cache is not None:
+        snapshot.response_cache.store(*cache_key, response)
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
         data = request.get_json()
         user_message = data.get('message', '').strip().lower()
 
-        # Explicitly check if the user is asking for a value chain
-        if "value chain" in user_message:
-            for keyword, filename in value_chain_images.items():
-                if keyword in user_message:
-                    image_url = f"{request.url_root}value_chain_image/{filename}"
-                    return jsonify({
-                        'response': f"Here is the {keyword.replace('_', ' ').title()} value chain.",
-                        'image': image_url
-                    }), 200
+        reply = value_chain_reply(user_message)
+        if reply is not None:
+            REQUESTS.inc(endpoint='/chat', outcome='value_chain')
+            return jsonify(reply), 200
 
         # If no value chain request is detected, process as an AI use case query
-        query_embedding = embedding_model.encode(user_message).astype('float32')
-        k = 5
-        distances, indices = index.search(np.array([query_embedding]), k)
-        threshold = 0.7
-        relevant_contexts = [embeddings_data[i]['content'] for i, d in zip(indices[0], distances[0]) if d < threshold]
+        snapshot = snapshots.current
+        with stage('retrieval'):
+            query_embedding, context_ids = snapshot.retriever.relevant_ids(
+                user_message, k=5, threshold=0.7, filters=get_filters(data)
+            )
 
-        if not relevant_contexts:
-            return jsonify({'response': "This question is not related to AI use cases, so I cannot answer."}), 200
+        if not context_ids:
+            REQUESTS.inc(endpoint='/chat', outcome='not_related')
+            return jsonify({'response': NOT_RELATED_RESPONSE}), 200
 
-        context = "\n".join(relevant_contexts[:4])  # Limit to top 4
-        conversation.memory.chat_memory.add_user_message(user_message)
-        conversation.memory.chat_memory.add_ai_message(context)
+        context_ids = context_ids[:4]  # Limit to top 4
+        session = session_store.get(get_session_id(data))
 
-        response = conversation.predict(human_input=user_message)
-        return jsonify({'response': format_numbered_lists(response)}), 200
+        # Turns of one session run one at a time; other sessions proceed in parallel
+        with session.lock:
+            # Another worker may have answered or reset this session since this worker last saw it
+            session_store.refresh(session)
+            history_free = not session.messages
+            messages, usage, response = prepare_turn(snapshot, session, user_message, query_embedding, context_ids)
+            if response is None:
+                with stage('llm'):
+                    response = groq_chat.invoke(messages).content
+                finish_turn(snapshot, session, user_message, response, (query_embedding, context_ids) if history_free else None)
+                REQUESTS.inc(endpoint='/chat', outcome='llm')
+            else:
+                finish_turn(snapshot, session, user_message, response)
+                REQUESTS.inc(endpoint='/chat', outcome='cached')
+        return jsonify({
+            'response': format_numbered_lists(response),
+            'usage': {'prompt_tokens': usage['prompt_tokens']},
+        }), 200
 
+    except BadRequest as e:
+        REQUESTS.inc(endpoint='/chat', outcome='bad_request')
+        return jsonify({'error': e.description}), 400
+    except LLMOverloadedError as e:
+        logger.warning(f"Shedding /chat request: {e}")
+        REQUESTS.inc(endpoint='/chat', outcome='overloaded')
+        return jsonify({'error': 'The assistant is busy, please try again shortly.'}), 503, {'Retry-After': '1'}
+    except LLMTimeoutError as e:
+        logger.warning(f"LLM call timed out in /chat: {e}")
+        REQUESTS.inc(endpoint='/chat', outcome='timeout')
+        return jsonify({'error': 'The assistant took too long to answer.'}), 504
     except Exception as e:
         logger.exception(f"Error in /chat endpoint: {e}")
+        REQUESTS.inc(endpoint='/chat', outcome='error')
         return jsonify({'error': 'An unexpected error occurred.'}), 500
 
+def sse_event(payload, event=None):
+    """
+    Formats one server-sent event carrying a JSON payload.
+    """
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /chat: sends the answer as server-sent events while the
+    LLM generates it. Each 'data' event carries a {"token": ...} chunk of formatted
+    text; a final 'done' event carries the complete response.
+    """
+    data = request.get_json()
+    user_message = data.get('message', '').strip().lower()
+    session_id = get_session_id(data)
+    try:
+        filters = get_filters(data)
+    except BadRequest as e:
+        return jsonify({'error': e.description}), 400
+
+    trace = current_trace()
+
+    def generate():
+        outcome = 'error'
+        try:
+            reply = value_chain_reply(user_message)
+            if reply is not None:
+                outcome = 'value_chain'
+                yield sse_event({'token': reply['response']})
+                yield sse_event(reply, event='done')
+                return
+
+            snapshot = snapshots.current
+            with stage('retrieval'):
+                query_embedding, context_ids = snapshot.retriever.relevant_ids(user_message, k=5, threshold=0.7, filters=filters)
+            if not context_ids:
+                outcome = 'not_related'
+                yield sse_event({'token': NOT_RELATED_RESPONSE})
+                yield sse_event({'response': NOT_RELATED_RESPONSE}, event='done')
+                return
+
+            context_ids = context_ids[:4]  # Limit to top 4
+            session = session_store.get(session_id)
+            with session.lock:
+                session_store.refresh(session)
+                history_free = not session.messages
+                messages, usage, response = prepare_turn(snapshot, session, user_message, query_embedding, context_ids)
+                if response is not None:
+                    outcome = 'cached'
+                    yield sse_event({'token': format_numbered_lists(response)})
+                    finish_turn(snapshot, session, user_message, response)
+                else:
+                    formatter = NumberedListStreamFormatter()
+                    chunks = []
+                    llm_start = time.perf_counter()
+                    with stage('llm'):
+                        for chunk in groq_chat.stream(messages):
+                            if not chunks:
+                                record_stage('llm_first_token', time.perf_counter() - llm_start)
+                            chunks.append(chunk.content)
+                            text = formatter.feed(chunk.content)
+                            if text:
+                                yield sse_event({'token': text})
+                    text = formatter.flush()
+                    if text:
+                        yield sse_event({'token': text})
+                    response = ''.join(chunks)
+                    finish_turn(snapshot, session, user_message, response, (query_embedding, context_ids) if history_free else None)
+                    outcome = 'llm'
+            yield sse_event({
+                'response': format_numbered_lists(response),
+                'usage': {'prompt_tokens': usage['prompt_tokens']},
+            }, event='done')
+        except LLMOverloadedError as e:
+            logger.warning(f"Shedding /chat/stream request: {e}")
+            outcome = 'overloaded'
+            yield sse_event({'error': 'The assistant is busy, please try again shortly.'}, event='error')
+        except LLMTimeoutError as e:
+            logger.warning(f"LLM call timed out in /chat/stream: {e}")
+            outcome = 'timeout'
+            yield sse_event({'error': 'The assistant took too long to answer.'}, event='error')
+        except Exception as e:
+            logger.exception(f"Error in /chat/stream endpoint: {e}")
+            yield sse_event({'error': 'An unexpected error occurred.'}, event='error')
+        finally:
+            REQUESTS.inc(endpoint='/chat/stream', outcome=outcome)
+            REQUEST_SECONDS.observe(trace.elapsed(), endpoint='/chat/stream')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
 @app.route('/suggestions', methods=['POST'])
 def suggestions():
     try:
@@ -161,12 +555,10 @@ def suggestions():
         if "value chain" in user_message:
             return jsonify({'suggestions': [f"Tell me more about {keyword} value chain" for keyword in list(value_chain_images.keys())[:4]]})
         
-        # Otherwise, provide general AI use case suggestions
-        query_embedding = embedding_model.encode(user_message).astype('float32')
-        k = 5
-        distances, indices = index.search(np.array([query_embedding]), k)
-        threshold = 0.7
-        suggestions = [embeddings_data[i]['content'] for i, d in zip(indices[0], distances[0]) if d < threshold][:4]
+        # Otherwise, look up the precomputed suggestions, reusing the embedding /chat computed for free text
+        snapshot = snapshots.current
+        with stage('suggestions'):
+            suggestions = snapshot.suggestion_index.suggest(user_message, snapshot.retriever.cached_embedding(user_message))
 
         if not suggestions:
             suggestions = [
@@ -185,27 +577,60 @@ def suggestions():
 @app.route('/reset_chat', methods=['POST'])
 def reset_chat():
     try:
-        conversation.memory.chat_memory.clear()
+        data = request.get_json(silent=True) or {}
+        session_store.reset(get_session_id(data))
         logger.info("Conversation memory has been reset.")
         return jsonify({'message': 'Conversation memory has been reset.'}), 200
     except Exception as e:
         logger.error(f"Error resetting conversation memory: {e}")
         return jsonify({'error': 'Failed to reset conversation memory.'}), 500
 
+def is_admin():
+    """
+    Checks the X-Admin-Token header; admin endpoints are disabled unless ADMIN_TOKEN is set.
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(admin_token) and hmac.compare_digest(token, admin_token)
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    if not is_admin():
+        return jsonify({'error': 'Forbidden.'}), 403
+    started = snapshots.reload()
+    logger.info("Corpus reload requested." if started else "Corpus reload already in progress.")
+    return jsonify({'reload_started': started, **snapshots.status()}), 202
+
+@app.route('/admin/snapshot', methods=['GET'])
+def admin_snapshot():
+    if not is_admin():
+        return jsonify({'error': 'Forbidden.'}), 403
+    return jsonify(snapshots.status()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus scrape endpoint for this worker.
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready', methods=['GET'])
+def readiness():
+    """
+    Readiness probe: 200 once models, corpus and warm-up are done in this worker, 503 before.
+    """
+    body = {
+        'ready': ready.is_set(),
+        'pid': os.getpid(),
+        'snapshot': snapshots.current.version,
+        'startup_timings': startup_timings,
+    }
+    return jsonify(body), 200 if ready.is_set() else 503
+
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({'message': 'Flask backend is running.'}), 200
 
-def format_numbered_lists(text):
-    lines = text.split('\n')
-    formatted_lines = []
-    for line in lines:
-        match = re.match(r'^(\d+)\.\s+(.*)', line)
-        if match:
-            formatted_lines.append(f"{match[1]}. {match[2]}")
-        else:
-            formatted_lines.append(line)
-    return '\n'.join(formatted_lines)
+warm_up()
 
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5002, debug=True, use_reloader=False)
@@ -0,0 +1,514 @@
+# benchmark.py
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+import numpy as np
+
+# Dimension of all-MiniLM-L6-v2 embeddings
+BENCHMARK_DIM = 384
+
+# Corpus sizes benchmarked by default; up to 1M vectors can be requested with --sizes
+DEFAULT_SIZES = (1000, 10000)
+
+# Benchmarks that build Python entries per row (one list of floats per vector) are capped at this many rows
+DEFAULT_MAX_PIPELINE_ROWS = 20000
+
+BENCHMARKS = (
+    'process_sheet', 'generate_embeddings', 'save_embeddings', 'index_build',
+    'calculate_similarity', 'exact_search', 'retrieval', 'retrieval_hybrid', 'startup',
+)
+
+_INDUSTRIES = ['Banking & Financial Services', 'Retail', 'Pharma', 'Manufacturing', 'EV Battery', 'Payment Processing',
+               'Petroleum', 'Consumer Durables', 'Asset Management', 'Chemical Manufacturing']
+_ROLES = ['CEO', 'CFO', 'COO', 'CTO', 'Chief Risk Officer', 'Head of Operations']
+
+class StubEncoder:
+    """
+    Deterministic, offline stand-in for SentenceTransformer.
+
+    Every text maps to a fixed unit vector derived from a hash of the text, so
+    runs are reproducible and need neither the model nor a network. It measures
+    the pipeline around the encoder, not the encoder itself. Texts in ``known``
+    map to the given vectors instead, so queries can hit a synthetic corpus.
+    """
+
+    def __init__(self, dim=BENCHMARK_DIM, known=None):
+        self.dim = dim
+        self.known = known or {}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _vector(self, text):
+        if text in self.known:
+            return self.known[text]
+        seed = int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype('float32')
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        if isinstance(sentences, str):
+            return self._vector(sentences)
+        if not len(sentences):
+            return np.empty((0, self.dim), dtype='float32')
+        return np.stack([self._vector(text) for text in sentences])
+
+def _words(rng, count=2000):
+    syllables = ['ra', 'to', 'mi', 'ke', 'lu', 'sa', 'no', 'vi', 'de', 'po', 'ga', 'ti', 'ber', 'lon', 'tec', 'fin']
+    return list(dict.fromkeys(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(count)))
+
+def make_texts(n, seed=0):
+    """
+    Creates n synthetic use case sentences with a Zipf-like word distribution.
+    """
+    rng = random.Random(seed)
+    words = _words(rng)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    texts = []
+    for i in range(n):
+        body = ' '.join(rng.choices(words, weights, k=rng.randint(8, 24)))
+        texts.append(f"AI use case for {_INDUSTRIES[i % len(_INDUSTRIES)].lower()} with {body}.")
+    return texts
+
+def make_records(n, seed=0):
+    """
+    Creates n synthetic content/metadata records like those in the embedding store.
+    """
+    return [
+        {'content': text, 'metadata': {
+            'sheet_name': 'Synthetic', 'row_index': i // 3 + 1, 'industry': _INDUSTRIES[i % len(_INDUSTRIES)],
+            'role': _ROLES[i % len(_ROLES)], 'title_of_use_case': f"Use case {i // 3}",
+        }}
+        for i, text in enumerate(make_texts(n, seed))
+    ]
+
+def make_vectors(n, dim=BENCHMARK_DIM, seed=0, clusters=256, block_size=65536):
+    """
+    Creates n clustered unit vectors, generated in blocks so 1M x 384 never needs a float64 copy.
+
+    :return: float32 matrix of shape (n, dim).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype('float32')
+    vectors = np.empty((n, dim), dtype='float32')
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = centers[rng.integers(0, clusters, stop - start)]
+        block += 0.6 * rng.standard_normal(block.shape, dtype='float32')
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[start:stop] = block
+    return vectors
+
+def make_sheet(rows, seed=0):
+    """
+    Creates a synthetic workbook sheet with the columns process_sheet reads.
+    """
+    import pandas as pd
+
+    texts = make_texts(rows * 2, seed)
+    return pd.DataFrame({
+        'Sr. No.': range(1, rows + 1),
+        'Industry': [_INDUSTRIES[i % len(_INDUSTRIES)] for i in range(rows)],
+        'Role': [_ROLES[i % len(_ROLES)] for i in range(rows)],
+        'Title of the Use Case': [f"Use case {i}" for i in range(rows)],
+        'Description': [f"{texts[2 * i].capitalize()} {texts[2 * i + 1].capitalize()}" for i in range(rows)],
+        'Use Case Description': [f"Improves {_INDUSTRIES[i % len(_INDUSTRIES)].lower()} operations." for i in range(rows)],
+    })
+
+def latency_stats(latencies_ms):
+    """
+    :return: Dictionary of mean and p50/p95/p99 latency in milliseconds.
+    """
+    latencies = np.asarray(latencies_ms)
+    return {
+        'latency_ms_mean': float(latencies.mean()),
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+    }
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+@contextmanager
+def peak_memory(result, interval=0.005):
+    """
+    Samples the resident set size while the block runs and stores the peak growth
+    over the starting size in ``result['peak_memory_mb']``. Unlike tracemalloc
+    this also sees FAISS' native allocations.
+    """
+    baseline = peak = _rss_bytes()
+    stop = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not stop.wait(interval):
+            peak = max(peak, _rss_bytes())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        sampler.join()
+        peak = max(peak, _rss_bytes())
+        result['peak_memory_mb'] = round((peak - baseline) / 2**20, 2)
+
+def _timed(result, function, *args, **kwargs):
+    start = time.perf_counter()
+    with peak_memory(result):
+        value = function(*args, **kwargs)
+    result['seconds'] = time.perf_counter() - start
+    return value
+
+# Benchmarks: each takes the shared corpus and options and returns a dictionary of metrics
+
+def bench_process_sheet(corpus, args):
+    from process_data import process_sheet
+
+    rows = min(corpus['size'], args.max_pipeline_rows)
+    sheet = make_sheet(rows, args.seed)
+    result = {'rows': rows}
+    entries = _timed(result, process_sheet, 'Synthetic', sheet)
+    result.update(chunks=len(entries), rows_per_s=rows / result['seconds'], chunks_per_s=len(entries) / result['seconds'])
+    return result
+
+def bench_generate_embeddings(corpus, args):
+    from process_data import generate_embeddings
+
+    rows = min(corpus['size'], args.max_pipeline_rows)
+    entries = [dict(record) for record in corpus['records'][:rows]]
+    result = {'entries': rows}
+    _timed(result, generate_embeddings, entries, StubEncoder(args.dim), batch_size=64)
+    result['entries_per_s'] = rows / result['seconds']
+    return result
+
+def bench_save_embeddings(corpus, args):
+    from process_data import save_embeddings
+
+    rows = min(corpus['size'], args.max_pipeline_rows)
+    entries = [
+        {**record, 'embedding': vector.tolist()}
+        for record, vector in zip(corpus['records'][:rows], corpus['vectors'][:rows])
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, name) for name in ('embeddings.jsonl', 'embeddings.npy', 'embeddings_meta.json')]
+        result = {'entries': rows}
+        _timed(result, save_embeddings, entries, *paths)
+        written = sum(os.path.getsize(path) for path in paths)
+    result.update(entries_per_s=rows / result['seconds'], written_mb=written / 2**20, mb_per_s=written / 2**20 / result['seconds'])
+    return result
+
+def bench_index_build(corpus, args):
+    from vector_index import build_index, index_memory_bytes
+
+    results = {}
+    for index_type in args.index_types:
+        result = {}
+        index, config = _timed(result, build_index, corpus['vectors'], {'index_type': index_type})
+        result.update(
+            factory=config['factory'], vectors_per_s=corpus['size'] / result['seconds'],
+            index_mb=index_memory_bytes(index) / 2**20,
+        )
+        results[index_type] = result
+    return results
+
+def _query_vectors(corpus, args):
+    from vector_index import make_eval_queries
+
+    return make_eval_queries(corpus['vectors'], args.queries, args.seed)
+
+def bench_calculate_similarity(corpus, args):
+    from utils import calculate_similarity
+
+    queries = _query_vectors(corpus, args)[:max(args.queries // 10, 5)]
+    latencies = []
+    result = {'queries': len(queries)}
+    started = time.perf_counter()
+    with peak_memory(result):
+        for query in queries:
+            start = time.perf_counter()
+            calculate_similarity(query, corpus['vectors'])
+            latencies.append((time.perf_counter() - start) * 1000)
+    result['seconds'] = time.perf_counter() - started
+    result.update(latency_stats(latencies))
+    result['queries_per_s'] = 1000 / result['latency_ms_mean']
+    return result
+
+def bench_exact_search(corpus, args):
+    from utils import ExactSearch
+
+    queries = _query_vectors(corpus, args)
+    result = {'queries': len(queries)}
+    latencies = []
+    started = time.perf_counter()
+    with peak_memory(result):
+        engine = ExactSearch(corpus['vectors'], metric='cosine')
+        result['build_seconds'] = time.perf_counter() - started
+        for query in queries:
+            start = time.perf_counter()
+            engine.search(query, 5)
+            latencies.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        engine.search(queries, 5)
+        result['batched_queries_per_s'] = len(queries) / (time.perf_counter() - start)
+    result['seconds'] = time.perf_counter() - started
+    result.update(latency_stats(latencies))
+    return result
+
+def _bench_retriever(corpus, args, lexical):
+    from query_cache import QueryCache
+    from retrieval import Retriever
+    from vector_index import build_index
+
+    index, _ = build_index(corpus['vectors'])
+    # Half the queries are corpus texts (hits), half are random words (mostly misses).
+    # The cache is bypassed so every query is encoded and searched.
+    rng = random.Random(args.seed)
+    sampled = rng.sample(range(corpus['size']), min(args.queries // 2, corpus['size']))
+    known = {corpus['records'][i]['content'].lower(): corpus['vectors'][i] for i in sampled}
+    words = [word for record in corpus['records'][:1000] for word in record['content'].split()[4:]]
+    queries = list(known) + [' '.join(rng.sample(words, rng.randint(1, 6))) for _ in range(args.queries - len(known))]
+    rng.shuffle(queries)
+    result = {}
+    latencies, hits = [], 0
+    started = time.perf_counter()
+    with peak_memory(result):
+        lexical_searcher = None
+        if lexical:
+            from lexical_index import BM25Index, LexicalSearcher, build_lexical_index
+
+            lexical_searcher = LexicalSearcher(BM25Index(build_lexical_index(corpus['records'])))
+            result['lexical_build_seconds'] = time.perf_counter() - started
+        retriever = Retriever(
+            index, corpus['records'], StubEncoder(args.dim, known), QueryCache(max_size=1, ttl=None),
+            lexical_searcher=lexical_searcher, hybrid=lexical, vectors=corpus['vectors'],
+        )
+        for query in queries:
+            start = time.perf_counter()
+            _, ids = retriever.relevant_ids(query, k=5, threshold=0.7)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += bool(ids)
+    result['seconds'] = time.perf_counter() - started
+    result.update(latency_stats(latencies), queries=len(queries), hit_rate=hits / len(queries))
+    result['queries_per_s'] = 1000 / result['latency_ms_mean']
+    return result
+
+def bench_retrieval(corpus, args):
+    return _bench_retriever(corpus, args, lexical=False)
+
+def bench_retrieval_hybrid(corpus, args):
+    if corpus['size'] > args.max_pipeline_rows:
+        return None
+    return _bench_retriever(corpus, args, lexical=True)
+
+def bench_startup(corpus, args):
+    """
+    Times a cold start in a fresh interpreter: loading the store and index and answering one search.
+    """
+    from vector_index import build_index, save_index
+
+    with tempfile.TemporaryDirectory() as directory:
+        np.save(os.path.join(directory, 'embeddings.npy'), corpus['vectors'])
+        with open(os.path.join(directory, 'embeddings_meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(corpus['records'], f)
+        index, config = build_index(corpus['vectors'])
+        save_index(index, config, os.path.join(directory, 'embeddings.index'), os.path.join(directory, 'embeddings_index.json'))
+        del index
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--startup-probe', directory],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_seconds'] = time.perf_counter() - start
+    return result
+
+def startup_probe(directory):
+    """
+    Runs in the child process of bench_startup and prints its timings as JSON.
+    """
+    start = time.perf_counter()
+    from embedding_store import load_embeddings
+    from vector_index import load_search_index
+    imported = time.perf_counter()
+    os.chdir(directory)
+    result = {}
+    with peak_memory(result):
+        vectors, records = load_embeddings()
+        index = load_search_index(vectors)
+        loaded = time.perf_counter()
+        index.search(np.ascontiguousarray(vectors[:1]), 5)
+    ready = time.perf_counter()
+    import resource
+    print(json.dumps({
+        'import_seconds': imported - start,
+        'load_seconds': loaded - imported,
+        'first_search_seconds': ready - loaded,
+        'seconds': ready - start,
+        'peak_memory_mb': result['peak_memory_mb'],
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+# Results and baseline comparison
+
+# Absolute changes below these are noise, whatever their relative size (e.g. 0.04 -> 0.16 MB)
+_NOISE_FLOORS = (('_mb', 1.0), ('latency_ms', 0.05), ('seconds', 0.005))
+
+def _noise_floor(metric):
+    return next((floor for marker, floor in _NOISE_FLOORS if marker in metric), 0.0)
+
+def _higher_is_better(metric):
+    return metric.endswith('_per_s') or metric == 'hit_rate'
+
+def _is_compared(metric, value):
+    return isinstance(value, (int, float)) and (
+        _higher_is_better(metric) or 'seconds' in metric or metric.startswith('latency_ms') or metric.endswith('_mb')
+    )
+
+def flatten_results(results):
+    """
+    Flattens a results document to {(benchmark, size, variant, metric): value}.
+    """
+    flat = {}
+    for row in results['results']:
+        for metric, value in row['metrics'].items():
+            flat[(row['benchmark'], row['size'], row.get('variant'), metric)] = value
+    return flat
+
+def compare_results(current, baseline, tolerance=0.2):
+    """
+    Compares metrics with a baseline results document.
+
+    :param current: Results of this run.
+    :param baseline: Results of the baseline run.
+    :param tolerance: Relative change tolerated before a metric counts as a regression; changes
+        below a per-unit noise floor never count.
+    :return: List of comparison rows (benchmark, size, variant, metric, baseline, current, change, regression).
+    """
+    rows = []
+    base = flatten_results(baseline)
+    for key, value in flatten_results(current).items():
+        previous = base.get(key)
+        if previous is None or not _is_compared(key[3], value) or not previous:
+            continue
+        change = (value - previous) / abs(previous)
+        worse = -change if _higher_is_better(key[3]) else change
+        rows.append((*key, previous, value, change, worse > tolerance and abs(value - previous) > _noise_floor(key[3])))
+    return rows
+
+def environment():
+    import faiss
+
+    return {
+        'python': platform.python_version(), 'numpy': np.__version__, 'faiss': getattr(faiss, '__version__', None),
+        'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'timestamp': time.time(),
+    }
+
+def run_benchmarks(args):
+    """
+    Runs the selected benchmarks for every corpus size.
+
+    :return: Results document with 'environment', 'options' and 'results'.
+    """
+    rows = []
+    for size in args.sizes:
+        logging.info(f"Building synthetic corpus of {size} x {args.dim}...")
+        corpus = {'size': size, 'vectors': make_vectors(size, args.dim, args.seed), 'records': make_records(size, args.seed)}
+        for name in args.benchmarks:
+            logging.info(f"Running {name} on {size} vectors...")
+            metrics = globals()[f"bench_{name}"](corpus, args)
+            if metrics is None:
+                logging.info(f"Skipped {name} on {size} vectors (above --max-pipeline-rows).")
+                continue
+            variants = metrics.items() if name == 'index_build' else [(None, metrics)]
+            for variant, values in variants:
+                rows.append({'benchmark': name, 'size': size, 'variant': variant, 'metrics': values})
+                summary = ', '.join(f"{metric}={value:.4g}" for metric, value in values.items() if _is_compared(metric, value))
+                logging.info(f"  {name}{f'[{variant}]' if variant else ''} @ {size}: {summary}")
+    options = {'sizes': args.sizes, 'dim': args.dim, 'queries': args.queries, 'seed': args.seed,
+               'max_pipeline_rows': args.max_pipeline_rows, 'index_types': args.index_types}
+    return {'environment': environment(), 'options': options, 'results': rows}
+
+def parse_args(argv=None):
+    """
+    Parses command line options for the benchmark run.
+
+    :param argv: Optional list of arguments (defaults to sys.argv).
+    :return: Parsed argparse namespace.
+    """
+    parser = argparse.ArgumentParser(description="Offline benchmarks of ingestion, indexing and retrieval on synthetic corpora.")
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=list(DEFAULT_SIZES),
+                        help="Comma-separated corpus sizes, e.g. 1000,100000,1000000.")
+    parser.add_argument('--dim', type=int, default=BENCHMARK_DIM, help="Vector dimension.")
+    parser.add_argument('--benchmarks', type=lambda value: value.split(','), default=list(BENCHMARKS),
+                        help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}.")
+    parser.add_argument('--index-types', type=lambda value: value.split(','), default=['flat', 'hnsw'],
+                        help="Index types built by index_build.")
+    parser.add_argument('--queries', type=int, default=200, help="Queries per latency benchmark.")
+    parser.add_argument('--max-pipeline-rows', type=int, default=DEFAULT_MAX_PIPELINE_ROWS,
+                        help="Row cap of the benchmarks that hold one Python entry per vector.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the synthetic corpora.")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON results.")
+    parser.add_argument('--baseline', help="Results file to compare against.")
+    parser.add_argument('--save-baseline', help="Also write the results to this baseline file.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Relative change tolerated before a metric counts as a regression.")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Exit with status 1 when a metric regressed.")
+    parser.add_argument('--startup-probe', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmarks {sorted(unknown)}. Expected some of {list(BENCHMARKS)}.")
+    return args
+
+def main(argv=None):
+    """
+    Runs the benchmarks, writes the results and compares them with a baseline.
+
+    :param argv: Optional list of command line arguments.
+    :return: Process exit status.
+    """
+    args = parse_args(argv)
+    if args.startup_probe:
+        startup_probe(args.startup_probe)
+        return 0
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    results = run_benchmarks(args)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logging.info(f"Wrote benchmark results to '{path}'.")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare_results(results, baseline, args.tolerance)
+    regressions = [row for row in rows if row[-1]]
+    for name, size, variant, metric, previous, value, change, regressed in rows:
+        label = f"{name}[{variant}]" if variant else name
+        logging.info(f"{'REGRESSION ' if regressed else ''}{label} @ {size} {metric}: {previous:.4g} -> {value:.4g} ({change:+.1%})")
+    logging.info(f"{len(regressions)} of {len(rows)} compared metrics regressed beyond {args.tolerance:.0%}.")
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 import os
 import json
+import time
+import asyncio
+import argparse
 import logging
 from langchain.chains import LLMChain
 from langchain_core.prompts import (
@@ -12,10 +15,268 @@ from langchain.chains.conversation.memory import ConversationBufferWindowMemory
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 import numpy as np
-import faiss
 from sentence_transformers import SentenceTransformer
+from embedding_store import load_embeddings
+from vector_index import load_search_index
+from prompt_builder import NOT_RELATED_RESPONSE, SYSTEM_PROMPT, PromptBuilder
+from query_cache import QueryCache
+from retrieval import create_retriever, retrieval_options
 
-def main():
+# Fields tried, in order, for the query text and id of an input line
+QUERY_FIELDS = ('message', 'query', 'question', 'title')
+ID_FIELDS = ('id', 'request_id', 'query_id')
+
+def read_queries(input_file, field=None):
+    """
+    Reads queries from a JSONL file; lines may also be plain JSON strings.
+
+    :param input_file: Path of the input JSONL file.
+    :param field: Field holding the query text; by default the first of QUERY_FIELDS present.
+    :return: List of (query id, query text) tuples. Lines without an id are numbered.
+    """
+    queries = []
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {'message': item}
+            fields = (field,) if field else QUERY_FIELDS
+            text = next((item[name] for name in fields if item.get(name)), None)
+            if text is None:
+                logging.warning(f"Line {line_number} of '{input_file}' has no query text, skipping it.")
+                continue
+            query_id = next((item[name] for name in ID_FIELDS if item.get(name) is not None), f"line-{line_number}")
+            queries.append((str(query_id), str(text)))
+    return queries
+
+def completed_ids(output_file, require_response=True):
+    """
+    Returns the ids already answered in an output file, so an interrupted run can resume.
+    Lines with an error, and a line cut off by a crash, count as not done.
+
+    :param output_file: Path of the output JSONL file.
+    :param require_response: Count only lines with an LLM response, so rows of a --no-llm
+        run are answered again by a run with the LLM.
+    :return: Set of query ids.
+    """
+    done = set()
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'error' not in result and (not require_response or 'response' in result):
+                    done.add(result['id'])
+    except FileNotFoundError:
+        pass
+    return done
+
+def open_for_append(output_file):
+    """
+    Opens the output file for appending, terminating a line left incomplete by a crash.
+    """
+    f = open(output_file, 'a+', encoding='utf-8')
+    if f.tell():
+        f.seek(f.tell() - 1)
+        if f.read(1) != '\n':
+            f.write('\n')
+    return f
+
+def retrieve_batch(queries, retriever, k, threshold, encode_batch_size):
+    """
+    Retrieves the context of a batch of queries like the server's /chat, encoding them in one
+    model call and searching them in one index search.
+
+    :param queries: List of (query id, query text) tuples.
+    :param retriever: Retriever over the corpus.
+    :return: List of (query id, query text, relevant record ids), in input order.
+    """
+    texts = [query.strip().lower() for _, query in queries]
+    # The threshold, detected filters and BM25 fusion are then applied per query to the cached results
+    retriever.search_queries(texts, k, encode_batch_size)
+    retrieved = []
+    for (query_id, _), text in zip(queries, texts):
+        _, ids = retriever.relevant_ids(text, k, threshold)
+        retrieved.append((query_id, text, ids[:4]))
+    return retrieved
+
+async def answer_query(chat_model, semaphore, prompt_builder, records, retrieved):
+    """
+    Builds the prompt for one retrieved query and asks the LLM, at most ``semaphore`` calls at a time.
+
+    :return: Result dictionary written to the output file.
+    """
+    query_id, text, context_ids = retrieved
+    result = {'id': query_id, 'query': text, 'context_ids': context_ids}
+    if not context_ids:
+        result['response'] = NOT_RELATED_RESPONSE
+        return result
+    messages, usage = prompt_builder.build(text, (), [records[i] for i in context_ids])
+    result['prompt_tokens'] = usage['prompt_tokens']
+    if chat_model is None:
+        return result
+    async with semaphore:
+        try:
+            if hasattr(chat_model, 'achat'):
+                result['response'] = await chat_model.achat(messages)
+            else:
+                result['response'] = (await asyncio.to_thread(chat_model.invoke, messages)).content
+        except Exception as e:
+            logging.error(f"Query {query_id} failed: {e!r}")
+            result['error'] = repr(e)
+    return result
+
+async def process_batches(queries, output, retriever, records, chat_model, args):
+    """
+    Runs the queries through retrieval and the LLM, batch by batch.
+
+    Retrieval of the next batch runs in a thread while the LLM calls of the
+    current one are in flight, so the encoder and the API are busy at the same time.
+    Results are written and flushed as they complete.
+
+    :return: Tuple of (number answered, number failed).
+    """
+    prompt_builder = PromptBuilder(SYSTEM_PROMPT)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    batches = [queries[start:start + args.batch_size] for start in range(0, len(queries), args.batch_size)]
+    answered = failed = 0
+    started = time.perf_counter()
+
+    def retrieve(batch):
+        return asyncio.to_thread(retrieve_batch, batch, retriever, args.k, args.threshold, args.encode_batch_size)
+
+    next_retrieval = asyncio.ensure_future(retrieve(batches[0])) if batches else None
+    for number, batch in enumerate(batches, 1):
+        retrieved = await next_retrieval
+        if number < len(batches):
+            next_retrieval = asyncio.ensure_future(retrieve(batches[number]))
+        tasks = [answer_query(chat_model, semaphore, prompt_builder, records, item) for item in retrieved]
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            if 'error' in result:
+                failed += 1
+            else:
+                answered += 1
+        output.flush()
+        elapsed = time.perf_counter() - started
+        logging.info(
+            f"Batch {number}/{len(batches)} done: {answered + failed} queries in {elapsed:.1f}s "
+            f"({(answered + failed) / elapsed:.1f} queries/s, {failed} failed)."
+        )
+    return answered, failed
+
+def create_batch_chat_model(concurrency):
+    """
+    Creates the LLM client for batch mode: the server's LLM gateway, or the fake model with LLM_BACKEND=fake.
+    """
+    if os.getenv('LLM_BACKEND', 'groq') == 'fake':
+        from fake_llm import FakeStreamingChatModel
+        return FakeStreamingChatModel()
+    from llm_gateway import LLMGateway
+    groq_api_key = os.getenv('GROQ_API_KEY')
+    if not groq_api_key:
+        raise ValueError("GROQ_API_KEY not found in environment variables.")
+    return LLMGateway(
+        base_url=os.getenv('LLM_BASE_URL', 'https://api.groq.com/openai/v1'),
+        api_key=groq_api_key,
+        model=os.getenv('LLM_MODEL', 'llama3-8b-8192'),
+        max_concurrency=concurrency,
+        max_queue=concurrency,
+        timeout=float(os.getenv('LLM_TIMEOUT', '30')),
+        max_retries=int(os.getenv('LLM_MAX_RETRIES', '2')),
+    )
+
+def run_batch(args):
+    """
+    Answers every query of a JSONL file and appends the results to a JSONL file.
+
+    Queries whose id already has a result in the output file are skipped, so a
+    run that was interrupted continues where it stopped.
+
+    :param args: Parsed command line options.
+    """
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+
+    queries = read_queries(args.batch, args.field)
+    done = completed_ids(args.output, require_response=not args.no_llm)
+    pending = [(query_id, text) for query_id, text in queries if query_id not in done]
+    logging.info(f"{len(queries)} queries read, {len(queries) - len(pending)} already answered, {len(pending)} to go.")
+    if args.limit:
+        pending = pending[:args.limit]
+    if not pending:
+        return
+
+    embedding_vectors, records = load_embeddings('embeddings.json')
+    index = load_search_index(embedding_vectors)
+    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+    # Same filter detection and BM25 settings as the server, so results match its /chat
+    # Room for every query of a batch, searched with and without the filters detected in it
+    query_cache = QueryCache(max_size=max(2 * args.batch_size, 1024), ttl=None)
+    retriever = create_retriever(
+        index, records, embedding_vectors, embedding_model, query_cache=query_cache, **retrieval_options(),
+    )
+    chat_model = None if args.no_llm else create_batch_chat_model(args.concurrency)
+
+    async def run():
+        try:
+            return await process_batches(pending, output, retriever, records, chat_model, args)
+        finally:
+            if hasattr(chat_model, 'aclose'):
+                await chat_model.aclose()
+
+    with open_for_append(args.output) as output:
+        answered, failed = asyncio.run(run())
+    logging.info(f"Batch run finished: {answered} answered, {failed} failed; results in '{args.output}'.")
+
+def parse_args(argv=None):
+    """
+    Parses command line options; without --batch the chatbot runs interactively.
+
+    :param argv: Optional list of arguments (defaults to sys.argv).
+    :return: Parsed argparse namespace.
+    """
+    parser = argparse.ArgumentParser(description="Chat with the AI use case bot, or answer a file of queries in batch.")
+    parser.add_argument('--batch', metavar='INPUT_JSONL',
+                        help="Answer the queries in this JSONL file instead of chatting.")
+    parser.add_argument('--output', default='batch_results.jsonl',
+                        help="Batch mode: JSONL file results are appended to; existing results are skipped.")
+    parser.add_argument('--field', default=None,
+                        help=f"Batch mode: field holding the query (default: first of {', '.join(QUERY_FIELDS)}).")
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help="Batch mode: queries retrieved per batch.")
+    parser.add_argument('--encode-batch-size', type=int, default=64,
+                        help="Batch mode: sentences per model forward pass.")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="Batch mode: maximum concurrent LLM calls.")
+    parser.add_argument('--k', type=int, default=5,
+                        help="Batch mode: neighbours searched per query.")
+    parser.add_argument('--threshold', type=float, default=0.7,
+                        help="Batch mode: maximum L2 distance of relevant context.")
+    parser.add_argument('--no-llm', action='store_true',
+                        help="Batch mode: only retrieve and build prompts, without calling the LLM.")
+    parser.add_argument('--limit', type=int, default=0,
+                        help="Batch mode: answer at most this many pending queries.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Runs batch mode with --batch, the interactive chat otherwise.
+
+    :param argv: Optional list of command line arguments.
+    """
+    args = parse_args(argv)
+    if args.batch:
+        run_batch(args)
+    else:
+        chat_loop()
+
+def chat_loop():
     """
     This function sets up the Groq client, initializes embeddings, and handles the chat interaction via the terminal.
     """
@@ -54,26 +315,16 @@ def main():
 
     # -------------------- Load Embeddings and Initialize FAISS --------------------
     try:
-        with open('embeddings.json', 'r', encoding='utf-8') as f:
-            embeddings_data = json.load(f)
-        logger.debug("Successfully loaded embeddings.json.")
+        embedding_vectors, records = load_embeddings('embeddings.json')
+        logger.debug("Successfully loaded embeddings.")
     except FileNotFoundError:
-        logger.error("embeddings.json not found. Please ensure it exists.")
+        logger.error("No embeddings found. Please run process_data.py first.")
         raise
 
-    if not embeddings_data:
-        logger.error("embeddings.json is empty. Please ensure it contains embeddings.")
-        raise ValueError("No embeddings found in 'embeddings.json'.")
-
-    # Extract embedding dimensions
-    embedding_dim = len(embeddings_data[0]['embedding'])  # Assumes all embeddings have the same dimension
-
     # Initialize FAISS index
     try:
-        index = faiss.IndexFlatL2(embedding_dim)
-        embedding_vectors = np.array([item['embedding'] for item in embeddings_data]).astype('float32')
-        index.add(embedding_vectors)
-        logger.debug("FAISS index successfully built and embeddings added.")
+        index = load_search_index(embedding_vectors)
+        logger.debug("FAISS index ready.")
     except Exception as e:
         logger.exception("Error building FAISS index.")
         raise
@@ -127,7 +378,7 @@ def main():
                 # Perform similarity search
                 k = 5  # Number of nearest neighbors
                 D, I = index.search(np.array([query_embedding]), k)
-                context = "\n".join([embeddings_data[i]['content'] for i in I[0]])
+                context = "\n".join([records[i]['content'] for i in I[0]])
                 logger.debug(f"Similarity search results: Indices {I[0]}, Distances {D[0]}")
                 logger.debug(f"Context for prompt: {context}")
             except Exception as e:
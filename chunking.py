@@ -0,0 +1,178 @@
+# chunking.py
+
+import re
+import logging
+import numpy as np
+import faiss
+from nltk.tokenize import sent_tokenize
+
+# Ways of cutting a row's text into the chunks that get embedded
+CHUNKING_STRATEGIES = ('sentence', 'use_case', 'window')
+
+DEFAULT_CHUNKING = {
+    'strategy': 'sentence',
+    'window_tokens': 96,    # window: words per chunk
+    'window_overlap': 24,   # window: words shared by consecutive chunks
+    'min_tokens': 1,        # shorter fragments are merged into a neighbour, or dropped if alone (1 keeps all)
+}
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_punkt_missing = False
+
+def split_sentences(text):
+    """
+    Splits text into sentences with NLTK's punkt tokenizer.
+
+    When the punkt data isn't installed (e.g. an offline benchmark run) the text is
+    split after '.', '!' and '?' instead, with one warning per process; run
+    setup_nltk.py to install the tokenizer.
+    """
+    global _punkt_missing
+    if not _punkt_missing:
+        try:
+            return sent_tokenize(text)
+        except LookupError:
+            _punkt_missing = True
+            logging.warning("NLTK punkt data is not installed; splitting sentences on punctuation instead.")
+    return _SENTENCE_END.split(text)
+
+def _token_count(text):
+    return len(text.split())
+
+def _merge_short(chunks, min_tokens):
+    """
+    Merges fragments shorter than min_tokens words into the following chunk (or
+    the previous one at the end of a row); a row made only of such fragments is dropped.
+    """
+    merged = []
+    pending = ''
+    for chunk in chunks:
+        chunk = f"{pending} {chunk}".strip() if pending else chunk
+        if _token_count(chunk) < min_tokens:
+            pending = chunk
+            continue
+        merged.append(chunk)
+        pending = ''
+    if pending and merged:
+        merged[-1] = f"{merged[-1]} {pending}"
+    return merged
+
+def _windows(text, window_tokens, window_overlap):
+    words = text.split()
+    if len(words) <= window_tokens:
+        return [' '.join(words)]
+    stride = max(window_tokens - window_overlap, 1)
+    starts = range(0, len(words) - window_overlap, stride)
+    return [' '.join(words[start:start + window_tokens]) for start in starts]
+
+def chunk_text(text, strategy='sentence', window_tokens=96, window_overlap=24, min_tokens=1):
+    """
+    Cuts the text of one row into chunks.
+
+    :param text: Combined content of a row.
+    :param strategy: 'sentence' (one chunk per sentence), 'use_case' (the whole row)
+                     or 'window' (overlapping windows of window_tokens words).
+    :param window_tokens: Words per chunk for the 'window' strategy.
+    :param window_overlap: Words shared by consecutive windows.
+    :param min_tokens: Chunks shorter than this many words are merged into a neighbour, or dropped.
+    :return: List of chunk strings.
+    """
+    if strategy == 'sentence':
+        chunks = [sentence.strip() for sentence in split_sentences(text)]
+    elif strategy == 'use_case':
+        chunks = [text.strip()]
+    elif strategy == 'window':
+        chunks = _windows(text, window_tokens, window_overlap)
+    else:
+        raise ValueError(f"Unknown chunking strategy '{strategy}'. Expected one of {list(CHUNKING_STRATEGIES)}.")
+    return _merge_short([chunk for chunk in chunks if chunk], min_tokens)
+
+def find_near_duplicates(vectors, threshold=0.97, neighbours=16):
+    """
+    Groups vectors whose cosine similarity is at least the threshold.
+
+    Each vector is compared with its nearest neighbours; walking in corpus order,
+    a vector not yet claimed by an earlier one keeps its place and claims its
+    near duplicates.
+
+    :param vectors: float32 matrix of shape (n, dim).
+    :param threshold: Minimum cosine similarity for two chunks to count as duplicates.
+    :param neighbours: Number of neighbours checked per vector.
+    :return: int64 array mapping every row to the row it is merged into (itself for kept rows).
+    """
+    n = vectors.shape[0]
+    representative = np.arange(n, dtype='int64')
+    if n < 2:
+        return representative
+    unit = np.ascontiguousarray(vectors, dtype='float32').copy()
+    faiss.normalize_L2(unit)
+    index = faiss.IndexFlatIP(unit.shape[1])
+    index.add(unit)
+    similarities, ids = index.search(unit, min(neighbours + 1, n))
+
+    claimed = np.zeros(n, dtype=bool)
+    for row in range(n):
+        if claimed[row]:
+            continue
+        duplicates = ids[row][(similarities[row] >= threshold) & (ids[row] > row)]
+        duplicates = duplicates[~claimed[duplicates]]
+        claimed[duplicates] = True
+        representative[duplicates] = row
+    return representative
+
+def collapse_records(vectors, records, threshold=0.97, neighbours=16):
+    """
+    Merges near-duplicate chunks of an embedding store into their first occurrence.
+
+    The kept record lists the metadata of the chunks merged into it under
+    metadata['merged_rows'], so their rows stay known and build_metadata_index
+    can still find the chunk under every industry, role or sheet it came from.
+
+    :param vectors: float32 matrix of shape (n, dim), e.g. the memory-mapped store.
+    :param records: Content/metadata records aligned with the vectors.
+    :param threshold: Minimum cosine similarity for two chunks to count as duplicates.
+    :param neighbours: Number of neighbours checked per chunk.
+    :return: Tuple of (int64 array of kept rows, list of kept records with 'merged_rows').
+    """
+    representative = find_near_duplicates(vectors, threshold, neighbours)
+    kept_rows = np.flatnonzero(representative == np.arange(len(representative)))
+    merged = {}
+    for row, target in enumerate(representative):
+        if row != target:
+            metadata = records[row].get('metadata', {})
+            merged.setdefault(int(target), []).append({key: value for key, value in metadata.items() if key != 'merged_rows'})
+    kept_records = []
+    for row in kept_rows:
+        record = records[row]
+        if row in merged:
+            metadata = record.get('metadata', {})
+            metadata = {**metadata, 'merged_rows': [*metadata.get('merged_rows', ()), *merged[row]]}
+            record = {'content': record['content'], 'metadata': metadata}
+        kept_records.append(record)
+    return kept_rows, kept_records
+
+def log_shrink_report(chunk_count, kept_count, dim, previous_count=None):
+    """
+    Logs how many vectors chunking and duplicate collapsing produced and the index size change.
+
+    :param chunk_count: Number of chunks embedded.
+    :param kept_count: Number of vectors left after collapsing near duplicates.
+    :param dim: Embedding dimension.
+    :param previous_count: Number of vectors in the previous embedding store, if any.
+    :return: Dictionary with the report figures.
+    """
+    report = {
+        'chunks': chunk_count,
+        'vectors': kept_count,
+        'collapsed': chunk_count - kept_count,
+        'float32_bytes': kept_count * dim * 4,
+        'previous_vectors': previous_count,
+    }
+    logging.info(
+        f"Collapsed {report['collapsed']} near-duplicate chunks: {chunk_count} -> {kept_count} vectors "
+        f"({report['float32_bytes'] / 2**20:.2f}MiB as float32)."
+    )
+    if previous_count:
+        change = (kept_count - previous_count) / previous_count
+        logging.info(f"Index size vs previous run: {previous_count} -> {kept_count} vectors ({change:+.1%}).")
+    return report
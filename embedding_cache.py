@@ -0,0 +1,227 @@
+# embedding_cache.py
+
+import os
+import json
+import math
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+
+def content_hash(model_name, text):
+    """
+    Computes the cache key of a sentence for a given embedding model.
+
+    :param model_name: Name of the SentenceTransformer model.
+    :param text: Sentence text.
+    :return: Hex SHA-256 digest of (model name, text).
+    """
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent sentence embedding cache backed by SQLite.
+
+    Vectors are stored as raw float32 bytes keyed by content_hash, so unchanged
+    sentences can be reused across ingestion runs.
+    """
+
+    def __init__(self, path='embedding_cache.sqlite', model_name='all-MiniLM-L6-v2'):
+        """
+        :param path: Path of the SQLite cache file.
+        :param model_name: Name of the model whose vectors are cached.
+        """
+        self.path = path
+        self.model_name = model_name
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.hits = 0
+        self.misses = 0
+        self.used_keys = set()
+
+    def get_many(self, texts):
+        """
+        Looks up cached vectors for a list of texts.
+
+        :param texts: List of sentence texts.
+        :return: List aligned with ``texts`` holding a float32 vector or None.
+        """
+        keys = [content_hash(self.model_name, text) for text in texts]
+        found = {}
+        unique_keys = list(set(keys))
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(unique_keys), 500):
+            chunk = unique_keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk)
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype='float32')
+
+        vectors = [found.get(key) for key in keys]
+        self.used_keys.update(keys)
+        hits = sum(vector is not None for vector in vectors)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, texts, vectors):
+        """
+        Stores freshly computed vectors.
+
+        :param texts: List of sentence texts.
+        :param vectors: Sequence of vectors aligned with ``texts``.
+        """
+        rows = [
+            (content_hash(self.model_name, text), np.asarray(vector, dtype='float32').tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+        self.conn.commit()
+
+    def prune(self):
+        """
+        Deletes cache entries that were not looked up during this run.
+
+        :return: Number of deleted entries.
+        """
+        stale = [
+            (key,) for (key,) in self.conn.execute("SELECT key FROM embeddings")
+            if key not in self.used_keys
+        ]
+        self.conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+        self.conn.commit()
+        return len(stale)
+
+    def close(self):
+        self.conn.close()
+
+def _row_number(value):
+    """
+    Returns a spreadsheet serial number ('Sr. No.') as a string, or None if the cell is empty.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+class RowHasher:
+    """
+    Hashes spreadsheet rows from their data entries, one entry at a time.
+
+    Rows are identified by their 'Sr. No.' rather than their position, so
+    inserting or deleting a row doesn't make every later row look changed.
+    Rows without a serial number are identified by their content hash; an edit
+    to such a row shows up as one removed and one added row.
+    """
+
+    def __init__(self):
+        self._rows = {}
+
+    def add(self, item):
+        """
+        Adds a data entry to the hash of its row.
+
+        :param item: Data entry with 'content' and 'metadata'.
+        """
+        metadata = item.get('metadata', {})
+        row = self._rows.get((metadata.get('sheet_name'), metadata.get('row_index')))
+        if row is None:
+            row = self._rows[(metadata.get('sheet_name'), metadata.get('row_index'))] = {
+                'number': _row_number(metadata.get('sr_no')), 'digest': hashlib.sha256(),
+            }
+        row['digest'].update(item['content'].encode('utf-8'))
+        # The position is part of the key at most, never of the content hash
+        content_metadata = {key: value for key, value in metadata.items() if key != 'row_index'}
+        row['digest'].update(json.dumps(content_metadata, sort_keys=True, default=str).encode('utf-8'))
+
+    def hashes(self):
+        """
+        :return: Dictionary mapping sheet name to {row key: row hash}.
+        """
+        result = {}
+        for (sheet, _), row in self._rows.items():
+            digest = row['digest'].hexdigest()
+            key = row['number'] if row['number'] is not None else f"content:{digest[:16]}"
+            sheet_rows = result.setdefault(sheet, {})
+            # A repeated serial number (or identical rows) gets a suffix rather than overwriting
+            unique_key, repeat = key, 1
+            while unique_key in sheet_rows:
+                repeat += 1
+                unique_key = f"{key}#{repeat}"
+            sheet_rows[unique_key] = digest
+        return result
+
+def compute_row_hashes(data_entries):
+    """
+    Computes a content hash for every spreadsheet row from its data entries.
+
+    :param data_entries: Iterable of data entries with 'content' and 'metadata'.
+    :return: Dictionary mapping sheet name to {row key: row hash}; see RowHasher.
+    """
+    hasher = RowHasher()
+    for item in data_entries:
+        hasher.add(item)
+    return hasher.hashes()
+
+def _row_sort_key(row):
+    return (0, int(row), '') if row.isdigit() else (1, 0, row)
+
+def diff_row_hashes(previous, current):
+    """
+    Compares row hashes of two ingestion runs.
+
+    :param previous: Row hashes of the previous run.
+    :param current: Row hashes of the current run.
+    :return: Dictionary mapping sheet name to lists of 'added', 'removed' and 'changed' row keys.
+    """
+    report = {}
+    for sheet in sorted(set(previous) | set(current), key=str):
+        old_rows = previous.get(sheet, {})
+        new_rows = current.get(sheet, {})
+        report[sheet] = {
+            'added': sorted((row for row in new_rows if row not in old_rows), key=_row_sort_key),
+            'removed': sorted((row for row in old_rows if row not in new_rows), key=_row_sort_key),
+            'changed': sorted(
+                (row for row in new_rows if row in old_rows and new_rows[row] != old_rows[row]), key=_row_sort_key
+            ),
+        }
+    return report
+
+def load_row_hashes(manifest_file):
+    """
+    Loads the row hashes saved by the previous ingestion run.
+
+    :param manifest_file: Path of the manifest JSON file.
+    :return: Row hashes, or an empty dictionary if there is no manifest yet.
+    """
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_row_hashes(row_hashes, manifest_file):
+    """
+    Saves row hashes for the next ingestion run.
+
+    :param row_hashes: Row hashes from compute_row_hashes.
+    :param manifest_file: Path of the manifest JSON file.
+    """
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(row_hashes, f, indent=2, ensure_ascii=False)
+
+def log_row_report(report):
+    """
+    Logs the per-sheet added/removed/changed row counts.
+
+    :param report: Report from diff_row_hashes.
+    """
+    for sheet, changes in report.items():
+        if any(changes.values()):
+            logging.info(
+                f"Sheet '{sheet}': {len(changes['added'])} added, {len(changes['removed'])} removed, "
+                f"{len(changes['changed'])} changed rows (changed: {changes['changed'][:20]})."
+            )
+        else:
+            logging.info(f"Sheet '{sheet}': unchanged.")
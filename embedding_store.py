@@ -0,0 +1,249 @@
+# embedding_store.py
+
+import os
+import json
+import uuid
+import logging
+import numpy as np
+
+# Default file names of the binary embedding store written by process_data.py
+EMBEDDINGS_MATRIX_FILE = 'embeddings.npy'
+EMBEDDINGS_META_FILE = 'embeddings_meta.json'
+
+# Line-delimited embeddings artifact: one {"content", "metadata", "embedding"} object per line
+EMBEDDINGS_JSONL_FILE = 'embeddings.jsonl'
+
+# Number of JSONL lines parsed and copied into the matrix at a time
+LOAD_BLOCK_SIZE = 1024
+
+def _temp_path(path):
+    """
+    Returns a temporary file name next to ``path`` that no other process uses.
+
+    Server workers may convert the same JSONL file at the same time, so each
+    writer gets its own temporary files and publishes them with ``os.replace``.
+
+    :param path: Path of the file that will be replaced.
+    :return: Unique temporary path in the same directory.
+    """
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+def save_embedding_store(data_entries, matrix_file=EMBEDDINGS_MATRIX_FILE, meta_file=EMBEDDINGS_META_FILE):
+    """
+    Saves data entries as a float32 matrix file plus a content/metadata sidecar.
+
+    Row ``i`` of the matrix belongs to record ``i`` of the sidecar. Entries whose
+    embedding could not be generated are left out so the two files stay aligned.
+
+    :param data_entries: List of data entries with embeddings.
+    :param matrix_file: Path of the .npy file holding the embedding matrix.
+    :param meta_file: Path of the JSON sidecar holding content and metadata.
+    :return: Number of vectors written.
+    """
+    valid_entries = [item for item in data_entries if len(item.get('embedding', [])) > 0]
+    skipped = len(data_entries) - len(valid_entries)
+    if skipped:
+        logging.warning(f"Skipping {skipped} entries without embeddings in the binary store.")
+    if not valid_entries:
+        raise ValueError("No embeddings to save in the binary store.")
+
+    vectors = np.asarray([item['embedding'] for item in valid_entries], dtype='float32')
+    records = [{'content': item['content'], 'metadata': item.get('metadata', {})} for item in valid_entries]
+
+    # Written to temporary files and renamed, so servers that map the old files keep a valid copy
+    temp_matrix, temp_meta = _temp_path(matrix_file), _temp_path(meta_file)
+    try:
+        with open(temp_matrix, 'wb') as f:
+            np.save(f, np.ascontiguousarray(vectors))
+        with open(temp_meta, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        os.replace(temp_matrix, matrix_file)
+        os.replace(temp_meta, meta_file)
+        logging.info(f"Saved {len(records)} x {vectors.shape[1]} embedding matrix to '{matrix_file}' and '{meta_file}'.")
+    except Exception as e:
+        logging.error(f"Error saving binary embedding store: {e}")
+        for temp_file in (temp_matrix, temp_meta):
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        raise
+    return len(records)
+
+def load_embedding_store(matrix_file=EMBEDDINGS_MATRIX_FILE, meta_file=EMBEDDINGS_META_FILE, mmap=True):
+    """
+    Loads the binary embedding store written by save_embedding_store.
+
+    With ``mmap`` enabled the matrix is memory-mapped read-only, so the vectors
+    live in the OS page cache and are shared by every process that maps them.
+
+    :param matrix_file: Path of the .npy embedding matrix.
+    :param meta_file: Path of the JSON content/metadata sidecar.
+    :param mmap: Memory-map the matrix instead of reading it into RAM.
+    :return: Tuple of (float32 matrix of shape (n, dim), list of records).
+    """
+    vectors = np.load(matrix_file, mmap_mode='r' if mmap else None)
+    with open(meta_file, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+
+    if vectors.ndim != 2 or vectors.dtype != np.float32:
+        raise ValueError(f"'{matrix_file}' is not a 2-D float32 matrix.")
+    if vectors.shape[0] != len(records):
+        raise ValueError(
+            f"Embedding store is inconsistent: {vectors.shape[0]} vectors in '{matrix_file}' "
+            f"but {len(records)} records in '{meta_file}'."
+        )
+    return vectors, records
+
+def write_embeddings_jsonl(data_entries, output_file=EMBEDDINGS_JSONL_FILE):
+    """
+    Writes data entries to a JSONL file, one compact object per line, as they are consumed.
+
+    Embeddings are written with float32 precision. Entries whose embedding could
+    not be generated are left out, so line ``i`` is vector ``i``.
+
+    :param data_entries: Iterable of data entries with embeddings (a list or a generator).
+    :param output_file: Path of the JSONL file.
+    :return: Number of lines written.
+    """
+    written = skipped = 0
+    temp_file = f"{output_file}.tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for item in data_entries:
+                embedding = item.get('embedding')
+                if embedding is None or len(embedding) == 0:
+                    skipped += 1
+                    continue
+                record = json.dumps({'content': item['content'], 'metadata': item.get('metadata', {})}, ensure_ascii=False)
+                vector = ','.join(map(str, np.asarray(embedding, dtype='float32')))
+                f.write(f'{record[:-1]}, "embedding": [{vector}]}}\n')
+                written += 1
+        os.replace(temp_file, output_file)
+    except Exception as e:
+        logging.error(f"Error writing embeddings to '{output_file}': {e}")
+        raise
+    if skipped:
+        logging.warning(f"Skipped {skipped} entries without embeddings in '{output_file}'.")
+    logging.info(f"Successfully saved {written} embeddings to '{output_file}'.")
+    return written
+
+def iter_embeddings_jsonl(input_file=EMBEDDINGS_JSONL_FILE, block_size=LOAD_BLOCK_SIZE):
+    """
+    Reads a JSONL embeddings file in fixed-size blocks.
+
+    :param input_file: Path of the JSONL file.
+    :param block_size: Number of lines per block.
+    :return: Generator of (float32 matrix of shape (block, dim), list of records) tuples.
+    """
+    with open(input_file, 'r', encoding='utf-8') as f:
+        vectors, records = [], []
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            vectors.append(item['embedding'])
+            records.append({'content': item['content'], 'metadata': item.get('metadata', {})})
+            if len(records) == block_size:
+                yield np.asarray(vectors, dtype='float32'), records
+                vectors, records = [], []
+        if records:
+            yield np.asarray(vectors, dtype='float32'), records
+
+def _count_lines(input_file):
+    count = 0
+    with open(input_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            count += chunk.count(b'\n')
+    return count
+
+def convert_jsonl_to_store(input_file=EMBEDDINGS_JSONL_FILE, matrix_file=EMBEDDINGS_MATRIX_FILE,
+                           meta_file=EMBEDDINGS_META_FILE, block_size=LOAD_BLOCK_SIZE):
+    """
+    Streams a JSONL embeddings file into the binary embedding store block by block.
+
+    The matrix is written through a memory map, so only one block of parsed
+    vectors is held in memory at a time whatever the corpus size.
+
+    :param input_file: Path of the JSONL file.
+    :param matrix_file: Path of the .npy embedding matrix to write.
+    :param meta_file: Path of the JSON content/metadata sidecar to write.
+    :param block_size: Number of lines parsed at a time.
+    :return: Number of vectors written.
+    """
+    capacity = _count_lines(input_file)
+    temp_matrix, temp_meta = _temp_path(matrix_file), _temp_path(meta_file)
+    matrix = None
+    position = 0
+    try:
+        with open(temp_meta, 'w', encoding='utf-8') as meta:
+            meta.write('[')
+            for vectors, records in iter_embeddings_jsonl(input_file, block_size):
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(temp_matrix, mode='w+', dtype='float32', shape=(capacity, vectors.shape[1]))
+                matrix[position:position + len(records)] = vectors
+                for record in records:
+                    meta.write((', ' if position else '') + json.dumps(record, ensure_ascii=False))
+                    position += 1
+            meta.write(']')
+        if matrix is None:
+            raise ValueError(f"No embeddings found in '{input_file}'.")
+        matrix.flush()
+        del matrix
+        if position != capacity:
+            # Blank lines were counted; copy the filled rows to a correctly sized file
+            sized_matrix = _temp_path(matrix_file)
+            try:
+                with open(sized_matrix, 'wb') as f:
+                    np.save(f, np.load(temp_matrix, mmap_mode='r')[:position])
+                os.remove(temp_matrix)
+            except Exception:
+                if os.path.exists(sized_matrix):
+                    os.remove(sized_matrix)
+                raise
+            temp_matrix = sized_matrix
+        os.replace(temp_matrix, matrix_file)
+        os.replace(temp_meta, meta_file)
+    except Exception as e:
+        logging.error(f"Error converting '{input_file}' to the binary store: {e}")
+        for temp_file in (temp_matrix, temp_meta):
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        raise
+    logging.info(f"Converted {position} embeddings from '{input_file}' to binary store '{matrix_file}'.")
+    return position
+
+def load_embeddings(json_file='embeddings.json', matrix_file=EMBEDDINGS_MATRIX_FILE, meta_file=EMBEDDINGS_META_FILE,
+                    jsonl_file=EMBEDDINGS_JSONL_FILE):
+    """
+    Loads embeddings, preferring the binary store, then the JSONL file and finally the legacy JSON file.
+
+    A JSONL file is streamed into the binary store first and then memory-mapped,
+    so the next start (and every other worker) can map it directly. Workers that
+    start together may each convert it; every conversion writes its own
+    temporary files, so the last rename wins with a complete store.
+
+    :param json_file: Path of the legacy embeddings JSON file.
+    :param matrix_file: Path of the .npy embedding matrix.
+    :param meta_file: Path of the JSON content/metadata sidecar.
+    :param jsonl_file: Path of the JSONL embeddings file.
+    :return: Tuple of (float32 matrix of shape (n, dim), list of records).
+    """
+    try:
+        vectors, records = load_embedding_store(matrix_file, meta_file)
+        logging.info(f"Loaded {len(records)} embeddings from binary store '{matrix_file}'.")
+        return vectors, records
+    except FileNotFoundError:
+        logging.info(f"Binary store '{matrix_file}' not found, falling back to '{jsonl_file}'.")
+
+    if os.path.exists(jsonl_file):
+        convert_jsonl_to_store(jsonl_file, matrix_file, meta_file)
+        return load_embedding_store(matrix_file, meta_file)
+    logging.info(f"'{jsonl_file}' not found, falling back to '{json_file}'.")
+
+    with open(json_file, 'r', encoding='utf-8') as f:
+        embeddings_data = json.load(f)
+    embeddings_data = [item for item in embeddings_data if len(item.get('embedding', [])) > 0]
+    if not embeddings_data:
+        raise ValueError(f"No embeddings found in '{json_file}'.")
+    vectors = np.asarray([item['embedding'] for item in embeddings_data], dtype='float32')
+    records = [{'content': item['content'], 'metadata': item.get('metadata', {})} for item in embeddings_data]
+    return vectors, records
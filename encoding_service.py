@@ -0,0 +1,152 @@
+# encoding_service.py
+
+import os
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+import numpy as np
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+class BatchingSearcher:
+    """
+    Gathers concurrent queries into micro-batches for one encode and one index search.
+
+    Request threads call search(); a background thread collects waiting queries
+    into a batch of at most ``max_batch_size``, encodes them with a single
+    model call, runs one batched index.search and hands each caller its own row.
+    A lone query is dispatched immediately; the thread only waits up to
+    ``max_wait_ms`` for more queries when others are already queued.
+    """
+
+    def __init__(self, embedding_model, index, max_batch_size=16, max_wait_ms=2.0):
+        """
+        :param embedding_model: SentenceTransformer used to encode queries.
+        :param index: FAISS index searched for every batch.
+        :param max_batch_size: Maximum number of queries per batch.
+        :param max_wait_ms: Longest time to wait for a batch to fill once concurrency is seen.
+        """
+        self.embedding_model = embedding_model
+        self.index = index
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.batches = 0
+        self.queries = 0
+        self.batch_sizes = Counter()
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so (re)start the worker in whichever process uses us
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='batching-searcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, text, k=5):
+        """
+        Queues a query and returns a Future of (embedding, ids, distances).
+
+        :param text: Query text.
+        :param k: Number of neighbours.
+        """
+        if self._closed:
+            raise RuntimeError("BatchingSearcher is closed.")
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, k, future))
+        return future
+
+    def search(self, text, k=5, timeout=None):
+        """
+        Encodes and searches one query through the batching thread.
+
+        :param text: Query text.
+        :param k: Number of neighbours.
+        :param timeout: Optional seconds to wait for the result.
+        :return: Tuple of (query embedding, ids array, distances array).
+        """
+        return self.submit(text, k).result(timeout)
+
+    def close(self):
+        """
+        Stops the background thread once queued queries are served.
+        """
+        self._closed = True
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = None
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                if len(batch) == 1:
+                    # Light traffic: nobody else is waiting, so don't delay this query
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_wait
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect_batch(first)
+            try:
+                texts = [text for text, _, _ in batch]
+                k = max(k for _, k, _ in batch)
+                with stage('encode'):
+                    embeddings = np.asarray(self.embedding_model.encode(texts, batch_size=len(texts)), dtype='float32')
+                with stage('search'):
+                    distances, indices = self.index.search(embeddings, k)
+                for row, (_, item_k, future) in enumerate(batch):
+                    future.set_result((embeddings[row], indices[row, :item_k], distances[row, :item_k]))
+            except Exception as e:
+                logger.exception(f"Batched query search failed: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            with self._lock:
+                self.batches += 1
+                self.queries += len(batch)
+                self.batch_sizes[len(batch)] += 1
+
+    def stats(self):
+        """
+        :return: Dictionary with queue depth and batch size statistics.
+        """
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self.batches,
+                'queries': self.queries,
+                'mean_batch_size': self.queries / self.batches if self.batches else 0.0,
+                'max_batch_size_seen': max(self.batch_sizes, default=0),
+                'batch_size_counts': dict(sorted(self.batch_sizes.items())),
+            }
@@ -0,0 +1,63 @@
+# fake_llm.py
+
+import re
+import time
+from typing import Any, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Local stand-in for ChatGroq that emits tokens with configurable delays.
+
+    Responses cycle through ``responses``; without any, the model answers with a
+    short numbered list echoing the last human message. Used for development,
+    load tests and exercising the streaming endpoint without network access.
+    """
+
+    responses: List[str] = []
+    first_token_delay: float = 0.0  # seconds before the first token
+    token_delay: float = 0.0        # seconds between tokens
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-streaming-chat'
+
+    def _next_response(self, messages: List[BaseMessage]) -> str:
+        index = self.calls
+        self.calls += 1
+        if self.responses:
+            return self.responses[index % len(self.responses)]
+        question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), '')
+        return (
+            f"Here are some AI use cases related to: {question}\n"
+            "1.  Demand forecasting with machine learning.\n"
+            "2.  Automated document processing.\n"
+            "3.  Predictive maintenance of equipment."
+        )
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """
+        Splits text into word-sized tokens that concatenate back to the original.
+        """
+        return re.findall(r'\s*\S+|\s+', text)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = ''.join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens = self.tokenize(self._next_response(messages))
+        for position, token in enumerate(tokens):
+            delay = self.first_token_delay if position == 0 else self.token_delay
+            if delay:
+                time.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -14,6 +14,18 @@ import background from './assets/background.jpg';
 
 const MAX_RECENT_CHATS = 5; // Limit the number of recent chats stored
 
+// One conversation history per browser tab on the backend
+const getSessionId = () => {
+  let sessionId = sessionStorage.getItem('sessionId');
+  if (!sessionId) {
+    sessionId = window.crypto && window.crypto.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    sessionStorage.setItem('sessionId', sessionId);
+  }
+  return sessionId;
+};
+
 const App = () => {
   const [messages, setMessages] = useState([
     { sender: 'Aiko', text: 'Hello! I am Aiko. How can I assist you today?' },
@@ -63,7 +75,7 @@ const App = () => {
     setIsLoading(true);
 
     try {
-      const response = await axios.post(`${backendUrl}/chat`, { message: text });
+      const response = await axios.post(`${backendUrl}/chat`, { message: text, session_id: getSessionId() });
       const botMessage = { sender: 'Aiko', text: response.data.response };
 
       if (response.data.image) {
@@ -97,7 +109,7 @@ const App = () => {
   const handleNewChat = async () => {
     setIsLoading(true);
     try {
-      await axios.post(`${backendUrl}/reset_chat`); 
+      await axios.post(`${backendUrl}/reset_chat`, { session_id: getSessionId() });
       setMessages([
         { sender: 'Aiko', text: 'Hello! I am Aiko. How can I assist you today?' },
         { sender: 'Description', text: 'Select a suggested question below or type your own to get started.' },
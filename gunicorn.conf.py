@@ -0,0 +1,24 @@
+# gunicorn.conf.py
+
+import os
+import gc
+
+# Load app.py once in the master: the embedding model, memory-mapped vectors and
+# index are then shared copy-on-write by every worker instead of loaded per worker.
+# GUNICORN_PRELOAD=0 goes back to each worker importing the app itself.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+# Tokenizer threads used in the master would otherwise be disabled with a warning after fork
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+def pre_fork(server, worker):
+    # Objects loaded in the master are moved out of the garbage collector's reach,
+    # so collections in the workers don't write to (and un-share) their pages
+    if server.cfg.preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        import app
+        app.init_worker()
@@ -0,0 +1,249 @@
+# lexical_index.py
+
+import os
+import re
+import json
+import time
+import logging
+import numpy as np
+from utils import top_k
+
+# Default file name of the BM25 index written by process_data.py
+LEXICAL_INDEX_FILE = 'embeddings_bm25.json'
+
+# BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words that carry no meaning for matching a use case
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from', 'how', 'i', 'in', 'is',
+    'it', 'me', 'my', 'of', 'on', 'or', 'our', 'show', 'some', 'tell', 'that', 'the', 'their', 'this', 'to',
+    'we', 'what', 'which', 'with', 'you', 'your', 'about', 'give', 'list', 'any', 'there',
+}
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """
+    Splits text into lower-cased word tokens without stopwords.
+
+    :param text: Raw text.
+    :return: List of tokens.
+    """
+    return [token for token in _TOKEN.findall(str(text).lower()) if token not in STOPWORDS]
+
+def build_lexical_index(records, k1=BM25_K1, b=BM25_B):
+    """
+    Builds an inverted BM25 index over the record contents.
+
+    :param records: Content/metadata records aligned with the search index.
+    :param k1: BM25 term frequency saturation.
+    :param b: BM25 length normalization.
+    :return: Dictionary with 'num_records', 'k1', 'b', 'doc_lengths' and 'postings'
+             (term -> [record ids, term frequencies]).
+    """
+    postings = {}
+    doc_lengths = []
+    for record_id, record in enumerate(records):
+        tokens = tokenize(record['content'])
+        doc_lengths.append(len(tokens))
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, frequency in frequencies.items():
+            entry = postings.setdefault(token, [[], []])
+            entry[0].append(record_id)
+            entry[1].append(frequency)
+    return {'num_records': len(records), 'k1': k1, 'b': b, 'doc_lengths': doc_lengths, 'postings': postings}
+
+def save_lexical_index(lexical_index, output_file=LEXICAL_INDEX_FILE):
+    """
+    Writes the BM25 index to disk.
+    """
+    with open(f"{output_file}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(lexical_index, f, ensure_ascii=False)
+    os.replace(f"{output_file}.tmp", output_file)
+    logging.info(f"Saved BM25 index of {len(lexical_index['postings'])} terms to '{output_file}'.")
+
+def load_lexical_index(records, input_file=LEXICAL_INDEX_FILE):
+    """
+    Loads the BM25 index, building it from the records if the file is missing or stale.
+
+    :param records: Content/metadata records.
+    :param input_file: Path of the BM25 index JSON file.
+    :return: Dictionary as returned by build_lexical_index.
+    """
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            lexical_index = json.load(f)
+        if lexical_index.get('num_records') == len(records):
+            return lexical_index
+        logging.warning(f"BM25 index '{input_file}' does not match the corpus, rebuilding it.")
+    except FileNotFoundError:
+        logging.info(f"BM25 index '{input_file}' not found, building it from the corpus.")
+    return build_lexical_index(records)
+
+class BM25Index:
+    """
+    Scores records against keyword queries with BM25.
+
+    Each posting list is turned into arrays of record ids and precomputed term
+    weights, so scoring a query is a concatenation and one bincount over the
+    records containing its terms, never a pass over the whole corpus.
+    """
+
+    def __init__(self, lexical_index):
+        """
+        :param lexical_index: Dictionary from build_lexical_index or load_lexical_index.
+        """
+        self.num_records = lexical_index['num_records']
+        k1, b = lexical_index['k1'], lexical_index['b']
+        doc_lengths = np.asarray(lexical_index['doc_lengths'], dtype='float32')
+        average_length = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+        norms = k1 * (1 - b + b * doc_lengths / max(average_length, 1e-9))
+        self.postings = {}
+        self.document_frequency = {}
+        for term, (ids, frequencies) in lexical_index['postings'].items():
+            ids = np.asarray(ids, dtype='int64')
+            frequencies = np.asarray(frequencies, dtype='float32')
+            idf = np.log(1 + (self.num_records - len(ids) + 0.5) / (len(ids) + 0.5))
+            self.postings[term] = (ids, (idf * frequencies * (k1 + 1) / (frequencies + norms[ids])).astype('float32'))
+            self.document_frequency[term] = len(ids)
+
+    def search(self, terms, k=5):
+        """
+        Returns the k best records for the query terms.
+
+        :param terms: Query tokens (see tokenize).
+        :param k: Number of records.
+        :return: Tuple of (scores, record ids, number of distinct query terms each record contains), best first.
+        """
+        lists = [self.postings[term] for term in dict.fromkeys(terms) if term in self.postings]
+        if not lists:
+            return np.empty(0, dtype='float32'), np.empty(0, dtype='int64'), np.empty(0, dtype='int64')
+        ids = np.concatenate([ids for ids, _ in lists])
+        weights = np.concatenate([weights for _, weights in lists])
+        candidates, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype('float32')
+        matched = np.bincount(inverse)
+        best_scores, positions = top_k(scores[None, :], min(k, len(candidates)))
+        return best_scores[0], candidates[positions[0]], matched[positions[0]]
+
+class LexicalSearcher:
+    """
+    Keyword side of hybrid retrieval.
+
+    ``exact_matches`` is the fast path: a short query of at least ``min_terms``
+    terms, every one known and distinctive (found in at most ``max_df`` of the
+    records, so "ai" or "use" alone never qualify), is answered by the records
+    containing all of its terms, ranked by BM25, without encoding it. A single
+    shared word is not enough evidence that an off-topic question is about a use
+    case, so such queries go to vector search and its distance threshold.
+    ``fuse`` merges BM25 and vector rankings with reciprocal rank fusion for
+    every other query.
+    """
+
+    def __init__(self, index, max_terms=4, max_df=0.2, rank_constant=60, lexical_weight=1.0, min_terms=2):
+        """
+        :param index: BM25Index over the corpus.
+        :param max_terms: Longest query (in content terms) the fast path answers.
+        :param max_df: Largest share of records a term may appear in to count as distinctive.
+        :param rank_constant: Reciprocal rank fusion constant; larger values flatten the rank weights.
+        :param lexical_weight: Weight of the BM25 ranking relative to the vector ranking in fusion.
+        :param min_terms: Shortest query (in content terms) the fast path answers.
+        """
+        self.index = index
+        self.max_terms = max_terms
+        self.min_terms = min_terms
+        self.max_df = max_df
+        self.rank_constant = rank_constant
+        self.lexical_weight = lexical_weight
+
+    def distinctive_terms(self, terms):
+        """
+        Returns the terms that occur in the corpus, but in at most ``max_df`` of the records.
+        """
+        limit = self.max_df * self.index.num_records
+        return [term for term in terms if 0 < self.index.document_frequency.get(term, 0) <= limit]
+
+    def exact_matches(self, query, k=5):
+        """
+        Answers a high-confidence keyword query from the BM25 index alone.
+
+        :param query: Query text.
+        :param k: Maximum number of records.
+        :return: List of record ids containing every query term, best first, or None if
+                 the query is not a confident keyword query.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not self.min_terms <= len(terms) <= self.max_terms or self.distinctive_terms(terms) != terms:
+            return None
+        _, ids, matched = self.index.search(terms, k * 4)
+        ids = [int(i) for i, count in zip(ids, matched) if count == len(terms)][:k]
+        return ids or None
+
+    def fuse(self, query, vector_ids, k=5):
+        """
+        Re-ranks vector hits together with BM25 hits that contain every distinctive query term.
+        BM25 hits are not checked for relevance here; the caller filters them by vector distance.
+
+        :param query: Query text.
+        :param vector_ids: Relevant record ids from vector search, nearest first.
+        :param k: Number of BM25 candidates considered.
+        :return: Fused list of record ids, best first.
+        """
+        distinctive = self.distinctive_terms(list(dict.fromkeys(tokenize(query))))
+        if not distinctive:
+            return vector_ids
+        _, ids, _ = self.index.search(distinctive, k * 4)
+        # Only records containing all distinctive terms are strong enough to add without a vector match
+        lexical_ids = [int(i) for i in ids if self._contains_all(int(i), distinctive)][:k]
+        scores = {}
+        for rank, record_id in enumerate(vector_ids):
+            scores[record_id] = scores.get(record_id, 0.0) + 1.0 / (self.rank_constant + rank + 1)
+        for rank, record_id in enumerate(lexical_ids):
+            scores[record_id] = scores.get(record_id, 0.0) + self.lexical_weight / (self.rank_constant + rank + 1)
+        return sorted(scores, key=lambda record_id: -scores[record_id])
+
+    def _contains_all(self, record_id, terms):
+        for term in terms:
+            ids = self.index.postings[term][0]
+            position = np.searchsorted(ids, record_id)
+            if position >= len(ids) or ids[position] != record_id:
+                return False
+        return True
+
+def evaluate_lexical(searcher, queries, embedding_model, vector_index, k=5, threshold=0.7):
+    """
+    Compares the lexical fast path with vector search on sample queries.
+
+    :param searcher: LexicalSearcher.
+    :param queries: Sample query texts, e.g. use case titles.
+    :param embedding_model: SentenceTransformer used for the vector path.
+    :param vector_index: FAISS index over the corpus.
+    :param k: Number of records per query.
+    :param threshold: Maximum L2 distance of a relevant vector hit.
+    :return: Dictionary with the fast path share, median latency of both paths in ms and the
+             share of fast path results that vector search also returns as relevant.
+    """
+    lexical_ms, vector_ms, overlaps, fast = [], [], [], 0
+    for query in queries:
+        start = time.perf_counter()
+        lexical_ids = searcher.exact_matches(query, k)
+        lexical_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        embedding = np.asarray(embedding_model.encode([query]), dtype='float32')
+        distances, indices = vector_index.search(embedding, k)
+        vector_ms.append((time.perf_counter() - start) * 1000)
+        if lexical_ids:
+            fast += 1
+            relevant = {int(i) for i, d in zip(indices[0], distances[0]) if i >= 0 and d < threshold}
+            overlaps.append(len(relevant & set(lexical_ids)) / len(lexical_ids))
+    return {
+        'queries': len(queries),
+        'fast_path_share': fast / len(queries) if queries else 0.0,
+        'lexical_ms_p50': float(np.median(lexical_ms)) if lexical_ms else 0.0,
+        'vector_ms_p50': float(np.median(vector_ms)) if vector_ms else 0.0,
+        'fast_path_agreement': float(np.mean(overlaps)) if overlaps else 0.0,
+    }
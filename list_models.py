@@ -13,7 +13,8 @@ if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY not found in environment variables.")
 
 # Configure API endpoint and headers
-MODELS_API_URL = 'https://api.groq.com/openai/v1/models'
+# LLM_BASE_URL points this at another OpenAI-compatible API, e.g. llm_stub_server.py
+MODELS_API_URL = f"{os.getenv('LLM_BASE_URL', 'https://api.groq.com/openai/v1').rstrip('/')}/models"
 HEADERS = {
     'Authorization': f'Bearer {GROQ_API_KEY}',
     'Content-Type': 'application/json'
@@ -0,0 +1,448 @@
+# llm_gateway.py
+
+import os
+import json
+import time
+import queue
+import random
+import asyncio
+import logging
+import threading
+import httpx
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: timeouts, rate limits and transient upstream failures
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Roles of LangChain message types in the OpenAI chat format
+_ROLES = {'system': 'system', 'human': 'user', 'ai': 'assistant'}
+
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    'pai_llm_call_duration_seconds', 'Duration of LLM gateway calls, including queueing and retries.', ('outcome',)
+)
+
+class LLMGatewayError(Exception):
+    """
+    Base class of LLM gateway failures.
+    """
+
+class LLMOverloadedError(LLMGatewayError):
+    """
+    Raised when the gateway's wait queue is full; the caller should shed the request.
+    """
+
+class LLMTimeoutError(LLMGatewayError):
+    """
+    Raised when a call does not finish before its deadline.
+    """
+
+class LLMUpstreamError(LLMGatewayError):
+    """
+    Raised on a non-retryable upstream error or once retries are exhausted.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class _RetryableStatus(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"upstream returned HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+def to_openai_messages(messages):
+    """
+    Converts LangChain messages (or OpenAI-style dicts) to OpenAI chat messages.
+    """
+    converted = []
+    for message in messages:
+        if isinstance(message, BaseMessage):
+            converted.append({'role': _ROLES.get(message.type, 'user'), 'content': message.content})
+        else:
+            converted.append(message)
+    return converted
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class LLMGateway:
+    """
+    Client for an OpenAI-compatible chat completions API (Groq, or the local stub
+    in llm_stub_server.py) that keeps a slow or rate-limited provider from tying up
+    the server.
+
+    Calls share a pooled HTTP client and run on an event loop: ``achat``/``astream``
+    on the caller's loop, and ``invoke``/``stream`` (the LangChain-style interface
+    app.py uses) on a background loop owned by the gateway. At most
+    ``max_concurrency`` calls run at once per loop; up to ``max_queue`` more wait for
+    a slot and anything beyond is rejected immediately with LLMOverloadedError.
+    Every call has a deadline covering queueing, retries and generation. Transport
+    errors, timeouts, 429 and 5xx responses are retried with jittered exponential
+    backoff (honouring Retry-After), and with ``hedge_after`` a non-streaming call
+    that has not answered by then is raced against a second attempt when a slot is free.
+    """
+
+    def __init__(self, base_url, api_key, model, max_concurrency=8, max_queue=32, timeout=30.0,
+                 connect_timeout=5.0, max_retries=2, backoff_base=0.25, backoff_max=4.0,
+                 hedge_after=None, temperature=None, transport=None):
+        """
+        :param base_url: API base URL, e.g. https://api.groq.com/openai/v1.
+        :param api_key: Bearer token sent with every call.
+        :param model: Model id.
+        :param max_concurrency: Maximum number of calls in flight.
+        :param max_queue: Maximum number of calls waiting for a slot.
+        :param timeout: Default deadline of a call in seconds.
+        :param connect_timeout: Maximum seconds to open a connection.
+        :param max_retries: Retries after the first attempt.
+        :param backoff_base: Backoff before the first retry, doubled for each further retry.
+        :param backoff_max: Maximum backoff in seconds.
+        :param hedge_after: Seconds after which a second attempt is raced against a slow one; None disables hedging.
+        :param temperature: Optional sampling temperature.
+        :param transport: Optional httpx transport (e.g. for tests).
+        """
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.temperature = temperature
+        self.transport = transport
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._per_loop = {}
+        self.in_flight = 0
+        self.queued = 0
+        self.outcomes = {}
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # Per-loop resources and the background loop
+
+    def _ensure_loop(self):
+        # Threads and loops don't survive a fork: each process starts its own
+        if self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._pid != os.getpid():
+                self._per_loop = {}
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='llm-gateway', daemon=True).start()
+                self._loop = loop
+                self._pid = os.getpid()
+        return self._loop
+
+    def _resources(self):
+        loop = asyncio.get_running_loop()
+        resources = self._per_loop.get(loop)
+        if resources is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                limits=httpx.Limits(max_connections=self.max_concurrency * 2, max_keepalive_connections=self.max_concurrency),
+                transport=self.transport,
+            )
+            resources = self._per_loop[loop] = (client, asyncio.Semaphore(self.max_concurrency))
+        return resources
+
+    async def aclose(self):
+        """
+        Closes the HTTP client of the running loop.
+        """
+        resources = self._per_loop.pop(asyncio.get_running_loop(), None)
+        if resources is not None:
+            await resources[0].aclose()
+
+    # Admission control
+
+    def _count(self, outcome, started):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        LLM_CALL_SECONDS.observe(time.monotonic() - started, outcome=outcome)
+
+    async def _acquire(self, semaphore, deadline):
+        if not semaphore.locked():
+            # A free slot is taken without suspending, so the check above can't go stale
+            await semaphore.acquire()
+        else:
+            with self._lock:
+                if self.queued >= self.max_queue:
+                    raise LLMOverloadedError(f"LLM queue is full ({self.queued} waiting).")
+                self.queued += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError("Timed out waiting for a free LLM slot.") from None
+            finally:
+                with self._lock:
+                    self.queued -= 1
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self, semaphore):
+        semaphore.release()
+        with self._lock:
+            self.in_flight -= 1
+
+    # Calls
+
+    def _payload(self, messages, stream, params):
+        payload = {'model': self.model, 'messages': to_openai_messages(messages), 'stream': stream}
+        if self.temperature is not None:
+            payload['temperature'] = self.temperature
+        payload.update(params)
+        return payload
+
+    def _http_timeout(self, deadline):
+        remaining = max(deadline - time.monotonic(), 0.001)
+        return httpx.Timeout(remaining, connect=min(self.connect_timeout, remaining))
+
+    async def _backoff(self, attempt, error, deadline):
+        """
+        Sleeps before the next retry; returns False when no retry is possible before the deadline.
+        """
+        if attempt >= self.max_retries:
+            return False
+        delay = getattr(error, 'retry_after', None)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            return False
+        with self._lock:
+            self.retries += 1
+        logger.warning(f"LLM call failed ({error!r}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s.")
+        await asyncio.sleep(delay)
+        return True
+
+    async def _attempt(self, client, payload, deadline):
+        response = await client.post('/chat/completions', json=payload, timeout=self._http_timeout(deadline))
+        if response.status_code in RETRYABLE_STATUS:
+            raise _RetryableStatus(response.status_code, _retry_after(response))
+        if response.status_code >= 400:
+            raise LLMUpstreamError(f"LLM API returned HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+        return response.json()['choices'][0]['message']['content']
+
+    async def _with_retries(self, client, payload, deadline):
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(self._attempt(client, payload, deadline), timeout=max(deadline - time.monotonic(), 0))
+            except (httpx.TransportError, asyncio.TimeoutError, _RetryableStatus) as e:
+                if time.monotonic() >= deadline:
+                    raise LLMTimeoutError("LLM call exceeded its deadline.") from e
+                if not await self._backoff(attempt, e, deadline):
+                    raise LLMUpstreamError(f"LLM call failed after {attempt + 1} attempts: {e!r}", getattr(e, 'status', None)) from e
+                attempt += 1
+
+    async def _hedged(self, client, semaphore, payload, deadline):
+        primary = asyncio.ensure_future(self._with_retries(client, payload, deadline))
+        if not self.hedge_after:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done or semaphore.locked():
+            # Answered in time, or no spare slot: hedging now would only add load
+            return await primary
+        await self._acquire(semaphore, deadline)
+        with self._lock:
+            self.hedges += 1
+        hedge = asyncio.ensure_future(self._with_retries(client, payload, deadline))
+        try:
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                task.cancel()
+            self._release(semaphore)
+
+    async def achat(self, messages, timeout=None, **params):
+        """
+        Generates a complete answer.
+
+        :param messages: LangChain messages or OpenAI-style message dicts.
+        :param timeout: Deadline in seconds for the whole call (defaults to the gateway timeout).
+        :param params: Extra request fields (max_tokens, temperature, ...).
+        :return: Answer text.
+        """
+        started = time.monotonic()
+        deadline = started + (timeout or self.timeout)
+        client, semaphore = self._resources()
+        outcome = 'error'
+        try:
+            await self._acquire(semaphore, deadline)
+            try:
+                text = await self._hedged(client, semaphore, self._payload(messages, False, params), deadline)
+            finally:
+                self._release(semaphore)
+            outcome = 'ok'
+            return text
+        except LLMOverloadedError:
+            outcome = 'rejected'
+            raise
+        except LLMTimeoutError:
+            outcome = 'timeout'
+            raise
+        finally:
+            self._count(outcome, started)
+
+    async def astream(self, messages, timeout=None, **params):
+        """
+        Streams an answer token by token. A failure before the first token is
+        retried like achat; once tokens have been sent it is raised.
+
+        :param messages: LangChain messages or OpenAI-style message dicts.
+        :param timeout: Deadline in seconds for the whole call.
+        :param params: Extra request fields.
+        :return: Async generator of text chunks.
+        """
+        started = time.monotonic()
+        deadline = started + (timeout or self.timeout)
+        client, semaphore = self._resources()
+        payload = self._payload(messages, True, params)
+        outcome = 'error'
+        try:
+            await self._acquire(semaphore, deadline)
+            try:
+                attempt = 0
+                while True:
+                    sent = False
+                    try:
+                        async with client.stream('POST', '/chat/completions', json=payload,
+                                                 timeout=self._http_timeout(deadline)) as response:
+                            if response.status_code in RETRYABLE_STATUS:
+                                raise _RetryableStatus(response.status_code, _retry_after(response))
+                            if response.status_code >= 400:
+                                body = (await response.aread()).decode('utf-8', 'replace')
+                                raise LLMUpstreamError(f"LLM API returned HTTP {response.status_code}: {body[:200]}", response.status_code)
+                            async for line in response.aiter_lines():
+                                if time.monotonic() >= deadline:
+                                    raise LLMTimeoutError("LLM stream exceeded its deadline.")
+                                if not line.startswith('data:'):
+                                    continue
+                                data = line[5:].strip()
+                                if data == '[DONE]':
+                                    break
+                                token = json.loads(data)['choices'][0].get('delta', {}).get('content')
+                                if token:
+                                    sent = True
+                                    yield token
+                        break
+                    except (httpx.TransportError, _RetryableStatus) as e:
+                        if sent:
+                            raise LLMUpstreamError(f"LLM stream broke off: {e!r}") from e
+                        if time.monotonic() >= deadline:
+                            raise LLMTimeoutError("LLM call exceeded its deadline.") from e
+                        if not await self._backoff(attempt, e, deadline):
+                            raise LLMUpstreamError(f"LLM call failed after {attempt + 1} attempts: {e!r}", getattr(e, 'status', None)) from e
+                        attempt += 1
+            finally:
+                self._release(semaphore)
+            outcome = 'ok'
+        except LLMOverloadedError:
+            outcome = 'rejected'
+            raise
+        except LLMTimeoutError:
+            outcome = 'timeout'
+            raise
+        finally:
+            self._count(outcome, started)
+
+    # Synchronous, LangChain-style interface
+
+    def invoke(self, messages, timeout=None, **params):
+        """
+        Blocking variant of achat for threaded servers.
+
+        :return: AIMessage with the answer.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.achat(messages, timeout, **params), self._ensure_loop())
+        try:
+            return AIMessage(content=future.result())
+        finally:
+            future.cancel()
+
+    def stream(self, messages, timeout=None, **params):
+        """
+        Blocking variant of astream for threaded servers; closing the generator cancels the call.
+
+        :return: Generator of AIMessageChunk.
+        """
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for token in self.astream(messages, timeout, **params):
+                    chunks.put(token)
+                chunks.put(done)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                chunks.put(e)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                item = chunks.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield AIMessageChunk(content=item)
+        finally:
+            future.cancel()
+
+    # Introspection
+
+    def stats(self):
+        """
+        :return: Dictionary with queue, in-flight and outcome counters.
+        """
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'outcomes': dict(self.outcomes),
+                'retries': self.retries,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+            }
+
+    def collect_metrics(self):
+        """
+        Metrics collector for MetricsRegistry.add_collector.
+        """
+        stats = self.stats()
+        return [
+            ('pai_llm_in_flight', 'gauge', 'LLM calls currently running.', [({}, stats['in_flight'])]),
+            ('pai_llm_queued', 'gauge', 'LLM calls waiting for a free slot.', [({}, stats['queued'])]),
+            ('pai_llm_retries', 'counter', 'LLM call retries.', [({}, stats['retries'])]),
+            ('pai_llm_hedges', 'counter', 'Hedged LLM attempts started, and those that won.',
+             [({'result': 'started'}, stats['hedges']), ({'result': 'won'}, stats['hedge_wins'])]),
+        ]
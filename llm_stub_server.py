@@ -0,0 +1,192 @@
+# llm_stub_server.py
+
+import json
+import time
+import random
+import argparse
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODEL = 'llama3-8b-8192'
+
+class StubLLMServer:
+    """
+    Local stand-in for an OpenAI-compatible chat API (the one list_models.py and
+    the LLM gateway talk to), with injectable latency and failures.
+
+    Serves GET /v1/models and POST /v1/chat/completions, with or without
+    ``stream``. Every answer is a short numbered list echoing the last user
+    message. ``error_rate`` and ``rate_limit_rate`` make that share of calls fail
+    with HTTP 500 or 429, and ``slow_rate`` delays that share by ``slow_latency``
+    seconds, to exercise retries, hedging and deadlines.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, model=DEFAULT_MODEL, latency=0.05, token_delay=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, slow_rate=0.0, slow_latency=2.0, seed=None):
+        """
+        :param host: Interface to listen on.
+        :param port: Port to listen on; 0 picks a free one.
+        :param model: Model id reported and echoed.
+        :param latency: Seconds before the first byte of an answer.
+        :param token_delay: Seconds between streamed tokens.
+        :param error_rate: Share of calls answered with HTTP 500.
+        :param rate_limit_rate: Share of calls answered with HTTP 429.
+        :param slow_rate: Share of calls delayed by slow_latency.
+        :param slow_latency: Extra delay of slow calls in seconds.
+        :param seed: Optional random seed for reproducible failures.
+        """
+        self.model = model
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _draw(self):
+        with self._lock:
+            self.requests += 1
+            return self._random.random(), self._random.random()
+
+    def answer(self, messages):
+        question = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+        return (
+            f"Here are some AI use cases related to: {question}\n"
+            "1.  Demand forecasting with machine learning.\n"
+            "2.  Automated document processing.\n"
+            "3.  Predictive maintenance of equipment."
+        )
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logging.debug(f"stub LLM: {format % args}")
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up, e.g. a hedged request that lost the race
+                    self.close_connection = True
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/v1/models':
+                    self._send_json(200, {'object': 'list', 'data': [{'id': stub.model, 'object': 'model', 'owned_by': 'stub'}]})
+                else:
+                    self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError:
+                    self._send_json(400, {'error': {'message': 'Invalid JSON body.'}})
+                    return
+                if self.path.rstrip('/') != '/v1/chat/completions':
+                    self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+                    return
+
+                failure, slowness = stub._draw()
+                if failure < stub.error_rate:
+                    self._send_json(500, {'error': {'message': 'Injected server error.'}})
+                    return
+                if failure < stub.error_rate + stub.rate_limit_rate:
+                    self._send_json(429, {'error': {'message': 'Injected rate limit.'}}, {'Retry-After': '0.05'})
+                    return
+                time.sleep(stub.latency + (stub.slow_latency if slowness < stub.slow_rate else 0))
+
+                text = stub.answer(request.get('messages', []))
+                created = int(time.time())
+                if not request.get('stream'):
+                    self._send_json(200, {
+                        'id': f"chatcmpl-stub-{stub.requests}", 'object': 'chat.completion', 'created': created,
+                        'model': stub.model,
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                        'usage': {'prompt_tokens': 0, 'completion_tokens': len(text.split()), 'total_tokens': len(text.split())},
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                tokens = [token for token in text.replace('\n', ' \n').split(' ')]
+                try:
+                    for position, token in enumerate(tokens):
+                        if position and stub.token_delay:
+                            time.sleep(stub.token_delay)
+                        content = token if position == 0 or token.startswith('\n') else f" {token}"
+                        chunk = {'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': created, 'model': stub.model,
+                                 'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+
+        return Handler
+
+    def start(self):
+        """
+        Serves in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-llm', daemon=True)
+        self._thread.start()
+        logging.info(f"Stub LLM API listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        logging.info(f"Stub LLM API listening on {self.url}")
+        self._server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub of the LLM API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds before the first byte of an answer.")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Seconds between streamed tokens.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of calls answered with HTTP 500.")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of calls answered with HTTP 429.")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="Share of calls delayed by --slow-latency.")
+    parser.add_argument('--slow-latency', type=float, default=2.0, help="Extra delay of slow calls in seconds.")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    StubLLMServer(
+        args.host, args.port, args.model, args.latency, args.token_delay, args.error_rate,
+        args.rate_limit_rate, args.slow_rate, args.slow_latency, args.seed,
+    ).serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+# load_replay.py
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import logging
+import argparse
+import itertools
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import httpx
+
+# Endpoints the replay knows how to call, and the default synthetic traffic mix
+ENDPOINTS = {'chat': '/chat', 'chat_stream': '/chat/stream', 'suggestions': '/suggestions', 'reset_chat': '/reset_chat'}
+DEFAULT_MIX = {'chat': 0.55, 'suggestions': 0.35, 'chat_stream': 0.05, 'reset_chat': 0.05}
+
+# Messages of the synthetic mix: use case questions, value chain shortcuts and off-topic questions
+SYNTHETIC_MESSAGES = [
+    "What are some AI use cases in banking?",
+    "How can AI help with fraud detection in payment processing?",
+    "Show me AI use cases for EV battery manufacturing.",
+    "How is AI used in pharma supply chains?",
+    "AI for demand forecasting in retail",
+    "Predictive maintenance in chemical manufacturing",
+    "What can a CFO do with AI?",
+    "How can AI improve customer service in consumer durables?",
+    "Show me the retail value chain",
+    "Show me the banking value chain",
+    "What is the weather tomorrow?",
+    "Tell me a joke about football.",
+]
+
+def parse_mix(value):
+    """
+    Parses "chat=0.6,suggestions=0.4" into a dictionary of endpoint weights.
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}'. Expected some of {list(ENDPOINTS)}.")
+        mix[name] = float(weight)
+    return mix
+
+def read_request_log(input_file):
+    """
+    Reads a recorded request log (JSONL) into replayable requests.
+
+    Lines may name an endpoint ("endpoint" or "path", /chat by default) and carry
+    the request body in "json" or directly ("message", "session_id", "filters").
+    Lines of a backlog like requests.jsonl, with a "title" and no message, are
+    replayed as /chat messages.
+
+    :param input_file: Path of the JSONL log.
+    :return: List of (endpoint name, JSON body) tuples.
+    """
+    paths = {path: name for name, path in ENDPOINTS.items()}
+    requests = []
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            endpoint = item.get('endpoint') or item.get('path') or '/chat'
+            name = paths.get(endpoint, endpoint)
+            if name not in ENDPOINTS:
+                logging.warning(f"Line {line_number}: unknown endpoint '{endpoint}', skipping it.")
+                continue
+            body = item.get('json')
+            if body is None:
+                body = {key: item[key] for key in ('message', 'session_id', 'filters') if key in item}
+                if 'message' not in body and item.get('title'):
+                    body['message'] = item['title']
+            requests.append((name, body))
+    return requests
+
+def synthetic_requests(count, mix=None, sessions=50, seed=0):
+    """
+    Creates a synthetic request mix. Suggestions and resets reuse the session's
+    last chat message, like the web UI does.
+
+    :param count: Number of requests.
+    :param mix: Dictionary of endpoint weights (defaults to DEFAULT_MIX).
+    :param sessions: Number of distinct sessions; 0 sends no session id, so every request shares one.
+    :param seed: Random seed.
+    :return: List of (endpoint name, JSON body) tuples.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    last_message = {}
+    requests = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        session = f"load-{rng.randrange(sessions)}" if sessions else None
+        message = last_message.get(session) if name == 'suggestions' else None
+        if message is None:
+            message = rng.choice(SYNTHETIC_MESSAGES)
+        if name in ('chat', 'chat_stream'):
+            last_message[session] = message
+        body = {'message': message} if name != 'reset_chat' else {}
+        if session is not None:
+            body['session_id'] = session
+        requests.append((name, body))
+    return requests
+
+# Per-worker memory, read from /proc
+
+def child_pids(parent_pid):
+    """
+    Returns the pids of the direct children of a process (e.g. the workers of a gunicorn master).
+    """
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields after it are space separated
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent_pid:
+            children.append(int(entry))
+    return sorted(children)
+
+def process_memory(pid):
+    """
+    Returns the resident (RSS) and proportional (PSS, shared pages split between
+    sharers) memory of a process in MiB, or None if it is gone.
+    """
+    memory = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    memory['rss_mb'] = int(line.split()[1]) / 1024
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    memory['pss_mb'] = int(line.split()[1]) / 1024
+    except OSError:
+        return memory or None
+    return memory
+
+class MemorySampler:
+    """
+    Samples the memory of a server process and its workers in a background thread, keeping the peaks.
+    """
+
+    def __init__(self, master_pid, interval=0.5):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peaks = {}
+        self.last = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='memory-sampler', daemon=True)
+
+    def sample(self):
+        for pid in [self.master_pid] + child_pids(self.master_pid):
+            memory = process_memory(pid)
+            if not memory:
+                continue
+            self.last[pid] = memory
+            peak = self.peaks.setdefault(pid, {})
+            for key, value in memory.items():
+                peak[key] = max(peak.get(key, 0.0), value)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def report(self):
+        return [
+            {'pid': pid, 'role': 'master' if pid == self.master_pid else 'worker',
+             **{f"peak_{key}": round(value, 1) for key, value in self.peaks[pid].items()},
+             **{f"final_{key}": round(value, 1) for key, value in self.last.get(pid, {}).items()}}
+            for pid in sorted(self.peaks)
+        ]
+
+# Server under test
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def spawn_server(args):
+    """
+    Starts the app under gunicorn with the fake chat model and waits until it is ready.
+
+    :return: Tuple of (Popen of the gunicorn master, base URL).
+    """
+    port = free_port()
+    env = {
+        **os.environ, 'LLM_BACKEND': 'fake',
+        'FAKE_LLM_FIRST_TOKEN_DELAY': str(args.llm_first_token_delay),
+        'FAKE_LLM_TOKEN_DELAY': str(args.llm_token_delay),
+    }
+    command = [
+        sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.workers), '--threads', str(args.threads), 'app:app',
+    ]
+    logging.info(f"Starting: {' '.join(command[2:])} (fake LLM, first token {args.llm_first_token_delay}s, "
+                 f"then {args.llm_token_delay}s per token)")
+    server = subprocess.Popen(command, cwd=args.app_dir, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL if not args.server_logs else None)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode} during startup.")
+        try:
+            if httpx.get(f"{url}/ready", timeout=1).status_code == 200:
+                logging.info(f"Server ready at {url}.")
+                return server, url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Server not ready after {args.startup_timeout}s.")
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+# Replay
+
+class ReplayResults:
+    """
+    Thread-safe collection of per-request outcomes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []  # (endpoint name, latency seconds, status or None, error or None)
+
+    def add(self, name, latency, status, error=None):
+        with self._lock:
+            self.samples.append((name, latency, status, error))
+
+def send(client, name, body, results, scheduled=None):
+    """
+    Sends one request and records its outcome. With an open-loop schedule the
+    latency counts from the scheduled start, so queueing in the load generator is not hidden.
+    """
+    start = time.perf_counter()
+    status = error = None
+    try:
+        if name == 'chat_stream':
+            with client.stream('POST', ENDPOINTS[name], json=body) as response:
+                status = response.status_code
+                for line in response.iter_lines():
+                    if line.startswith('event: error'):
+                        error = 'stream error event'
+        else:
+            status = client.post(ENDPOINTS[name], json=body).status_code
+    except httpx.HTTPError as e:
+        error = type(e).__name__
+    results.add(name, time.perf_counter() - (scheduled if scheduled is not None else start), status, error)
+
+def replay_closed_loop(client, requests, concurrency, results):
+    """
+    Keeps ``concurrency`` requests in flight, each client sending its next request as soon as one returns.
+    """
+    pending = iter(requests)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                item = next(pending, None)
+            if item is None:
+                return
+            send(client, *item, results)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def replay_open_loop(client, requests, rate, max_in_flight, results):
+    """
+    Starts requests at a fixed rate, whatever the server's response times.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for position, item in enumerate(requests):
+            scheduled = start + position / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, client, *item, results, scheduled)
+
+def summarize(samples, elapsed):
+    """
+    :return: Dictionary with request counts, error rate, throughput and latency percentiles in ms.
+    """
+    latencies = np.array([latency for _, latency, _, _ in samples]) * 1000
+    errors = sum(1 for _, _, status, error in samples if error or status is None or status >= 500)
+    rejected = sum(1 for _, _, status, _ in samples if status is not None and 400 <= status < 500)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'client_errors': rejected,
+        'throughput_rps': len(samples) / elapsed if elapsed else 0.0,
+    }
+    if len(latencies):
+        summary.update({
+            'latency_ms_p50': float(np.percentile(latencies, 50)),
+            'latency_ms_p95': float(np.percentile(latencies, 95)),
+            'latency_ms_p99': float(np.percentile(latencies, 99)),
+            'latency_ms_max': float(latencies.max()),
+        })
+    return summary
+
+def run_replay(args):
+    """
+    Replays the requests against the server and returns the report.
+    """
+    if args.log:
+        requests = read_request_log(args.log)
+        if args.requests:
+            requests = list(itertools.islice(itertools.cycle(requests), args.requests))
+    else:
+        requests = synthetic_requests(args.requests or 500, args.mix, args.sessions, args.seed)
+    logging.info(f"Replaying {len(requests)} requests "
+                 f"({f'{args.rate} req/s' if args.rate else f'concurrency {args.concurrency}'}).")
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = spawn_server(args)
+    master_pid = server.pid if server is not None else args.server_pid
+    sampler = MemorySampler(master_pid).start() if master_pid else None
+
+    results = ReplayResults()
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.max_in_flight))
+    try:
+        with httpx.Client(base_url=url, timeout=args.timeout, limits=limits) as client:
+            start = time.perf_counter()
+            if args.rate:
+                replay_open_loop(client, requests, args.rate, args.max_in_flight, results)
+            else:
+                replay_closed_loop(client, requests, args.concurrency, results)
+            elapsed = time.perf_counter() - start
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if server is not None:
+            stop_server(server)
+
+    endpoints = {}
+    for name in ENDPOINTS:
+        samples = [sample for sample in results.samples if sample[0] == name]
+        if samples:
+            endpoints[name] = summarize(samples, elapsed)
+    return {
+        'config': {
+            'url': args.url, 'workers': args.workers if server is not None else None,
+            'threads': args.threads if server is not None else None, 'concurrency': args.concurrency,
+            'rate': args.rate, 'log': args.log, 'sessions': args.sessions,
+            'llm_first_token_delay': args.llm_first_token_delay, 'llm_token_delay': args.llm_token_delay,
+        },
+        'elapsed_seconds': elapsed,
+        'overall': summarize(results.samples, elapsed),
+        'endpoints': endpoints,
+        'processes': sampler.report() if sampler is not None else [],
+    }
+
+def log_report(report):
+    def line(label, summary):
+        return (f"{label:<12} {summary['requests']:>6} req {summary['throughput_rps']:>8.1f} req/s "
+                f"p50 {summary.get('latency_ms_p50', 0):>8.1f}ms p95 {summary.get('latency_ms_p95', 0):>8.1f}ms "
+                f"p99 {summary.get('latency_ms_p99', 0):>8.1f}ms errors {summary['error_rate']:.1%}")
+
+    logging.info(line('overall', report['overall']))
+    for name, summary in report['endpoints'].items():
+        logging.info(line(name, summary))
+    for process in report['processes']:
+        logging.info(
+            f"{process['role']:<6} {process['pid']:>7}: peak RSS {process.get('peak_rss_mb', 0):.1f}MiB, "
+            f"peak PSS {process.get('peak_pss_mb', 0):.1f}MiB"
+        )
+
+def parse_args(argv=None):
+    """
+    Parses command line options for the load replay.
+
+    :param argv: Optional list of arguments (defaults to sys.argv).
+    :return: Parsed argparse namespace.
+    """
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic traffic against the app and report latency and memory.")
+    parser.add_argument('--log', help="Recorded request log (JSONL) to replay; a synthetic mix is used without it.")
+    parser.add_argument('--requests', type=int, default=0,
+                        help="Number of requests (synthetic default 500; a log is cycled to this length).")
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="Synthetic endpoint weights, e.g. chat=0.6,suggestions=0.3,reset_chat=0.1.")
+    parser.add_argument('--sessions', type=int, default=50,
+                        help="Synthetic sessions; 0 sends no session id, so all requests share one conversation.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Closed loop: requests kept in flight.")
+    parser.add_argument('--rate', type=float, default=0, help="Open loop: requests started per second (overrides --concurrency).")
+    parser.add_argument('--max-in-flight', type=int, default=256, help="Open loop: cap on outstanding requests.")
+    parser.add_argument('--timeout', type=float, default=60, help="Per-request timeout in seconds.")
+    parser.add_argument('--url', help="Replay against a running server instead of starting one.")
+    parser.add_argument('--server-pid', type=int, help="With --url: pid of the server master, to sample per-worker memory.")
+    parser.add_argument('--workers', type=int, default=2, help="Spawned server: gunicorn workers.")
+    parser.add_argument('--threads', type=int, default=4, help="Spawned server: threads per worker.")
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Spawned server: directory holding app.py and the embeddings.")
+    parser.add_argument('--llm-first-token-delay', type=float, default=0.3, help="Fake LLM: seconds before the first token.")
+    parser.add_argument('--llm-token-delay', type=float, default=0.01, help="Fake LLM: seconds between tokens.")
+    parser.add_argument('--startup-timeout', type=float, default=300, help="Spawned server: seconds to wait for /ready.")
+    parser.add_argument('--server-logs', action='store_true', help="Spawned server: show its log output.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the synthetic mix.")
+    parser.add_argument('--output', default='load_report.json', help="Where to write the JSON report.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Runs the replay and writes the report.
+
+    :param argv: Optional list of command line arguments.
+    """
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # httpx logs every request at INFO
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    report = run_replay(args)
+    log_report(report)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Wrote load report to '{args.output}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# metadata_index.py
+
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+
+# Default file name of the inverted metadata index written by process_data.py
+METADATA_INDEX_FILE = 'embeddings_filters.json'
+
+# Metadata fields that can be used as retrieval filters
+FILTER_FIELDS = ('industry', 'role', 'deep_tech_used', 'sheet_name')
+
+# Fields whose values are looked for in the query text when no filter is given
+DETECTED_FIELDS = ('industry', 'role')
+
+# Words too generic to identify an industry or role on their own
+_GENERIC_WORDS = {'and', 'services', 'service', 'goods', 'other', 'unknown', 'officer', 'chief', 'consumer'}
+
+def normalize_value(value):
+    """
+    Normalizes a metadata value for matching: lower case, single spaces.
+
+    :param value: Raw metadata value.
+    :return: Normalized string, or None for empty values.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    value = re.sub(r'\s+', ' ', str(value)).strip().lower()
+    return value or None
+
+def split_values(value):
+    """
+    Splits a multi-valued cell ("CEO\\nCOO", "AI, Data Insights") into normalized values.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return []
+    parts = re.split(r'[\n,;]+', str(value))
+    return [normalized for normalized in map(normalize_value, parts) if normalized]
+
+def build_metadata_index(records, fields=FILTER_FIELDS):
+    """
+    Builds inverted indexes from metadata values to record ids.
+
+    A record that stands for collapsed near duplicates (see chunking.collapse_records)
+    is indexed under the values of every merged row too.
+
+    :param records: Content/metadata records aligned with the search index.
+    :param fields: Metadata fields to index.
+    :return: Dictionary mapping field to {normalized value: sorted list of record ids}.
+    """
+    index = {field: {} for field in fields}
+    for record_id, record in enumerate(records):
+        metadata = record.get('metadata', {})
+        sources = [metadata, *metadata.get('merged_rows', ())]
+        for field in fields:
+            values = dict.fromkeys(value for source in sources for value in split_values(source.get(field)))
+            for value in values:
+                index[field].setdefault(value, []).append(record_id)
+    return index
+
+def save_metadata_index(metadata_index, num_records, output_file=METADATA_INDEX_FILE):
+    """
+    Writes the inverted metadata index to disk with the number of records it covers.
+    """
+    with open(f"{output_file}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({'num_records': num_records, 'fields': metadata_index}, f, ensure_ascii=False)
+    os.replace(f"{output_file}.tmp", output_file)
+    sizes = {field: len(values) for field, values in metadata_index.items()}
+    logging.info(f"Saved metadata filter index to '{output_file}' (distinct values: {sizes}).")
+
+def load_metadata_index(input_file=METADATA_INDEX_FILE, records=None):
+    """
+    Loads the inverted metadata index, building it from the records if the file is missing or stale.
+
+    :param input_file: Path of the metadata index JSON file.
+    :param records: Records the index must cover; the file is only trusted if it was saved for as
+        many records, otherwise the index is rebuilt from them.
+    :return: Dictionary mapping field to {normalized value: list of record ids}.
+    """
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        # Files written before the record count was saved are treated as stale
+        if 'fields' in saved and (records is None or saved.get('num_records') == len(records)):
+            return saved['fields']
+        if records is None:
+            raise ValueError(f"Metadata index '{input_file}' has an outdated format; rebuild it with process_data.py.")
+        logging.warning(f"Metadata index '{input_file}' does not match the corpus, rebuilding it.")
+    except FileNotFoundError:
+        if records is None:
+            raise
+        logging.info(f"Metadata index '{input_file}' not found, building it from the records.")
+    return build_metadata_index(records)
+
+def validate_filters(filters, fields=FILTER_FIELDS):
+    """
+    Checks filters received from a client.
+
+    :param filters: Dictionary mapping field to a non-empty string or a list of non-empty strings.
+    :param fields: Accepted filter fields.
+    :return: The filters, unchanged.
+    :raises ValueError: If the filters are not a dictionary, name an unknown field or hold other values.
+    """
+    if not isinstance(filters, dict):
+        raise ValueError("'filters' must be an object mapping a metadata field to a value or list of values.")
+    unknown = set(filters) - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown filter fields {sorted(unknown)}. Expected some of {list(fields)}.")
+    for field, values in filters.items():
+        if isinstance(values, str):
+            values = [values]
+        if (not isinstance(values, list) or not values
+                or not all(isinstance(value, str) and normalize_value(value) for value in values)):
+            raise ValueError(f"Filter '{field}' must be a non-empty string or a list of non-empty strings.")
+    return filters
+
+class FilteredSearcher:
+    """
+    Searches only the slice of the corpus that matches metadata filters.
+
+    Filters are resolved through the inverted metadata index to a set of record
+    ids; the vectors of that slice get their own small exact index, built on
+    first use and kept in an LRU cache, so a filtered query never scans the
+    rest of the corpus.
+    """
+
+    def __init__(self, metadata_index, vectors, max_cached_partitions=64):
+        """
+        :param metadata_index: Inverted index from build_metadata_index.
+        :param vectors: Corpus vectors (typically the memory-mapped embedding store).
+        :param max_cached_partitions: Number of partition sub-indexes kept in memory.
+        """
+        self.metadata_index = metadata_index
+        self.vectors = vectors
+        self.max_cached_partitions = max_cached_partitions
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+        self._phrases = self._build_detection_phrases()
+
+    def _build_detection_phrases(self):
+        # Each value can be recognized by its full text or by a distinctive part of it,
+        # e.g. "banking" for "banking & financial services"
+        phrases = {}
+        for field in DETECTED_FIELDS:
+            for value in self.metadata_index.get(field, {}):
+                candidates = {value} | {part.strip() for part in re.split(r'\s*(?:&|-|/|\band\b)\s*', value)}
+                for phrase in candidates:
+                    if len(phrase) >= 3 and phrase not in _GENERIC_WORDS:
+                        phrases.setdefault(field, {}).setdefault(phrase, set()).add(value)
+        return {
+            field: [(re.compile(rf'\b{re.escape(phrase)}\b'), values) for phrase, values in field_phrases.items()]
+            for field, field_phrases in phrases.items()
+        }
+
+    def detect_filters(self, query):
+        """
+        Finds industry and role values mentioned in a query.
+
+        :param query: Query text.
+        :return: Dictionary mapping field to a list of matched values (empty if none).
+        """
+        query = normalize_value(query) or ''
+        filters = {}
+        for field, patterns in self._phrases.items():
+            values = set()
+            for pattern, matched_values in patterns:
+                if pattern.search(query):
+                    values |= matched_values
+            if values:
+                filters[field] = sorted(values)
+        return filters
+
+    def resolve(self, filters):
+        """
+        Resolves filters to record ids: values of one field are OR-ed, fields are AND-ed.
+
+        :param filters: Dictionary mapping field to a value or list of values.
+        :return: Sorted int64 array of matching record ids.
+        """
+        selected = None
+        for field, values in filters.items():
+            if field not in self.metadata_index:
+                raise ValueError(f"Unknown filter field '{field}'. Expected one of {list(self.metadata_index)}.")
+            if isinstance(values, str):
+                values = [values]
+            ids = set()
+            for value in values:
+                for normalized in split_values(value):
+                    ids.update(self.metadata_index[field].get(normalized, ()))
+            selected = ids if selected is None else selected & ids
+        return np.array(sorted(selected or ()), dtype='int64')
+
+    @staticmethod
+    def partition_key(filters):
+        """
+        Returns a hashable key identifying the partition of validated filters (string values only).
+        """
+        key = []
+        for field, values in filters.items():
+            if isinstance(values, str):
+                values = [values]
+            normalized = {normalize_value(value) for value in values if isinstance(value, str)}
+            key.append((field, tuple(sorted(normalized - {None}))))
+        return tuple(sorted(key))
+
+    def _partition(self, filters):
+        key = self.partition_key(filters)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is not None:
+                self._partitions.move_to_end(key)
+                return partition
+        ids = self.resolve(filters)
+        sub_index = None
+        if ids.size:
+            sub_index = faiss.IndexFlatL2(self.vectors.shape[1])
+            sub_index.add(np.ascontiguousarray(self.vectors[ids], dtype='float32'))
+        partition = (ids, sub_index)
+        with self._lock:
+            self._partitions[key] = partition
+            while len(self._partitions) > self.max_cached_partitions:
+                self._partitions.popitem(last=False)
+        return partition
+
+    def search(self, query_embeddings, filters, k=5):
+        """
+        Searches the partition matching the filters.
+
+        :param query_embeddings: float32 matrix of shape (n, dim).
+        :param filters: Dictionary mapping field to a value or list of values.
+        :param k: Number of neighbours.
+        :return: Tuple of (distances, global record ids) shaped like faiss results, -1 padded.
+        """
+        ids, sub_index = self._partition(filters)
+        n = query_embeddings.shape[0]
+        if sub_index is None:
+            return np.full((n, k), np.inf, dtype='float32'), np.full((n, k), -1, dtype='int64')
+        distances, local = sub_index.search(np.ascontiguousarray(query_embeddings, dtype='float32'), k)
+        return distances, np.where(local >= 0, ids[np.maximum(local, 0)], -1)
@@ -0,0 +1,253 @@
+# metrics.py
+
+import math
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram buckets in seconds, from sub-millisecond lookups to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric '{self.name}' expects labels {list(self.labelnames)}, got {sorted(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, **extra):
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, optionally split by labels.
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(f"{self.name}_total", self._labels(key), value) for key, value in items]
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down.
+    """
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, self._labels(key), value) for key, value in items]
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets, with their sum and count.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", self._labels(key, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", self._labels(key), total))
+            samples.append((f"{self.name}_count", self._labels(key), count))
+        return samples
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together in the Prometheus text exposition format.
+
+    Besides metrics updated on the hot path, collectors can be registered: they
+    are called at scrape time to report figures other components already keep
+    (cache hit counters, queue depths), so those cost nothing per request.
+    Each process has its own registry; with several gunicorn workers a scrape
+    sees the worker that answered it.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """
+        Registers a callable returning a list of (name, type, help, [(labels dict, value), ...]) tuples.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """
+        :return: All metrics in the Prometheus text format.
+        """
+        lines = []
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                sample_name = f"{name}_total" if kind == 'counter' else name
+                lines.extend(f"{sample_name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+# Process-wide registry and the stage timings shared by the server modules
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram(
+    'pai_stage_duration_seconds', 'Time spent in each stage of a request.', ('stage',)
+)
+
+_current_trace = ContextVar('pai_request_trace', default=None)
+
+class RequestTrace:
+    """
+    Per-request record of stage durations, e.g. for a Server-Timing header.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        :return: Stage durations formatted as a Server-Timing header value.
+        """
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ', '.join(parts)
+
+def start_trace():
+    """
+    Starts a trace for the request handled by the current thread or task.
+    """
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+def current_trace():
+    return _current_trace.get()
+
+def record_stage(name, seconds):
+    """
+    Records a stage duration measured by the caller, e.g. the time to an LLM's first token.
+    """
+    STAGE_SECONDS.observe(seconds, stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+@contextmanager
+def stage(name):
+    """
+    Times a block as a request stage: observed in the stage histogram and added to the current trace.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
@@ -1,17 +1,41 @@
 # process_data.py
 
 import os
-import json
+import argparse
+import itertools
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import logging
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
-from nltk.tokenize import sent_tokenize
-import nltk
 from tqdm import tqdm
+from embedding_cache import (
+    EmbeddingCache, RowHasher, diff_row_hashes, load_row_hashes, save_row_hashes, log_row_report,
+)
+from embedding_store import (
+    convert_jsonl_to_store, load_embedding_store, write_embeddings_jsonl,
+    EMBEDDINGS_MATRIX_FILE, EMBEDDINGS_META_FILE, EMBEDDINGS_JSONL_FILE,
+)
+from metadata_index import METADATA_INDEX_FILE, build_metadata_index, save_metadata_index
+from lexical_index import (
+    LEXICAL_INDEX_FILE, BM25Index, LexicalSearcher, build_lexical_index, evaluate_lexical, save_lexical_index,
+)
+from suggestion_graph import SUGGESTIONS_FILE, build_suggestion_graph, save_suggestion_graph
+from snapshot import write_snapshot_marker
+from setup_nltk import ensure_nltk_data
+from chunking import CHUNKING_STRATEGIES, DEFAULT_CHUNKING, chunk_text, collapse_records, log_shrink_report
+from vector_index import (
+    INDEX_TYPES, STORAGE_TYPES, DEFAULT_INDEX_CONFIG, INDEX_FILE, INDEX_CONFIG_FILE,
+    make_index_config, build_index, save_index, evaluate_index,
+)
 
-# Initialize NLTK data
-nltk.download('punkt')
+# Files the server loads for one snapshot; the marker records their fingerprints
+SNAPSHOT_ARTIFACTS = (
+    EMBEDDINGS_MATRIX_FILE, EMBEDDINGS_META_FILE, INDEX_FILE, INDEX_CONFIG_FILE,
+    METADATA_INDEX_FILE, LEXICAL_INDEX_FILE, SUGGESTIONS_FILE,
+)
 
 def setup_logging(log_file='process_data.log'):
     """
@@ -60,18 +84,34 @@ def initialize_embedding_model(model_name='all-MiniLM-L6-v2'):
         logging.error(f"Error loading SentenceTransformer model '{model_name}': {e}")
         raise
 
-def read_excel_file(excel_file):
+# Columns whose text is embedded, in the order they are joined
+CONTENT_COLUMNS = ['Description', 'Use Case Description']
+
+# Metadata key, source column and the default used when the column is missing
+METADATA_COLUMNS = [
+    ('sr_no', 'Sr. No.', None),
+    ('industry', 'Industry', 'Unknown'),
+    ('role', 'Role', 'Unknown'),
+    ('title_of_use_case', 'Title of the Use Case', 'No Title'),
+    ('deep_tech_used', 'Deep Tech Used', 'N/A'),
+    ('potential_vector', 'Potential Vector', 'N/A'),
+    ('potential_vector_benefit', 'Potential Vector Benefit', 'N/A'),
+    ('use_case_case_study', 'Use Case/Case Study', 'N/A'),
+    ('casegenie_link', 'CaseGenie Link', 'N/A'),
+    ('dtsp', 'DTSP', 'N/A'),
+]
+
+def read_workbook(excel_file):
     """
-    Reads an Excel file and retrieves all sheet names.
+    Parses every sheet of an Excel file in a single pass.
 
     :param excel_file: Path to the Excel file.
-    :return: List of sheet names.
+    :return: Dictionary mapping sheet name to its DataFrame.
     """
     try:
-        xl = pd.ExcelFile(excel_file)
-        sheet_names = xl.sheet_names
-        logging.info(f"Found sheets: {sheet_names}")
-        return sheet_names
+        workbook = pd.read_excel(excel_file, sheet_name=None)
+        logging.info(f"Found sheets: {list(workbook)}")
+        return workbook
     except FileNotFoundError:
         logging.error(f"The file '{excel_file}' was not found.")
         raise
@@ -79,153 +119,449 @@ def read_excel_file(excel_file):
         logging.error(f"Error reading '{excel_file}': {e}")
         raise
 
-def process_sheet(sheet_name, df):
+def combine_columns(df, columns):
+    """
+    Joins the non-empty values of several columns with a space, column-wise.
+
+    :param df: DataFrame of the sheet.
+    :param columns: Names of the columns to join.
+    :return: Series of combined strings (empty where every column is empty).
+    """
+    combined = pd.Series('', index=df.index, dtype=object)
+    for col in columns:
+        values = df[col].astype(str).where(df[col].notna(), '')
+        separator = pd.Series(' ', index=df.index, dtype=object).where(combined.ne('') & values.ne(''), '')
+        combined = combined + separator + values
+    return combined.str.strip()
+
+def process_sheet(sheet_name, df, chunking=None):
     """
-    Processes a single sheet by extracting relevant columns, tokenizing into sentences,
+    Processes a single sheet by extracting relevant columns, cutting each row into chunks
     and preparing data entries.
 
     :param sheet_name: Name of the sheet.
     :param df: DataFrame of the sheet.
+    :param chunking: Optional keyword arguments for chunk_text (strategy, window size, ...).
     :return: List of processed data entries.
     """
-    data_entries = []
-    
-    # Define the columns to use for content. Adjust based on your needs.
-    content_columns = ['Description', 'Use Case Description']
-    
+    chunking = {**DEFAULT_CHUNKING, **(chunking or {})}
+    df = df.reset_index(drop=True)
+
     # Check if required content columns exist
-    for col in content_columns:
+    content_columns = [col for col in CONTENT_COLUMNS if col in df.columns]
+    for col in CONTENT_COLUMNS:
         if col not in df.columns:
             logging.warning(f"Column '{col}' not found in sheet '{sheet_name}'. Skipping this column.")
-    
-    # Combine specified content columns into a single 'combined_content' column
-    df['combined_content'] = df[content_columns].apply(
-        lambda row: ' '.join(row.dropna().astype(str)), axis=1
+
+    combined = combine_columns(df, content_columns)
+    empty_rows = int(combined.eq('').sum())
+    if empty_rows:
+        logging.info(f"{empty_rows} rows in sheet '{sheet_name}' have no content. Skipping them.")
+
+    # Cut each row into chunks, one chunk per element, keeping the row label
+    chunker = functools.partial(chunk_text, **chunking)
+    sentences = combined[combined.ne('')].map(chunker).explode().dropna().str.strip()
+    sentences = sentences[sentences.ne('')]
+
+    # Metadata is built once per row and shared by all of its sentences
+    metadata = pd.DataFrame(
+        {key: df[col] if col in df.columns else default for key, col, default in METADATA_COLUMNS},
+        index=df.index,
     )
-    
-    # Iterate through each row to tokenize and create data entries
-    for idx, row in df.iterrows():
-        combined_text = row.get('combined_content', '').strip()
-        if not combined_text:
-            logging.info(f"Row {idx + 1} in sheet '{sheet_name}' has no content. Skipping.")
-            continue
-        
-        # Tokenize the combined text into sentences
-        sentences = sent_tokenize(combined_text)
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence:
-                # Extract additional metadata as needed
-                sr_no = row.get('Sr. No.', None)
-                industry = row.get('Industry', 'Unknown')
-                role = row.get('Role', 'Unknown')
-                title_of_use_case = row.get('Title of the Use Case', 'No Title')
-                deep_tech_used = row.get('Deep Tech Used', 'N/A')
-                potential_vector = row.get('Potential Vector', 'N/A')
-                potential_vector_benefit = row.get('Potential Vector Benefit', 'N/A')
-                use_case_case_study = row.get('Use Case/Case Study', 'N/A')
-                casegenie_link = row.get('CaseGenie Link', 'N/A')
-                dtsp = row.get('DTSP', 'N/A')
-                
-                data_entries.append({
-                    'content': sentence,
-                    'metadata': {
-                        'sheet_name': sheet_name,
-                        'row_index': idx + 1,  # 1-based indexing
-                        'sr_no': sr_no,
-                        'industry': industry,
-                        'role': role,
-                        'title_of_use_case': title_of_use_case,
-                        'deep_tech_used': deep_tech_used,
-                        'potential_vector': potential_vector,
-                        'potential_vector_benefit': potential_vector_benefit,
-                        'use_case_case_study': use_case_case_study,
-                        'casegenie_link': casegenie_link,
-                        'dtsp': dtsp
-                    }
-                })
-                logging.debug(f"Processed sentence from row {idx + 1} in sheet '{sheet_name}'.")
-    
-    logging.info(f"Processed {len(data_entries)} sentences from sheet '{sheet_name}'.")
+    row_metadata = metadata.loc[sentences.index.unique()].to_dict('index')
+
+    data_entries = [
+        {
+            'content': sentence,
+            'metadata': {'sheet_name': sheet_name, 'row_index': idx + 1, **row_metadata[idx]},  # 1-based indexing
+        }
+        for idx, sentence in sentences.items()
+    ]
+
+    logging.info(f"Processed {len(data_entries)} {chunking['strategy']} chunks from sheet '{sheet_name}'.")
     return data_entries
 
-def generate_embeddings(data_entries, embedding_model):
+def _process_sheet_safely(sheet_name, df, chunking=None):
+    """
+    Runs process_sheet, logging failures so one bad sheet doesn't stop the run.
+    """
+    logging.info(f"Processing sheet: '{sheet_name}'")
+    try:
+        return process_sheet(sheet_name, df, chunking)
+    except Exception as e:
+        logging.error(f"Failed to process sheet '{sheet_name}': {e}")
+        return []
+
+def iter_data_entries(workbook, num_workers=0, chunking=None):
+    """
+    Streams the data entries of every sheet, processing sheets in parallel.
+
+    Entries are yielded sheet by sheet in workbook order as soon as each sheet
+    is done, so the embedding stage can start before every sheet is parsed.
+
+    :param workbook: Dictionary mapping sheet name to its DataFrame.
+    :param num_workers: Number of processes used for sheets; 0 or 1 runs in this process.
+    :param chunking: Optional keyword arguments for chunk_text.
+    :return: Generator of data entries.
     """
-    Generates embeddings for each data entry using the provided embedding model.
+    if num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            chunkings = itertools.repeat(chunking, len(workbook))
+            for data_entries in executor.map(_process_sheet_safely, workbook.keys(), workbook.values(), chunkings):
+                yield from data_entries
+    else:
+        for sheet_name, df in workbook.items():
+            yield from _process_sheet_safely(sheet_name, df, chunking)
 
-    :param data_entries: List of data entries.
+def encode_texts(texts, embedding_model, batch_size=64, pool=None):
+    """
+    Encodes a list of texts in one batched call to the embedding model.
+
+    :param texts: List of strings to encode.
     :param embedding_model: Initialized SentenceTransformer model.
-    :return: List of data entries with embeddings.
+    :param batch_size: Number of texts per forward pass of the model.
+    :param pool: Optional multi-process pool from start_multi_process_pool.
+    :return: float32 array of shape (len(texts), dim).
     """
-    logging.info("Generating embeddings...")
-    
-    for item in tqdm(data_entries, desc="Generating embeddings"):
+    if pool is not None:
+        embeddings = embedding_model.encode_multi_process(texts, pool, batch_size=batch_size)
+    else:
+        embeddings = embedding_model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    return np.asarray(embeddings, dtype='float32')
+
+def _embed_items_individually(items, embedding_model):
+    """
+    Fallback for a failed batch: encodes items one by one so a single bad item
+    only loses its own embedding.
+
+    :param items: List of data entries from the failed batch.
+    :param embedding_model: Initialized SentenceTransformer model.
+    """
+    for item in items:
         try:
-            embedding = embedding_model.encode(item['content']).tolist()
-            item['embedding'] = embedding
+            item['embedding'] = embedding_model.encode(item['content']).tolist()
         except Exception as e:
             logging.error(f"Error generating embedding for content: '{item['content']}'. Error: {e}")
             item['embedding'] = []
-    
-    logging.info("Embedding generation completed.")
-    return data_entries
 
-def save_embeddings(data_entries, output_file='embeddings.json'):
+def _embed_batch(batch, embedding_model, batch_size, pool=None, cache=None):
     """
-    Saves the data entries with embeddings to a JSON file.
+    Fills in the 'embedding' of every entry of one batch.
+
+    Cached vectors are reused, the rest are encoded together; if that call fails
+    the entries are retried one by one.
 
-    :param data_entries: List of data entries with embeddings.
-    :param output_file: Name of the output JSON file.
+    :param batch: List of data entries.
+    :param embedding_model: Initialized SentenceTransformer model.
+    :param batch_size: Number of sentences per forward pass of the model.
+    :param pool: Optional multi-process pool from start_multi_process_pool.
+    :param cache: Optional EmbeddingCache of previously computed vectors.
     """
+    if cache is not None:
+        cached = cache.get_many([item['content'] for item in batch])
+        for item, vector in zip(batch, cached):
+            if vector is not None:
+                item['embedding'] = vector.tolist()
+        batch = [item for item, vector in zip(batch, cached) if vector is None]
+        if not batch:
+            return
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data_entries, f, indent=4, ensure_ascii=False)
-        logging.info(f"Successfully saved {len(data_entries)} embeddings to '{output_file}'.")
+        embeddings = encode_texts([item['content'] for item in batch], embedding_model, batch_size, pool)
+        for item, embedding in zip(batch, embeddings):
+            item['embedding'] = embedding.tolist()
     except Exception as e:
-        logging.error(f"Error saving embeddings to '{output_file}': {e}")
-        raise
+        logging.warning(f"Batch of {len(batch)} sentences failed ({e}). Retrying item by item.")
+        _embed_items_individually(batch, embedding_model)
+    if cache is not None:
+        fresh = [item for item in batch if item['embedding']]
+        cache.put_many([item['content'] for item in fresh], [item['embedding'] for item in fresh])
+
+def iter_embeddings(data_entries, embedding_model, batch_size=64, num_workers=0, cache=None):
+    """
+    Embeds a stream of data entries batch by batch, yielding them as they are done.
+
+    If a batch fails, its entries are retried one at a time and any entry that
+    still fails gets an empty embedding, so errors stay isolated to single items.
+    With a cache, sentences already embedded by an earlier run reuse their stored
+    vector and only the remaining ones are encoded.
+
+    :param data_entries: Iterable of data entries (a list or a generator).
+    :param embedding_model: Initialized SentenceTransformer model.
+    :param batch_size: Number of sentences encoded per model call.
+    :param num_workers: Number of encoding processes; 0 or 1 encodes in this process.
+    :param cache: Optional EmbeddingCache of previously computed vectors.
+    :return: Generator of data entries with embeddings.
+    """
+    logging.info(f"Generating embeddings (batch size {batch_size}, workers {max(num_workers, 1)})...")
+
+    pool = None
+    if num_workers > 1:
+        pool = embedding_model.start_multi_process_pool(target_devices=['cpu'] * num_workers)
+    # With a pool each slice is split across the worker processes, so hand it enough work
+    slice_size = batch_size * max(num_workers, 1)
+    entries = iter(data_entries)
+    total = len(data_entries) if hasattr(data_entries, '__len__') else None
+
+    try:
+        with tqdm(total=total, desc="Generating embeddings") as progress:
+            while True:
+                batch = list(itertools.islice(entries, slice_size))
+                if not batch:
+                    break
+                _embed_batch(batch, embedding_model, batch_size, pool, cache)
+                progress.update(len(batch))
+                yield from batch
+    finally:
+        if pool is not None:
+            embedding_model.stop_multi_process_pool(pool)
+
+    if cache is not None:
+        logging.info(f"Embedding cache: {cache.hits} reused, {cache.misses} encoded.")
+    logging.info("Embedding generation completed.")
 
-def main():
+def generate_embeddings(data_entries, embedding_model, batch_size=64, num_workers=0, cache=None):
+    """
+    Generates embeddings for the data entries in batches using the provided embedding model.
+
+    :param data_entries: Iterable of data entries.
+    :param embedding_model: Initialized SentenceTransformer model.
+    :param batch_size: Number of sentences encoded per model call.
+    :param num_workers: Number of encoding processes; 0 or 1 encodes in this process.
+    :param cache: Optional EmbeddingCache of previously computed vectors.
+    :return: List of data entries with embeddings.
+    """
+    return list(iter_embeddings(data_entries, embedding_model, batch_size, num_workers, cache))
+
+def save_embeddings(data_entries, output_file=EMBEDDINGS_JSONL_FILE,
+                    matrix_file=EMBEDDINGS_MATRIX_FILE, meta_file=EMBEDDINGS_META_FILE):
+    """
+    Saves the data entries with embeddings to a JSONL file (one entry per line) and
+    to the binary embedding store (float32 matrix plus content/metadata sidecar) used by the server.
+
+    Entries are written to the JSONL file as they are consumed, and the file is then
+    streamed into the memory-mapped store block by block, so a generator such as
+    iter_embeddings is never materialized.
+
+    :param data_entries: Iterable of data entries with embeddings (a list or a generator).
+    :param output_file: Name of the output JSONL file.
+    :param matrix_file: Name of the output .npy embedding matrix.
+    :param meta_file: Name of the output content/metadata sidecar.
+    :return: Number of vectors saved.
+    """
+    write_embeddings_jsonl(data_entries, output_file)
+    return convert_jsonl_to_store(output_file, matrix_file, meta_file)
+
+def hash_rows(data_entries, hasher):
+    """
+    Passes data entries through unchanged, adding each one to a RowHasher on the way.
+    """
+    for item in data_entries:
+        hasher.add(item)
+        yield item
+
+def collapse_saved_duplicates(threshold, output_file=EMBEDDINGS_JSONL_FILE,
+                              matrix_file=EMBEDDINGS_MATRIX_FILE, meta_file=EMBEDDINGS_META_FILE):
+    """
+    Collapses near-duplicate chunks of the saved embeddings and rewrites the JSONL file and the store.
+
+    :param threshold: Minimum cosine similarity for two chunks to count as duplicates.
+    :return: Number of vectors kept.
+    """
+    vectors, records = load_embedding_store(matrix_file, meta_file)
+    kept_rows, kept_records = collapse_records(vectors, records, threshold)
+    if len(kept_rows) == len(records):
+        return len(records)
+    entries = (
+        {'content': record['content'], 'metadata': record['metadata'], 'embedding': vectors[row]}
+        for row, record in zip(kept_rows, kept_records)
+    )
+    return save_embeddings(entries, output_file, matrix_file, meta_file)
+
+def previous_vector_count(matrix_file=EMBEDDINGS_MATRIX_FILE):
+    """
+    Returns the number of vectors in the existing embedding store, or None if there is none.
+    """
+    try:
+        return int(np.load(matrix_file, mmap_mode='r').shape[0])
+    except (FileNotFoundError, ValueError):
+        return None
+
+def build_search_index(args, matrix_file=EMBEDDINGS_MATRIX_FILE):
+    """
+    Builds the configured search index from the saved embedding matrix, writes it
+    to disk and logs its recall against exact flat search.
+
+    :param args: Parsed command line options.
+    :param matrix_file: Path of the .npy embedding matrix.
+    :return: The built index.
+    """
+    # Memory-mapped: faiss reads the float32 rows in place instead of a second copy in RAM
+    vectors = np.load(matrix_file, mmap_mode='r')
+    config = make_index_config(
+        index_type=args.index_type, storage=args.storage, pq_m=args.pq_m, pq_nbits=args.pq_nbits, nlist=args.nlist, nprobe=args.nprobe,
+        hnsw_m=args.hnsw_m, ef_construction=args.ef_construction, ef_search=args.ef_search,
+    )
+    index, config = build_index(vectors, config)
+    save_index(index, config)
+    if config['factory'] != 'Flat':
+        stats = evaluate_index(index, vectors)
+        logging.info(
+            f"Index recall@{stats['k']} vs flat: {stats['recall_at_k']:.3f}, "
+            f"p50 {stats['latency_ms_p50']:.3f}ms (flat {stats['flat_latency_ms_p50']:.3f}ms), "
+            f"{stats['memory_bytes'] / 2**20:.2f}MiB vs {stats['float32_bytes'] / 2**20:.2f}MiB as float32."
+        )
+    return index
+
+def log_lexical_report(searcher, records, embedding_model, index, sample_size=200):
+    """
+    Logs how the BM25 fast path compares with vector search, using use case titles as sample keyword queries.
+
+    :param searcher: LexicalSearcher over the new corpus.
+    :param records: Content/metadata records.
+    :param embedding_model: SentenceTransformer used for the vector path.
+    :param index: Search index over the new corpus.
+    :param sample_size: Maximum number of titles queried.
+    """
+    titles = list(dict.fromkeys(
+        str(record['metadata'].get('title_of_use_case')) for record in records
+        if record['metadata'].get('title_of_use_case') not in (None, '', 'No Title')
+    ))[:sample_size]
+    if not titles:
+        return
+    stats = evaluate_lexical(searcher, titles, embedding_model, index)
+    logging.info(
+        f"BM25 fast path answers {stats['fast_path_share']:.0%} of {stats['queries']} title queries "
+        f"in {stats['lexical_ms_p50']:.3f}ms p50 (vector {stats['vector_ms_p50']:.3f}ms); "
+        f"{stats['fast_path_agreement']:.0%} of its results are also relevant vector hits."
+    )
+
+def parse_args(argv=None):
+    """
+    Parses command line options for the ingestion run.
+
+    :param argv: Optional list of arguments (defaults to sys.argv).
+    :return: Parsed argparse namespace.
+    """
+    parser = argparse.ArgumentParser(description="Build embeddings for the AI use case corpus.")
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help="Number of sentences encoded per model call.")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Number of encoding processes (0 or 1 encodes in-process).")
+    parser.add_argument('--sheet-workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help="Number of processes used to tokenize sheets in parallel.")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2',
+                        help="SentenceTransformer model used for the embeddings.")
+    parser.add_argument('--cache-file', default='embedding_cache.sqlite',
+                        help="Persistent embedding cache used to skip unchanged sentences.")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Re-embed every sentence without reading or writing the cache.")
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default=DEFAULT_INDEX_CONFIG['index_type'],
+                        help="Search index built for the server.")
+    parser.add_argument('--storage', choices=STORAGE_TYPES, default=DEFAULT_INDEX_CONFIG['storage'],
+                        help="Vector encoding inside the index: float32, float16, int8 (scalar) or pq.")
+    parser.add_argument('--pq-m', type=int, default=DEFAULT_INDEX_CONFIG['pq_m'],
+                        help="PQ: sub-quantizers per vector (must divide the dimension).")
+    parser.add_argument('--pq-nbits', type=int, default=DEFAULT_INDEX_CONFIG['pq_nbits'],
+                        help="PQ: bits per sub-quantizer code.")
+    parser.add_argument('--nlist', type=int, default=DEFAULT_INDEX_CONFIG['nlist'],
+                        help="IVF: number of clusters.")
+    parser.add_argument('--nprobe', type=int, default=DEFAULT_INDEX_CONFIG['nprobe'],
+                        help="IVF: clusters searched per query.")
+    parser.add_argument('--hnsw-m', type=int, default=DEFAULT_INDEX_CONFIG['hnsw_m'],
+                        help="HNSW: neighbours per graph node.")
+    parser.add_argument('--ef-construction', type=int, default=DEFAULT_INDEX_CONFIG['ef_construction'],
+                        help="HNSW: candidate list size while building.")
+    parser.add_argument('--ef-search', type=int, default=DEFAULT_INDEX_CONFIG['ef_search'],
+                        help="HNSW: candidate list size while searching.")
+    parser.add_argument('--chunking', choices=CHUNKING_STRATEGIES, default=DEFAULT_CHUNKING['strategy'],
+                        help="How rows are cut into embedded chunks: per sentence, per use case or sliding word windows.")
+    parser.add_argument('--window-tokens', type=int, default=DEFAULT_CHUNKING['window_tokens'],
+                        help="Window chunking: words per chunk.")
+    parser.add_argument('--window-overlap', type=int, default=DEFAULT_CHUNKING['window_overlap'],
+                        help="Window chunking: words shared by consecutive chunks.")
+    parser.add_argument('--min-chunk-tokens', type=int, default=DEFAULT_CHUNKING['min_tokens'],
+                        help="Chunks with fewer words are merged into a neighbour, or dropped if a row has nothing "
+                             "longer (default 1: every chunk is kept as is).")
+    parser.add_argument('--dedup-threshold', type=float, default=1.0,
+                        help="Cosine similarity above which chunks are collapsed as near duplicates, e.g. 0.97 "
+                             "(default 1: disabled).")
+    parser.add_argument('--manifest-file', default='ingest_manifest.json',
+                        help="Row hashes of the last run, used for the change report.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """
     Main function to orchestrate the data processing and embedding generation.
+
+    :param argv: Optional list of command line arguments.
     """
+    args = parse_args(argv)
     setup_logging()
     logging.info("Starting data processing...")
+
+    # Sentence chunking needs the punkt tokenizer; fetched here rather than at import so the
+    # functions of this module can be used offline
+    ensure_nltk_data(['punkt', 'punkt_tab'])
     
     # Load environment variables
     env_vars = load_environment_variables()
     
     # Initialize embedding model
-    embedding_model = initialize_embedding_model()
+    embedding_model = initialize_embedding_model(args.model)
     
     # Define the path to your Excel file
     excel_file = 'data.xlsx'  # Replace with your actual file path if different
     
-    # Read Excel file and get sheet names
-    sheet_names = read_excel_file(excel_file)
-    
-    all_data_entries = []
-    
-    # Process each sheet
-    for sheet in sheet_names:
-        logging.info(f"Processing sheet: '{sheet}'")
-        try:
-            df = pd.read_excel(excel_file, sheet_name=sheet)
-            data_entries = process_sheet(sheet, df)
-            all_data_entries.extend(data_entries)
-        except Exception as e:
-            logging.error(f"Failed to process sheet '{sheet}': {e}")
-            continue
-    
-    if not all_data_entries:
-        logging.warning("No data entries found. Exiting without generating embeddings.")
-        return
-    
-    # Generate embeddings
-    all_data_entries = generate_embeddings(all_data_entries, embedding_model)
+    # Parse the workbook once; sheets are tokenized in parallel and streamed into the embedding stage
+    workbook = read_workbook(excel_file)
+    chunking = {
+        'strategy': args.chunking, 'window_tokens': args.window_tokens,
+        'window_overlap': args.window_overlap, 'min_tokens': args.min_chunk_tokens,
+    }
+    data_entries = iter_data_entries(workbook, args.sheet_workers, chunking)
     
-    # Save embeddings to JSON
-    save_embeddings(all_data_entries)
+    # Generate embeddings, reusing cached vectors of unchanged sentences
+    cache = None if args.no_cache else EmbeddingCache(args.cache_file, args.model)
+    previous_count = previous_vector_count()
+    try:
+        entries = iter_embeddings(
+            data_entries, embedding_model, batch_size=args.batch_size, num_workers=args.workers, cache=cache
+        )
+        first = next(entries, None)
+        if first is None:
+            logging.warning("No data entries found. Exiting without saving embeddings.")
+            return
+
+        # Entries are written to JSONL as they are embedded, then streamed into the memory-mapped store;
+        # row hashes are collected on the way for the change report
+        hasher = RowHasher()
+        chunk_count = save_embeddings(hash_rows(itertools.chain([first], entries), hasher))
+        row_hashes = hasher.hashes()
+        log_row_report(diff_row_hashes(load_row_hashes(args.manifest_file), row_hashes))
+
+        # Optionally collapse near-duplicate chunks (repeated boilerplate) into one vector each
+        kept_count = chunk_count
+        if args.dedup_threshold < 1:
+            kept_count = collapse_saved_duplicates(args.dedup_threshold)
+        vectors, records = load_embedding_store()
+        log_shrink_report(chunk_count, kept_count, vectors.shape[1], previous_count)
+        save_row_hashes(row_hashes, args.manifest_file)
+
+        # Build the search index, the metadata filter index and the suggestion table offline
+        # so the server can load them ready to use
+        index = build_search_index(args)
+        save_metadata_index(build_metadata_index(records), len(records))
+        lexical_index = build_lexical_index(records)
+        save_lexical_index(lexical_index)
+        log_lexical_report(LexicalSearcher(BM25Index(lexical_index)), records, embedding_model, index)
+        save_suggestion_graph(build_suggestion_graph(vectors, records))
+        # Written last: running servers reload once every artifact of this run is in place
+        write_snapshot_marker(artifacts=SNAPSHOT_ARTIFACTS, vectors=len(records))
+        if cache is not None:
+            logging.info(f"Pruned {cache.prune()} stale entries from the embedding cache.")
+    finally:
+        if cache is not None:
+            cache.close()
     
     logging.info("Data processing and embedding generation completed successfully.")
 
@@ -0,0 +1,192 @@
+# prompt_builder.py
+
+import re
+import math
+from collections import OrderedDict
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to an approximate count
+    tiktoken = None
+
+# Tokens a chat API adds around every message (role markers and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Instructions and refusal shared by the web app and the batch mode of chatbot.py
+SYSTEM_PROMPT = 'You are a friendly conversational chatbot only responding to AI use cases and related topics.'
+NOT_RELATED_RESPONSE = "This question is not related to AI use cases, so I cannot answer."
+
+class TokenCounter:
+    """
+    Counts prompt tokens with tiktoken when it is installed, otherwise approximately.
+
+    The approximation counts words and punctuation marks and adds a share for
+    long words that tokenizers split, which stays within a few percent of
+    Llama/GPT tokenizers on English text.
+    """
+
+    def __init__(self, encoding_name='cl100k_base'):
+        self._encoding = tiktoken.get_encoding(encoding_name) if tiktoken is not None else None
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        pieces = re.findall(r"\w+|[^\w\s]", text)
+        return sum(1 + len(piece) // 8 for piece in pieces)
+
+    def truncate(self, text, max_tokens):
+        """
+        Returns the longest prefix of text that counts at most max_tokens tokens.
+        """
+        if max_tokens <= 0:
+            return ''
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text)[:max_tokens])
+        end = 0
+        tokens = 0
+        for piece in re.finditer(r"\w+|[^\w\s]", text):
+            tokens += 1 + len(piece.group()) // 8
+            if tokens > max_tokens:
+                break
+            end = piece.end()
+        return text[:end]
+
+    def count_messages(self, messages):
+        return sum(self.count(message.content) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value in ('', 'No Title', 'N/A')
+
+def merge_context(context_records):
+    """
+    Deduplicates retrieved records and merges sentences of the same use case into one block.
+
+    :param context_records: Retrieved records (content and metadata), nearest first.
+    :return: List of context block strings, in order of each use case's best hit.
+    """
+    groups = OrderedDict()
+    seen = set()
+    for record in context_records:
+        content = record['content'].strip()
+        normalized = ' '.join(content.lower().split())
+        if not content or normalized in seen:
+            continue
+        seen.add(normalized)
+        metadata = record.get('metadata', {})
+        title = metadata.get('title_of_use_case')
+        key = None if _is_missing(title) else title
+        if key is None:
+            groups[('record', len(groups))] = {'title': None, 'metadata': metadata, 'sentences': [content]}
+        else:
+            group = groups.setdefault(key, {'title': title, 'metadata': metadata, 'sentences': []})
+            group['sentences'].append(content)
+
+    blocks = []
+    for group in groups.values():
+        body = ' '.join(group['sentences'])
+        if group['title'] is None:
+            blocks.append(body)
+            continue
+        details = [
+            str(group['metadata'][field]) for field in ('industry', 'role')
+            if not _is_missing(group['metadata'].get(field))
+        ]
+        header = f"Use case: {group['title']}" + (f" ({', '.join(details)})" if details else '')
+        blocks.append(f"{header}\n{body}")
+    return blocks
+
+class PromptBuilder:
+    """
+    Assembles the chat prompt within a token budget.
+
+    The system prompt and the user's message are always included. Retrieved
+    context, merged per use case, is added next in ranking order up to
+    ``context_budget`` tokens, and the remaining budget is filled with the most
+    recent conversation history. A user message too long to leave room for the
+    context is cut short rather than crowding the context out. Context lives in
+    the system message of the current turn only, so it is never replayed in
+    later prompts.
+    """
+
+    def __init__(self, system_prompt, token_budget=3000, context_budget=1200, counter=None):
+        """
+        :param system_prompt: Base instructions for the model.
+        :param token_budget: Maximum number of prompt tokens.
+        :param context_budget: Maximum number of tokens of retrieved context.
+        :param counter: Optional TokenCounter.
+        """
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.context_budget = context_budget
+        self.counter = counter or TokenCounter()
+
+    def build(self, user_message, history=(), context_records=()):
+        """
+        Builds the prompt messages for one turn.
+
+        :param user_message: Current user message.
+        :param history: Previous conversation messages, oldest first.
+        :param context_records: Retrieved records, nearest first.
+        :return: Tuple of (list of messages, usage dictionary with token counts).
+        """
+        count = self.counter.count
+        header = "\n\nAnswer using the following AI use case context:\n"
+        blocks = merge_context(context_records)
+        fixed = count(self.system_prompt) + 2 * MESSAGE_OVERHEAD_TOKENS
+
+        # The answer is grounded in the context, so an overlong message must leave room for it
+        reserved = min(self.context_budget, sum(count(block) + 1 for block in blocks)) + count(header) if blocks else 0
+        user_limit = max(self.token_budget - fixed - reserved, 0)
+        user_tokens = count(user_message)
+        truncated = user_tokens > user_limit
+        if truncated:
+            user_message = self.counter.truncate(user_message, user_limit)
+            user_tokens = count(user_message)
+        human = HumanMessage(content=user_message)
+        used = fixed + user_tokens
+
+        # Fresh context first: it matters more for this answer than old turns
+        context_blocks = []
+        context_tokens = 0
+        context_limit = max(min(self.context_budget, self.token_budget - used - count(header)), 0)
+        for block in blocks:
+            block_tokens = count(block) + 1
+            if context_tokens + block_tokens > context_limit:
+                continue
+            context_blocks.append(block)
+            context_tokens += block_tokens
+        system_content = self.system_prompt
+        if context_blocks:
+            system_content += header + "\n\n".join(context_blocks)
+            context_tokens += count(header)
+        used += context_tokens
+
+        # Then as much recent history as still fits, keeping user/assistant pairs together
+        kept = []
+        history = [m for m in history if isinstance(m, (HumanMessage, AIMessage))]
+        position = len(history)
+        while position > 0:
+            start = position - 2 if position >= 2 and isinstance(history[position - 2], HumanMessage) else position - 1
+            turn = history[start:position]
+            turn_tokens = self.counter.count_messages(turn)
+            if used + turn_tokens > self.token_budget:
+                break
+            kept[:0] = turn
+            used += turn_tokens
+            position = start
+
+        messages = [SystemMessage(content=system_content), *kept, human]
+        usage = {
+            'prompt_tokens': used,
+            'context_tokens': context_tokens,
+            'context_blocks': len(context_blocks),
+            'history_tokens': self.counter.count_messages(kept),
+            'history_messages': len(kept),
+            'history_messages_dropped': len(history) - len(kept),
+            'user_message_truncated': truncated,
+            'token_budget': self.token_budget,
+        }
+        return messages, usage
@@ -0,0 +1,103 @@
+# query_cache.py
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+def normalize_query(text):
+    """
+    Normalizes query text so trivially different spellings share a cache entry.
+
+    :param text: Raw query text.
+    :return: Lower-cased text with collapsed whitespace.
+    """
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live.
+
+    Used to remember the query embedding and nearest neighbours of recent
+    queries, so /chat and /suggestions don't encode and search the same text twice.
+    """
+
+    def __init__(self, max_size=1024, ttl=3600, clock=time.monotonic):
+        """
+        :param max_size: Maximum number of entries; the least recently used entry is evicted.
+        :param ttl: Seconds an entry stays valid; 0 or None disables expiry.
+        :param clock: Time source, replaceable for deterministic use.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Returns the cached value for a key, or None if it is missing or expired.
+
+        :param key: Hashable cache key.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and self.clock() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry when full.
+
+        :param key: Hashable cache key.
+        :param value: Value to cache.
+        """
+        if self.max_size <= 0:
+            return
+        expires_at = self.clock() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry, e.g. after the search index changed.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        :return: Dictionary of size and hit/miss/eviction counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,125 @@
+# response_cache.py
+
+import time
+import itertools
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class SemanticResponseCache:
+    """
+    Cache of LLM answers looked up by query meaning rather than exact text.
+
+    An entry is keyed by the query embedding and the ids of the retrieved
+    context. A lookup hits when a stored entry has exactly the same context ids
+    and a query embedding whose cosine similarity is at least ``threshold``, so
+    "AI use cases in banking" can reuse the answer to "banking AI use cases".
+    Entries are evicted least-recently-used beyond ``max_entries`` and expire
+    after ``ttl`` seconds. Only meant for turns without conversation history,
+    whose answer depends on nothing but the query and its context.
+    """
+
+    def __init__(self, threshold=0.95, max_entries=512, ttl=3600, clock=time.monotonic):
+        """
+        :param threshold: Minimum cosine similarity between query embeddings for a hit.
+        :param max_entries: Maximum number of cached answers.
+        :param ttl: Seconds an answer stays valid; 0 or None disables expiry.
+        :param clock: Time source, replaceable for deterministic use.
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()   # entry id -> (context key, unit vector, response, expires_at)
+        self._by_context = {}           # context key -> set of entry ids
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _context_key(context_ids):
+        return tuple(sorted(int(i) for i in context_ids))
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove_locked(self, entry_id):
+        context_key = self._entries.pop(entry_id)[0]
+        ids = self._by_context[context_key]
+        ids.discard(entry_id)
+        if not ids:
+            del self._by_context[context_key]
+
+    def lookup(self, query_embedding, context_ids):
+        """
+        Returns a cached answer for a similar query with the same context, or None.
+
+        :param query_embedding: Embedding of the query.
+        :param context_ids: Ids of the retrieved context records.
+        """
+        context_key = self._context_key(context_ids)
+        query = self._unit(query_embedding)
+        now = self.clock()
+        with self._lock:
+            candidates = list(self._by_context.get(context_key, ()))
+            for entry_id in candidates:
+                if self.ttl and self._entries[entry_id][3] <= now:
+                    self._remove_locked(entry_id)
+            candidates = [entry_id for entry_id in candidates if entry_id in self._entries]
+            if candidates:
+                similarities = np.stack([self._entries[i][1] for i in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(candidates[best])
+                    self.hits += 1
+                    return self._entries[candidates[best]][2]
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, context_ids, response):
+        """
+        Caches the answer generated for a query and its context.
+
+        :param query_embedding: Embedding of the query.
+        :param context_ids: Ids of the retrieved context records.
+        :param response: Answer text from the LLM.
+        """
+        if self.max_entries <= 0:
+            return
+        context_key = self._context_key(context_ids)
+        expires_at = self.clock() + self.ttl if self.ttl else None
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (context_key, self._unit(query_embedding), response, expires_at)
+            self._by_context.setdefault(context_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove_locked(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every cached answer, e.g. after the corpus changed.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self):
+        """
+        :return: Dictionary of size and hit/miss/eviction counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,73 @@
+# response_format.py
+
+import re
+
+def format_numbered_lists(text):
+    """
+    Collapses the whitespace after the number of numbered list items ("1.   Fraud" -> "1. Fraud").
+
+    :param text: Generated response text.
+    :return: Formatted text.
+    """
+    lines = text.split('\n')
+    formatted_lines = []
+    for line in lines:
+        match = re.match(r'^(\d+)\.\s+(.*)', line)
+        if match:
+            formatted_lines.append(f"{match[1]}. {match[2]}")
+        else:
+            formatted_lines.append(line)
+    return '\n'.join(formatted_lines)
+
+class NumberedListStreamFormatter:
+    """
+    Applies format_numbered_lists to streamed text without waiting for the full response.
+
+    Text is released as soon as it can no longer change: a line is held back only
+    while it still looks like the start of a numbered item ("12", "3.", "4.  "),
+    so a chunk boundary inside a list marker gives the same result as formatting
+    the whole text at once.
+    """
+
+    _pending_marker = re.compile(r'\d*|\d+\.\s*')
+    _complete_marker = re.compile(r'^(\d+)\.\s+(?=\S)')
+
+    def __init__(self):
+        self._line = ''              # held-back start of the current line
+        self._passthrough = False    # current line can no longer be a list marker
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of generated text and returns the formatted text ready to send.
+        """
+        output = []
+        parts = chunk.split('\n')
+        for position, part in enumerate(parts):
+            if position > 0:
+                # A newline ends the current line
+                output.append(format_numbered_lists(self._line) + '\n')
+                self._line = ''
+                self._passthrough = False
+            if self._passthrough:
+                output.append(part)
+                continue
+            self._line += part
+            match = self._complete_marker.match(self._line)
+            if match:
+                output.append(f"{match[1]}. " + self._line[match.end():])
+            elif not self._pending_marker.fullmatch(self._line):
+                output.append(self._line)
+            else:
+                continue
+            self._line = ''
+            self._passthrough = True
+        return ''.join(output)
+
+    def flush(self):
+        """
+        Returns whatever is still held back once the stream has ended.
+        """
+        text = format_numbered_lists(self._line) if not self._passthrough else ''
+        self._line = ''
+        self._passthrough = False
+        return text
@@ -0,0 +1,285 @@
+# retrieval.py
+
+import os
+import numpy as np
+from query_cache import QueryCache, normalize_query
+from encoding_service import BatchingSearcher
+from metadata_index import FilteredSearcher, load_metadata_index
+from lexical_index import BM25Index, LexicalSearcher, load_lexical_index
+from metrics import REGISTRY, stage
+
+RETRIEVAL_HITS = REGISTRY.histogram(
+    'pai_retrieval_hits', 'Relevant records found per search, by retrieval path.', ('path',),
+    buckets=(0, 1, 2, 3, 4, 5, 10),
+)
+RETRIEVAL_TOP_DISTANCE = REGISTRY.histogram(
+    'pai_retrieval_top_distance', 'L2 distance of the nearest record per search.', (),
+    buckets=(0.2, 0.4, 0.5, 0.6, 0.7, 0.8, 1.0, 1.2, 1.5, 2.0),
+)
+
+class Retriever:
+    """
+    Encodes queries and searches the FAISS index, caching results per normalized query.
+    """
+
+    def __init__(self, index, records, embedding_model, query_cache=None, batching=None,
+                 filtered_searcher=None, detect_filters=False, lexical_searcher=None, hybrid=True, vectors=None):
+        """
+        :param index: FAISS index over the corpus vectors.
+        :param records: Content/metadata records aligned with the index ids.
+        :param embedding_model: SentenceTransformer used to encode queries.
+        :param query_cache: Optional QueryCache; it is cleared because it may hold results of another index.
+        :param batching: Optional dict of BatchingSearcher options; cache misses are then
+            encoded and searched in micro-batches with other concurrent queries.
+        :param filtered_searcher: Optional FilteredSearcher for metadata-filtered queries.
+        :param detect_filters: Narrow queries to industries/roles they mention, falling back
+            to the whole corpus when that slice has no relevant match.
+        :param lexical_searcher: Optional LexicalSearcher; confident keyword queries are then
+            answered from the BM25 index without encoding them.
+        :param hybrid: With a lexical searcher, also fuse BM25 hits into the vector results of other queries.
+        :param vectors: Optional corpus vectors; BM25 hits fused into vector results must be within
+            the distance threshold of the query, which needs their vectors. Without them fusion
+            only re-ranks vector hits.
+        """
+        self.index = index
+        self.records = records
+        self.embedding_model = embedding_model
+        self.query_cache = query_cache if query_cache is not None else QueryCache()
+        self.query_cache.clear()
+        # Lexical fast path answers by text; kept apart so they don't count as query cache misses
+        self.lexical_cache = QueryCache(max_size=self.query_cache.max_size, ttl=self.query_cache.ttl)
+        # Embeddings of recent queries by text, whatever k or filters they were searched with
+        self.query_embeddings = QueryCache(max_size=self.query_cache.max_size, ttl=self.query_cache.ttl)
+        self.searcher = BatchingSearcher(embedding_model, index, **batching) if batching is not None else None
+        self.filtered_searcher = filtered_searcher
+        self.detect_filters = detect_filters and filtered_searcher is not None
+        self.lexical_searcher = lexical_searcher
+        self.hybrid = hybrid and lexical_searcher is not None
+        self.vectors = vectors
+
+    def close(self):
+        """
+        Stops the batching thread, if any.
+        """
+        if self.searcher is not None:
+            self.searcher.close()
+
+    def search(self, query, k=5, filters=None):
+        """
+        Returns the query embedding and its k nearest corpus ids and distances.
+
+        :param query: Query text.
+        :param k: Number of neighbours.
+        :param filters: Optional dictionary mapping metadata field to value(s); only
+            records matching every field are searched.
+        :return: Tuple of (query embedding, ids array, distances array).
+        """
+        if filters and self.filtered_searcher is None:
+            raise ValueError("Metadata filters are not available for this index.")
+        partition = self.filtered_searcher.partition_key(filters) if filters else None
+        key = (normalize_query(query), k, partition)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # The same text may have been encoded for another k or partition, e.g. by a filtered
+        # attempt that found nothing before falling back to the whole corpus
+        query_embedding = self.query_embeddings.get(key[0])
+        if query_embedding is None and not filters and self.searcher is not None:
+            # Encode and search are timed per batch by the batching thread; this is the caller's wait
+            with stage('batched_search'):
+                result = self.searcher.search(key[0], k)
+        else:
+            if query_embedding is None:
+                with stage('encode'):
+                    query_embedding = np.asarray(self.embedding_model.encode(key[0]), dtype='float32')
+            with stage('search'):
+                if filters:
+                    distances, indices = self.filtered_searcher.search(query_embedding[None, :], filters, k)
+                else:
+                    distances, indices = self.index.search(query_embedding[None, :], k)
+            result = (query_embedding, indices[0], distances[0])
+        self.query_cache.put(key, result)
+        self.query_embeddings.put(key[0], result[0])
+        return result
+
+    def search_queries(self, queries, k=5, batch_size=64):
+        """
+        Encodes and searches many queries ahead of relevant_ids, e.g. for a batch job.
+
+        All queries are encoded in one model call and searched with one index search of the
+        whole matrix, plus one search per filter partition detected in them. The results go
+        to the query cache, so relevant_ids then only applies the threshold, the filter
+        fallback and fusion to each query. Keyword queries answered by the lexical fast
+        path are skipped. The query cache must hold two entries per query to keep them all.
+
+        :param queries: Query texts.
+        :param k: Number of neighbours relevant_ids will be called with.
+        :param batch_size: Sentences per model forward pass.
+        :return: Number of queries encoded.
+        """
+        texts = []
+        for text in dict.fromkeys(map(normalize_query, queries)):
+            if self.lexical_searcher is not None and self._lexical_ids(text, k):
+                continue
+            texts.append(text)
+        embeddings = {text: self.query_embeddings.get(text) for text in texts}
+        missing = [text for text, embedding in embeddings.items() if embedding is None]
+        if missing:
+            with stage('encode'):
+                encoded = np.asarray(self.embedding_model.encode(missing, batch_size=batch_size), dtype='float32')
+            embeddings.update(zip(missing, encoded))
+
+        # Every query is searched in the whole corpus, which is also the fallback of detected filters
+        groups = {None: (None, texts)}
+        if self.detect_filters:
+            for text in texts:
+                detected = self.filtered_searcher.detect_filters(text)
+                if detected:
+                    partition = self.filtered_searcher.partition_key(detected)
+                    groups.setdefault(partition, (detected, []))[1].append(text)
+        for partition, (filters, group) in groups.items():
+            if not group:
+                continue
+            matrix = np.stack([embeddings[text] for text in group])
+            with stage('search'):
+                if filters:
+                    distances, indices = self.filtered_searcher.search(matrix, filters, k)
+                else:
+                    distances, indices = self.index.search(matrix, k)
+            for row, text in enumerate(group):
+                self.query_cache.put((text, k, partition), (embeddings[text], indices[row], distances[row]))
+        for text, embedding in embeddings.items():
+            self.query_embeddings.put(text, embedding)
+        return len(missing)
+
+    def cached_embedding(self, query):
+        """
+        Returns the embedding of a recently searched query without encoding it, or None.
+        """
+        return self.query_embeddings.get(normalize_query(query))
+
+    def relevant_ids(self, query, k=5, threshold=0.7, filters=None):
+        """
+        Returns the query embedding and the ids of the nearest records closer than the threshold.
+
+        :param query: Query text.
+        :param k: Number of neighbours searched.
+        :param threshold: Maximum L2 distance of a relevant record.
+        :param filters: Optional metadata filters; without them, filters detected in the
+            query are tried first when detection is enabled.
+        :return: Tuple of (query embedding, list of record ids, nearest first). The embedding
+            is None when the lexical fast path answered without encoding the query.
+        """
+        if not filters and self.lexical_searcher is not None:
+            ids = self._lexical_ids(query, k)
+            if ids:
+                RETRIEVAL_HITS.observe(len(ids), path='lexical')
+                return None, ids
+        if not filters and self.detect_filters:
+            detected = self.filtered_searcher.detect_filters(query)
+            if detected:
+                query_embedding, ids = self._relevant_ids(query, k, threshold, detected)
+                if ids:
+                    return query_embedding, ids
+        return self._relevant_ids(query, k, threshold, filters)
+
+    def _relevant_ids(self, query, k, threshold, filters):
+        query_embedding, indices, distances = self.search(query, k, filters)
+        ids = [int(i) for i, d in zip(indices, distances) if i >= 0 and d < threshold]
+        if len(indices) and indices[0] >= 0:
+            RETRIEVAL_TOP_DISTANCE.observe(float(distances[0]))
+        if self.hybrid and not filters:
+            with stage('lexical'):
+                fused = self.lexical_searcher.fuse(query, ids, k)
+                ids = self._within_threshold(query_embedding, fused, set(ids), threshold)
+            RETRIEVAL_HITS.observe(len(ids), path='hybrid')
+        else:
+            RETRIEVAL_HITS.observe(len(ids), path='vector')
+        return query_embedding, ids
+
+    def _within_threshold(self, query_embedding, ids, relevant, threshold):
+        # Vector hits passed the threshold already; BM25-only hits are held to the same L2 distance
+        if self.vectors is None:
+            return [i for i in ids if i in relevant]
+        extra = [i for i in ids if i not in relevant]
+        if not extra:
+            return ids
+        distances = np.sum((np.asarray(self.vectors[extra], dtype='float32') - query_embedding) ** 2, axis=1)
+        close = {i for i, d in zip(extra, distances) if d < threshold}
+        return [i for i in ids if i in relevant or i in close]
+
+    def _lexical_ids(self, query, k):
+        key = (normalize_query(query), k)
+        cached = self.lexical_cache.get(key)
+        if cached is not None:
+            return cached
+        with stage('lexical'):
+            ids = self.lexical_searcher.exact_matches(key[0], k) or []
+        self.lexical_cache.put(key, ids)
+        return ids
+
+    def relevant_contents(self, query, k=5, threshold=0.7, filters=None):
+        """
+        Returns the content of the nearest records closer than the distance threshold.
+
+        :param query: Query text.
+        :param k: Number of neighbours searched.
+        :param threshold: Maximum L2 distance of a relevant record.
+        :param filters: Optional metadata filters.
+        :return: List of content strings, nearest first.
+        """
+        _, ids = self.relevant_ids(query, k, threshold, filters)
+        return [self.records[i]['content'] for i in ids]
+
+def retrieval_options():
+    """
+    Reads the retrieval settings from the environment, so the server and batch jobs retrieve alike.
+
+    RETRIEVAL_MODE 'hybrid' answers confident keyword queries from BM25 and fuses BM25 into
+    vector results otherwise, 'lexical_fast' only adds the keyword fast path, 'vector' disables BM25.
+
+    :return: Dictionary of create_retriever keyword arguments.
+    """
+    retrieval_mode = os.getenv('RETRIEVAL_MODE', 'hybrid')
+    if retrieval_mode not in ('hybrid', 'lexical_fast', 'vector'):
+        raise ValueError(f"Unknown RETRIEVAL_MODE '{retrieval_mode}'. Expected hybrid, lexical_fast or vector.")
+    return {
+        'retrieval_mode': retrieval_mode,
+        'detect_filters': os.getenv('FILTER_DETECTION', '1') != '0',
+        'lexical_max_terms': int(os.getenv('LEXICAL_MAX_TERMS', '4')),
+        'lexical_max_df': float(os.getenv('LEXICAL_MAX_DF', '0.2')),
+        'lexical_min_terms': int(os.getenv('LEXICAL_MIN_TERMS', '2')),
+    }
+
+def create_retriever(index, records, vectors, embedding_model, retrieval_mode='hybrid', detect_filters=True,
+                     lexical_max_terms=4, lexical_max_df=0.2, lexical_min_terms=2, query_cache=None, batching=None):
+    """
+    Builds a Retriever with the metadata filters and BM25 index of the corpus.
+
+    :param index: FAISS index over the corpus vectors.
+    :param records: Content/metadata records aligned with the index ids.
+    :param vectors: Corpus vectors (typically the memory-mapped embedding store), for filtered sub-indexes.
+    :param embedding_model: SentenceTransformer used to encode queries.
+    :param retrieval_mode: 'hybrid', 'lexical_fast' or 'vector' (see retrieval_options).
+    :param detect_filters: Narrow queries to industries/roles they mention.
+    :param lexical_max_terms: Longest query the lexical fast path answers.
+    :param lexical_max_df: Largest share of records a distinctive term may appear in.
+    :param lexical_min_terms: Shortest query the lexical fast path answers.
+    :param query_cache: Optional QueryCache.
+    :param batching: Optional dict of BatchingSearcher options.
+    :return: Retriever.
+    """
+    # Industry/role filters are answered from the inverted metadata index built at ingestion
+    filtered_searcher = FilteredSearcher(load_metadata_index(records=records), vectors)
+    lexical_searcher = None
+    if retrieval_mode != 'vector':
+        lexical_searcher = LexicalSearcher(
+            BM25Index(load_lexical_index(records)), max_terms=lexical_max_terms, max_df=lexical_max_df,
+            min_terms=lexical_min_terms,
+        )
+    return Retriever(
+        index, records, embedding_model, query_cache, batching=batching,
+        filtered_searcher=filtered_searcher, detect_filters=detect_filters,
+        lexical_searcher=lexical_searcher, hybrid=retrieval_mode == 'hybrid', vectors=vectors,
+    )
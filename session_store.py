@@ -0,0 +1,304 @@
+# session_store.py
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from langchain.memory import ConversationBufferWindowMemory
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+logger = logging.getLogger(__name__)
+
+class Session:
+    """
+    Conversation memory of one client plus the lock serializing its turns.
+
+    ``version`` and ``generation`` are those of the on-disk row the memory was
+    last synchronized with; ``saved_count`` is how many of the messages it holds.
+    """
+
+    def __init__(self, session_id, memory, last_used, version=0, generation=0):
+        self.session_id = session_id
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.last_used = last_used
+        self.version = version
+        self.generation = generation
+        self.saved_count = len(memory.chat_memory.messages)
+
+    @property
+    def messages(self):
+        return self.memory.chat_memory.messages
+
+class SessionStore:
+    """
+    Bounded, thread-safe store of per-session conversation memories.
+
+    Sessions are evicted least-recently-used when more than ``max_sessions``
+    are held, and dropped after ``idle_ttl`` seconds without a request. Each
+    session keeps at most ``max_messages`` messages. With ``persist_path`` the
+    messages are written through to a SQLite file shared by all workers, so a
+    session evicted from memory or owned by a recycled worker is reloaded on
+    its next request.
+
+    Every row carries a ``version``, bumped by each write, and a ``generation``,
+    bumped by each reset. A worker whose copy is behind the row reloads it
+    before a turn (refresh) and appends its new messages to the newer row
+    instead of overwriting it (save). A reset leaves an empty row with a new
+    generation behind as a tombstone, so a turn that was in flight during the
+    reset is dropped instead of writing the old conversation back.
+
+    Rows idle for longer than ``idle_ttl``, reset tombstones included, are deleted
+    from the file by purge_expired, which get() runs every ``purge_interval`` seconds.
+    """
+
+    def __init__(self, max_sessions=1000, idle_ttl=1800, max_messages=20, window=5,
+                 persist_path=None, purge_interval=300, clock=time.time):
+        """
+        :param max_sessions: Maximum number of sessions held in memory.
+        :param idle_ttl: Seconds of inactivity after which a session is dropped.
+        :param max_messages: Maximum number of messages kept per session.
+        :param window: Number of past exchanges the memory exposes to the prompt.
+        :param persist_path: Optional SQLite file for sessions that outlive the worker.
+        :param purge_interval: Seconds between deletions of expired rows from the file; 0 disables them.
+        :param clock: Time source in seconds.
+        """
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.window = window
+        self.clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.persist_path = persist_path
+        self.purge_interval = purge_interval
+        self._next_purge = clock() + purge_interval
+        self._db_lock = threading.Lock()
+        self._db = None
+        if persist_path:
+            self._connect()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.persist_path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 0, generation INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Files written before rows were versioned
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(sessions)")}
+        for column in ('version', 'generation'):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE sessions ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        self._db.commit()
+
+    def reopen(self):
+        """
+        Opens a fresh SQLite connection in a forked worker; a connection must not be
+        shared across fork, so the inherited one is dropped without being used.
+        """
+        self._db_lock = threading.Lock()
+        if self.persist_path:
+            self._connect()
+
+    def _new_memory(self, messages=()):
+        memory = ConversationBufferWindowMemory(k=self.window, memory_key="chat_history", return_messages=True)
+        memory.chat_memory.messages.extend(messages)
+        return memory
+
+    def _read_row(self, session_id):
+        # Call with _db_lock held
+        return self._db.execute(
+            "SELECT messages, updated_at, version, generation FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+
+    def _load(self, session_id, now):
+        """
+        :return: Tuple of (messages, version, generation) of the stored session.
+        """
+        if self._db is None:
+            return [], 0, 0
+        with self._db_lock:
+            row = self._read_row(session_id)
+        if row is None:
+            return [], 0, 0
+        messages, updated_at, version, generation = row
+        if self.idle_ttl and now - updated_at > self.idle_ttl:
+            return [], version, generation
+        return messages_from_dict(json.loads(messages)), version, generation
+
+    @staticmethod
+    def _adopt(session, messages, version, generation):
+        session.memory.chat_memory.messages[:] = messages
+        session.version = version
+        session.generation = generation
+        session.saved_count = len(messages)
+
+    def _evict_locked(self, now):
+        # Sessions are ordered by last use, so idle ones are at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            over_capacity = len(self._sessions) > self.max_sessions
+            idle = self.idle_ttl and now - oldest.last_used > self.idle_ttl
+            if not (over_capacity or idle):
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, session_id):
+        """
+        Returns the session for an id, creating or reloading it when needed.
+
+        :param session_id: Client-provided session id.
+        :return: Session object.
+        """
+        now = self.clock()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self.idle_ttl and now - session.last_used > self.idle_ttl:
+                del self._sessions[session_id]
+                session = None
+            if session is None:
+                messages, version, generation = self._load(session_id, now)
+                session = Session(session_id, self._new_memory(messages), now, version, generation)
+                self._sessions[session_id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            self._evict_locked(now)
+            purge = self.purge_interval and now >= self._next_purge
+            if purge:
+                self._next_purge = now + self.purge_interval
+        if purge:
+            try:
+                deleted = self.purge_expired()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to purge expired sessions: {e}")
+            else:
+                if deleted:
+                    logger.info(f"Purged {deleted} expired sessions from '{self.persist_path}'.")
+        return session
+
+    def refresh(self, session):
+        """
+        Reloads a session whose stored row was changed by another worker. Call with the session lock held,
+        before reading its messages for a turn.
+
+        :param session: Session from get().
+        :return: True if the messages were reloaded.
+        """
+        if self._db is None:
+            return False
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT messages, version, generation FROM sessions WHERE session_id = ?", (session.session_id,)
+            ).fetchone()
+        if row is None or (row[1], row[2]) == (session.version, session.generation):
+            return False
+        self._adopt(session, messages_from_dict(json.loads(row[0])), row[1], row[2])
+        return True
+
+    def save(self, session, max_attempts=5):
+        """
+        Trims a session to the message cap and writes it through to disk if persistence is on.
+
+        Messages added since the last save are appended to the stored row if another
+        worker wrote it meanwhile, and dropped if the session was reset meanwhile.
+        Call with the session lock held.
+
+        :param session: Session updated by the caller.
+        :param max_attempts: Writes retried when another worker saves the same session concurrently.
+        """
+        messages = session.memory.chat_memory.messages
+        new_messages = messages[session.saved_count:]
+        if len(messages) > self.max_messages:
+            del messages[:len(messages) - self.max_messages]
+        session.saved_count = len(messages)
+        if self._db is None:
+            return
+        for _ in range(max_attempts):
+            with self._db_lock:
+                row = self._read_row(session.session_id)
+                if row is not None and row[3] != session.generation:
+                    # Reset since this copy was loaded: the turn belonged to the cleared conversation
+                    logger.info(f"Session {session.session_id} was reset during a turn; dropping the turn.")
+                    self._adopt(session, messages_from_dict(json.loads(row[0])), row[2], row[3])
+                    return
+                merged = list(messages)
+                if row is not None and row[2] != session.version:
+                    merged = messages_from_dict(json.loads(row[0])) + new_messages
+                    merged = merged[-self.max_messages:] if self.max_messages else merged
+                payload = json.dumps(messages_to_dict(merged), ensure_ascii=False)
+                if row is None:
+                    written = self._db.execute(
+                        "INSERT OR IGNORE INTO sessions (session_id, messages, updated_at, version, generation) "
+                        "VALUES (?, ?, ?, 1, ?)",
+                        (session.session_id, payload, self.clock(), session.generation),
+                    ).rowcount
+                    version = 1
+                else:
+                    # Compare-and-set: fails if another worker wrote the row since it was read
+                    written = self._db.execute(
+                        "UPDATE sessions SET messages = ?, updated_at = ?, version = version + 1 "
+                        "WHERE session_id = ? AND version = ? AND generation = ?",
+                        (payload, self.clock(), session.session_id, row[2], row[3]),
+                    ).rowcount
+                    version = row[2] + 1
+                self._db.commit()
+            if written:
+                self._adopt(session, merged, version, session.generation)
+                return
+        logger.warning(f"Session {session.session_id} kept changing during {max_attempts} save attempts; turn not saved.")
+
+    def reset(self, session_id):
+        """
+        Clears the history of one session only, leaving a tombstone that in-flight saves respect.
+
+        :param session_id: Client-provided session id.
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            with session.lock:
+                session.memory.chat_memory.clear()
+                session.saved_count = 0
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT INTO sessions (session_id, messages, updated_at, version, generation) "
+                    "VALUES (?, '[]', ?, 1, 1) ON CONFLICT(session_id) DO UPDATE SET messages = '[]', "
+                    "updated_at = excluded.updated_at, version = version + 1, generation = generation + 1",
+                    (session_id, self.clock()),
+                )
+                self._db.commit()
+
+    def purge_expired(self):
+        """
+        Deletes idle sessions from memory and from the on-disk store.
+
+        :return: Number of sessions deleted from disk.
+        """
+        now = self.clock()
+        with self._lock:
+            self._evict_locked(now)
+        if self._db is None or not self.idle_ttl:
+            return 0
+        with self._db_lock:
+            deleted = self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.idle_ttl,)).rowcount
+            self._db.commit()
+        return deleted
+
+    def stats(self):
+        """
+        :return: Dictionary with the number of live sessions and evictions.
+        """
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'evictions': self.evictions,
+                'persistent': self._db is not None,
+            }
@@ -1,6 +1,28 @@
 # setup_nltk.py
+import logging
 import nltk
-nltk.download('punkt')
-nltk.download('punkt_tab')
-nltk.download('wordnet')
-nltk.download('omw-1.4')
\ No newline at end of file
+
+# NLTK packages used by the pipeline, with the resource path that shows each is installed
+NLTK_PACKAGES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'wordnet': 'corpora/wordnet',
+    'omw-1.4': 'corpora/omw-1.4',
+}
+
+def ensure_nltk_data(packages=NLTK_PACKAGES):
+    """
+    Downloads the NLTK packages that aren't installed yet, so runs with the data already
+    present never touch the network.
+
+    :param packages: Names of the packages to check (keys of NLTK_PACKAGES).
+    """
+    for package in packages:
+        try:
+            nltk.data.find(NLTK_PACKAGES[package])
+        except LookupError:
+            logging.info(f"Downloading NLTK package '{package}'...")
+            nltk.download(package)
+
+if __name__ == '__main__':
+    ensure_nltk_data()
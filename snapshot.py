@@ -0,0 +1,304 @@
+# snapshot.py
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import Counter
+
+# Marker written by process_data.py after every other artifact of a corpus snapshot
+SNAPSHOT_FILE = 'embeddings_snapshot.json'
+
+class SnapshotMismatchError(RuntimeError):
+    """
+    Raised when the artifact files on disk are not the ones the snapshot marker was written for.
+    """
+
+def artifact_fingerprint(path):
+    """
+    Identifies one version of an artifact file by its size and modification time; every
+    artifact is replaced with os.replace, so a new version always gets a new mtime.
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def write_snapshot_marker(output_file=SNAPSHOT_FILE, artifacts=(), **details):
+    """
+    Publishes a new corpus snapshot by atomically replacing the marker file.
+
+    :param output_file: Path of the marker file.
+    :param artifacts: Paths of the files that make up the snapshot; their fingerprints are
+        recorded so a server never loads files of two different runs together.
+    :param details: Extra fields recorded in the marker (e.g. number of vectors).
+    :return: Version id of the new snapshot.
+    """
+    version = uuid.uuid4().hex
+    fingerprints = {path: artifact_fingerprint(path) for path in artifacts}
+    temp_file = f"{output_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'created_at': time.time(), 'artifacts': fingerprints, **details}, f)
+    os.replace(temp_file, output_file)
+    logging.info(f"Published corpus snapshot {version} in '{output_file}'.")
+    return version
+
+def read_snapshot_marker(input_file=SNAPSHOT_FILE):
+    """
+    Returns the contents of the marker file, or None if there is no readable marker.
+    """
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def read_snapshot_version(input_file=SNAPSHOT_FILE):
+    """
+    Returns the version id in the marker file, or None if there is no readable marker.
+    """
+    marker = read_snapshot_marker(input_file)
+    return marker.get('version') if marker else None
+
+def check_snapshot_artifacts(marker):
+    """
+    Raises SnapshotMismatchError if an artifact listed in the marker was replaced or removed
+    since the marker was written, e.g. while process_data.py is writing the next snapshot.
+
+    :param marker: Marker contents from read_snapshot_marker, or None.
+    """
+    changed = []
+    for path, expected in ((marker or {}).get('artifacts') or {}).items():
+        try:
+            if artifact_fingerprint(path) != expected:
+                changed.append(path)
+        except FileNotFoundError:
+            changed.append(path)
+    if changed:
+        raise SnapshotMismatchError(
+            f"Artifacts {changed} changed since snapshot {marker.get('version')} was published; "
+            f"ingestion is probably still running."
+        )
+
+class CorpusSnapshot:
+    """
+    Everything a request needs from one version of the corpus: records, vectors,
+    index and the retriever and caches built on them.
+
+    A request takes the current snapshot once and uses only it, so a reload
+    never mixes ids of one corpus with content of another.
+    """
+
+    def __init__(self, version, records, vectors, index, retriever, suggestion_index=None, response_cache=None):
+        self.version = version
+        self.records = records
+        self.vectors = vectors
+        self.index = index
+        self.retriever = retriever
+        self.suggestion_index = suggestion_index
+        self.response_cache = response_cache
+        self.loaded_at = time.time()
+
+    def warm_up(self):
+        """
+        Runs one search so the first requests after a swap don't pay for cold pages.
+        """
+        if len(self.records):
+            self.index.search(self.vectors[:1].astype('float32'), 1)
+
+    def caches(self):
+        """
+        :return: List of (name, cache) pairs for every cache of this snapshot.
+        """
+        caches = [('query', self.retriever.query_cache), ('lexical', self.retriever.lexical_cache)]
+        if self.suggestion_index is not None:
+            caches.append(('suggestion', self.suggestion_index.cache))
+        if self.response_cache is not None:
+            caches.append(('response', self.response_cache))
+        return caches
+
+    def counters(self):
+        """
+        :return: Counter of the monotonic totals kept by this snapshot's caches and batcher,
+            keyed by (metric, cache name or None).
+        """
+        totals = Counter()
+        for name, cache in self.caches():
+            stats = cache.stats()
+            totals['hits', name] += stats['hits']
+            totals['misses', name] += stats['misses']
+        if self.retriever.searcher is not None:
+            batching = self.retriever.searcher.stats()
+            totals['batches', None] += batching['batches']
+            totals['queries', None] += batching['queries']
+        return totals
+
+    def close(self):
+        self.retriever.close()
+
+class SnapshotManager:
+    """
+    Holds the current corpus snapshot and swaps in new ones without downtime.
+
+    A reload builds the new snapshot in a background thread while requests keep
+    using the old one, warms it up and then replaces the reference in a single
+    assignment. The old snapshot is closed only after ``retire_delay`` seconds,
+    so requests still running on it finish normally. New snapshots are noticed
+    by polling the marker file that process_data.py writes last, or requested
+    explicitly with ``reload``. A snapshot that fails to load is logged and the
+    current one stays in service.
+
+    The artifact fingerprints in the marker are checked before and after loading,
+    so a reload during ingestion fails instead of mixing a new store with an old
+    index, and a worker starting during ingestion waits up to
+    ``startup_timeout`` seconds for the run to publish its marker.
+
+    Every snapshot starts with empty caches, so ``counters`` adds the totals of
+    replaced snapshots to the current ones; counters reported to monitoring
+    never go backwards on a reload.
+    """
+
+    def __init__(self, loader, marker_file=SNAPSHOT_FILE, poll_interval=10.0, retire_delay=60.0,
+                 startup_timeout=300.0):
+        """
+        :param loader: Callable taking a version id and returning a CorpusSnapshot.
+        :param marker_file: Path of the snapshot marker file.
+        :param poll_interval: Seconds between marker checks; 0 disables watching.
+        :param retire_delay: Seconds an old snapshot stays open after being replaced.
+        :param startup_timeout: Seconds the first load waits for consistent artifacts.
+        """
+        self.loader = loader
+        self.marker_file = marker_file
+        self.poll_interval = poll_interval
+        self.retire_delay = retire_delay
+        self.current = self._load_initial(startup_timeout)
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self._failed_version = None
+        self._reload_lock = threading.Lock()
+        self._reloading = None
+        self._watcher = None
+        self._watcher_pid = None
+        self._counters_lock = threading.Lock()
+        self._retired_totals = Counter()
+        self._retiring = []
+
+    def _load(self):
+        marker = read_snapshot_marker(self.marker_file)
+        check_snapshot_artifacts(marker)
+        snapshot = self.loader(marker.get('version') if marker else None)
+        try:
+            # A file replaced while loading may have been read half old, half new
+            check_snapshot_artifacts(marker)
+        except SnapshotMismatchError:
+            snapshot.close()
+            raise
+        return snapshot
+
+    def _load_initial(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self._load()
+            except SnapshotMismatchError as e:
+                if time.monotonic() >= deadline:
+                    raise
+                logging.warning(f"{e} Retrying...")
+                time.sleep(min(self.poll_interval or 1.0, 5.0))
+
+    def reload(self, wait=False):
+        """
+        Loads the snapshot named by the marker file in the background and swaps it in.
+
+        :param wait: Block until the reload has finished.
+        :return: True if a reload was started, False if one was already running.
+        """
+        with self._reload_lock:
+            if self._reloading is not None and self._reloading.is_alive():
+                started, thread = False, self._reloading
+            else:
+                thread = threading.Thread(target=self._reload, name='snapshot-reload', daemon=True)
+                self._reloading = thread
+                thread.start()
+                started = True
+        if wait:
+            thread.join()
+        return started
+
+    def _reload(self):
+        version = read_snapshot_version(self.marker_file)
+        start = time.perf_counter()
+        try:
+            snapshot = self._load()
+            snapshot.warm_up()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self._failed_version = version
+            logging.exception(f"Failed to load corpus snapshot {version}; keeping {self.current.version}: {e}")
+            return
+        with self._counters_lock:
+            previous, self.current = self.current, snapshot
+            self._retiring.append(previous)
+        self.reloads += 1
+        self.last_error = None
+        logging.info(
+            f"Swapped corpus snapshot {previous.version} -> {snapshot.version} "
+            f"({len(snapshot.records)} records, loaded in {time.perf_counter() - start:.2f}s)."
+        )
+        retire = threading.Timer(self.retire_delay, self._retire, args=(previous,))
+        retire.daemon = True
+        retire.start()
+
+    def _retire(self, snapshot):
+        # Fold the final totals in before closing, once no request is left on the snapshot
+        with self._counters_lock:
+            self._retired_totals.update(snapshot.counters())
+            self._retiring.remove(snapshot)
+        snapshot.close()
+
+    def counters(self):
+        """
+        :return: Counter of cache and batching totals over every snapshot this process has served.
+        """
+        with self._counters_lock:
+            totals = Counter(self._retired_totals)
+            for snapshot in (*self._retiring, self.current):
+                totals.update(snapshot.counters())
+        return totals
+
+    def ensure_watching(self):
+        """
+        Starts the marker watcher in this process if it isn't running (threads don't survive a fork).
+        """
+        if not self.poll_interval or self._watcher_pid == os.getpid():
+            return
+        with self._reload_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+            self._watcher = threading.Thread(target=self._watch, name='snapshot-watcher', daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            version = read_snapshot_version(self.marker_file)
+            if version is not None and version not in (self.current.version, self._failed_version):
+                logging.info(f"New corpus snapshot {version} detected.")
+                self.reload(wait=True)
+
+    def status(self):
+        """
+        :return: Dictionary describing the current snapshot and reload counters.
+        """
+        return {
+            'version': self.current.version,
+            'records': len(self.current.records),
+            'loaded_at': self.current.loaded_at,
+            'reloading': self._reloading is not None and self._reloading.is_alive(),
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,212 @@
+# suggestion_graph.py
+
+import os
+import json
+import math
+import logging
+from collections import OrderedDict
+import numpy as np
+from query_cache import QueryCache, normalize_query
+from utils import ExactSearch
+
+# Default file name of the suggestion table written by process_data.py
+SUGGESTIONS_FILE = 'embeddings_suggestions.json'
+
+# Number of suggestions returned per request
+NUM_SUGGESTIONS = 4
+
+# Words too common in questions and titles to match a use case on
+_COMMON_WORDS = {'with', 'from', 'that', 'this', 'what', 'show', 'tell', 'more', 'some', 'about', 'cases', 'case', 'using'}
+
+def _title_of(record):
+    title = record.get('metadata', {}).get('title_of_use_case')
+    if title is None or (isinstance(title, float) and math.isnan(title)) or title in ('', 'No Title'):
+        return None
+    return str(title)
+
+def _group_titles(records):
+    """
+    Groups record ids by use case title; untitled records form their own group.
+
+    :return: OrderedDict mapping group key to list of record ids.
+    """
+    groups = OrderedDict()
+    for record_id, record in enumerate(records):
+        title = _title_of(record)
+        groups.setdefault(title if title is not None else ('record', record_id), []).append(record_id)
+    return groups
+
+def _pick_diverse(candidates, group_of, exclude_group, limit):
+    picked, groups = [], {exclude_group}
+    for candidate in candidates:
+        if candidate < 0 or group_of[candidate] in groups:
+            continue
+        picked.append(int(candidate))
+        groups.add(group_of[candidate])
+        if len(picked) == limit:
+            break
+    return picked
+
+def _title_vector(vectors, ids):
+    # Mean of the unit vectors of one title's chunks, reading only those rows
+    rows = np.asarray(vectors[ids], dtype='float32')
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return (rows / np.where(norms > 0, norms, 1)).mean(axis=0)
+
+def build_suggestion_graph(vectors, records, num_suggestions=NUM_SUGGESTIONS, candidates=32, block_size=1024):
+    """
+    Precomputes the suggestions shown after each corpus chunk and use case title.
+
+    Every chunk is linked to its nearest chunks that belong to other use cases,
+    at most one per use case, so a suggestion list never repeats one use case.
+    Each title is represented by the chunk closest to the mean of its chunks and
+    linked the same way, and its mean unit vector is saved for the title index
+    SuggestionIndex matches free text against.
+
+    :param vectors: float32 corpus matrix aligned with the records.
+    :param records: Content/metadata records.
+    :param num_suggestions: Suggestions kept per chunk and title.
+    :param candidates: Nearest neighbours examined per chunk to find diverse ones.
+    :param block_size: Chunks searched per batch.
+    :return: Dictionary with 'num_records', 'chunks' (record id -> suggested record ids)
+             and 'titles' (list of {'title', 'record', 'suggestions', 'vector'}).
+    """
+    groups = _group_titles(records)
+    group_of = np.empty(len(records), dtype=object)
+    for key, ids in groups.items():
+        for record_id in ids:
+            group_of[record_id] = key
+
+    engine = ExactSearch(vectors, metric='cosine')
+    k = min(candidates + 1, len(records))
+    chunks = {}
+    for start in range(0, len(records), block_size):
+        _, neighbours = engine.search(vectors[start:start + block_size], k)
+        for offset, row in enumerate(neighbours):
+            record_id = start + offset
+            chunks[record_id] = _pick_diverse(row, group_of, group_of[record_id], num_suggestions)
+
+    titles = []
+    for key, ids in groups.items():
+        if not isinstance(key, str):
+            continue
+        centroid = engine.matrix[ids].mean(axis=0)
+        representative = ids[int(np.argmax(engine.matrix[ids] @ centroid))]
+        _, neighbours = engine.search(centroid, k)
+        titles.append({
+            'title': key,
+            'record': int(representative),
+            'suggestions': _pick_diverse(neighbours[0], group_of, key, num_suggestions),
+            'vector': centroid.tolist(),
+        })
+    return {'num_records': len(records), 'chunks': chunks, 'titles': titles}
+
+def save_suggestion_graph(graph, output_file=SUGGESTIONS_FILE):
+    """
+    Writes the suggestion table to disk.
+    """
+    with open(f"{output_file}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(graph, f, ensure_ascii=False)
+    os.replace(f"{output_file}.tmp", output_file)
+    logging.info(f"Saved suggestions for {len(graph['chunks'])} chunks and {len(graph['titles'])} titles to '{output_file}'.")
+
+def load_suggestion_graph(vectors, records, input_file=SUGGESTIONS_FILE):
+    """
+    Loads the suggestion table, building it from the corpus if the file is missing or stale.
+
+    :param vectors: float32 corpus matrix aligned with the records.
+    :param records: Content/metadata records.
+    :param input_file: Path of the suggestion table JSON file.
+    :return: Dictionary as returned by build_suggestion_graph.
+    """
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            graph = json.load(f)
+        if graph.get('num_records') == len(records):
+            return graph
+        logging.warning(f"Suggestion table '{input_file}' does not match the corpus, rebuilding it.")
+    except FileNotFoundError:
+        logging.info(f"Suggestion table '{input_file}' not found, building it from the corpus.")
+    return build_suggestion_graph(vectors, records)
+
+class SuggestionIndex:
+    """
+    Answers /suggestions from the precomputed suggestion table.
+
+    Text that is a corpus chunk or a use case title (what the UI sends when a
+    suggestion is clicked) is a dictionary lookup. Free text is matched against
+    a small index of use case title vectors, using the query embedding that
+    /chat already computed, or by word overlap with the titles when there is
+    none; answers from the title index are kept in an LRU cache. The encoder is never run.
+    """
+
+    def __init__(self, graph, records, vectors=None, min_similarity=0.5, cache_size=1024, num_suggestions=NUM_SUGGESTIONS):
+        """
+        :param graph: Suggestion table from build_suggestion_graph or load_suggestion_graph.
+        :param records: Content/metadata records the table refers to.
+        :param vectors: Optional corpus matrix; enables the title-level index for free text when
+            the table has no title vectors (files written before they were saved).
+        :param min_similarity: Minimum cosine similarity between a query and a title.
+        :param cache_size: Number of free-text answers kept.
+        :param num_suggestions: Suggestions returned per request.
+        """
+        self.min_similarity = min_similarity
+        self.num_suggestions = num_suggestions
+        self.cache = QueryCache(max_size=cache_size, ttl=None)
+
+        content = [record['content'] for record in records]
+        self.lookup = {}
+        for title in graph['titles']:
+            self.lookup[normalize_query(title['title'])] = [content[i] for i in title['suggestions']]
+        for record_id, suggested in graph['chunks'].items():
+            self.lookup.setdefault(normalize_query(content[int(record_id)]), [content[i] for i in suggested])
+
+        self.titles = [title['title'] for title in graph['titles']]
+        self.title_contents = [content[title['record']] for title in graph['titles']]
+        self.title_words = [
+            {word for word in normalize_query(title).split() if len(word) > 3 and word not in _COMMON_WORDS}
+            for title in self.titles
+        ]
+        self.title_index = None
+        # One mean unit vector per title: a few hundred rows searched exactly
+        if self.titles and all('vector' in title for title in graph['titles']):
+            title_vectors = np.asarray([title['vector'] for title in graph['titles']], dtype='float32')
+            self.title_index = ExactSearch(title_vectors, metric='cosine')
+        elif vectors is not None and self.titles:
+            groups = _group_titles(records)
+            title_vectors = np.stack([_title_vector(vectors, groups[title]) for title in self.titles])
+            self.title_index = ExactSearch(title_vectors, metric='cosine')
+
+    def _from_titles(self, title_ids):
+        return [self.title_contents[i] for i in title_ids][:self.num_suggestions]
+
+    def _by_embedding(self, query_embedding):
+        similarities, ids = self.title_index.search(query_embedding, self.num_suggestions)
+        return self._from_titles([i for i, s in zip(ids[0], similarities[0]) if i >= 0 and s >= self.min_similarity])
+
+    def _by_words(self, query):
+        words = set(query.split())
+        overlaps = [len(words & title_words) for title_words in self.title_words]
+        ranked = sorted((i for i, overlap in enumerate(overlaps) if overlap), key=lambda i: -overlaps[i])
+        return self._from_titles(ranked)
+
+    def suggest(self, query, query_embedding=None):
+        """
+        Returns suggestions for the text the user sent or clicked.
+
+        :param query: Query text.
+        :param query_embedding: Optional embedding of the query, if one was already computed.
+        :return: List of suggestion strings (possibly empty).
+        """
+        query = normalize_query(query)
+        suggestions = self.lookup.get(query)
+        if suggestions is not None:
+            return suggestions
+        suggestions = self.cache.get(query)
+        if suggestions is not None:
+            return suggestions
+        if query_embedding is None or self.title_index is None:
+            return self._by_words(query)
+        suggestions = self._by_embedding(query_embedding)
+        self.cache.put(query, suggestions)
+        return suggestions
@@ -0,0 +1,48 @@
+# tests/conftest.py
+
+import os
+import re
+import sys
+import zlib
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class StubEncoder:
+    """
+    Offline stand-in for SentenceTransformer: a normalized bag of hashed words,
+    so texts sharing words are close and unrelated texts are far apart.
+    """
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype='float32')
+        for word in re.findall(r'\w+', text.lower()):
+            vector[zlib.crc32(word.encode('utf-8')) % self.dim] += 1
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        self.calls += 1
+        if isinstance(sentences, str):
+            return self._vector(sentences)
+        if not len(sentences):
+            return np.empty((0, self.dim), dtype='float32')
+        return np.stack([self._vector(text) for text in sentences])
+
+@pytest.fixture
+def encoder():
+    return StubEncoder()
+
+def make_record(content, industry='Retail', role='CEO', sheet_name='Sheet1', row_index=1):
+    return {
+        'content': content,
+        'metadata': {'industry': industry, 'role': role, 'sheet_name': sheet_name, 'row_index': row_index},
+    }
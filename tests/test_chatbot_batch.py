@@ -0,0 +1,66 @@
+# tests/test_chatbot_batch.py
+
+import json
+import asyncio
+import argparse
+import faiss
+import pytest
+from conftest import make_record
+
+pytest.importorskip('sentence_transformers')
+import chatbot
+from fake_llm import FakeStreamingChatModel
+from retrieval import Retriever
+from prompt_builder import NOT_RELATED_RESPONSE
+
+def write_lines(path, lines):
+    path.write_text(''.join(line + '\n' for line in lines), encoding='utf-8')
+
+def test_completed_ids_skips_errors_and_truncated_lines(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    write_lines(output, [
+        json.dumps({'id': 'a', 'response': 'ok'}),
+        json.dumps({'id': 'b', 'error': 'timeout'}),
+        '{"id": "c", "resp',
+    ])
+    assert chatbot.completed_ids(str(output)) == {'a'}
+    assert chatbot.completed_ids(str(tmp_path / 'missing.jsonl')) == set()
+
+def test_completed_ids_requires_a_response_unless_no_llm(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    write_lines(output, [
+        json.dumps({'id': 'retrieved', 'context_ids': [1], 'prompt_tokens': 40}),
+        json.dumps({'id': 'unrelated', 'context_ids': [], 'response': NOT_RELATED_RESPONSE}),
+    ])
+    assert chatbot.completed_ids(str(output)) == {'unrelated'}
+    assert chatbot.completed_ids(str(output), require_response=False) == {'retrieved', 'unrelated'}
+
+def test_open_for_append_terminates_a_cut_off_line(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    output.write_text('{"id": "a"}\n{"id": "b", "resp', encoding='utf-8')
+    with chatbot.open_for_append(str(output)) as f:
+        f.write(json.dumps({'id': 'b', 'response': 'ok'}) + '\n')
+    assert chatbot.completed_ids(str(output), require_response=False) == {'a', 'b'}
+
+def test_batch_run_resumes_without_repeating_answered_queries(tmp_path, encoder):
+    records = [make_record('Fraud detection for card payments'), make_record('Demand forecasting for stores')]
+    vectors = encoder.encode([record['content'] for record in records]).astype('float32')
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    retriever = Retriever(index, records, encoder)
+    args = argparse.Namespace(concurrency=2, batch_size=2, k=2, threshold=0.9, encode_batch_size=8)
+    queries = [('q1', 'Fraud detection for card payments'), ('q2', 'demand forecasting'), ('q3', 'Weather tomorrow?')]
+    output_file = tmp_path / 'results.jsonl'
+
+    def run(pending):
+        with chatbot.open_for_append(str(output_file)) as output:
+            return asyncio.run(chatbot.process_batches(pending, output, retriever, records, FakeStreamingChatModel(), args))
+
+    assert run(queries[:2]) == (2, 0)
+    done = chatbot.completed_ids(str(output_file))
+    assert done == {'q1', 'q2'}
+    assert run([query for query in queries if query[0] not in done]) == (1, 0)
+
+    results = {row['id']: row for row in map(json.loads, output_file.read_text(encoding='utf-8').splitlines())}
+    assert results['q1']['context_ids'][0] == 0
+    assert results['q3'] == {'id': 'q3', 'query': 'weather tomorrow?', 'context_ids': [], 'response': NOT_RELATED_RESPONSE}
@@ -0,0 +1,54 @@
+# tests/test_chunking.py
+
+import numpy as np
+import chunking
+from conftest import make_record
+from chunking import chunk_text, collapse_records
+from metadata_index import FilteredSearcher, build_metadata_index
+
+def test_default_chunking_keeps_short_fragments():
+    text = 'Fraud detection. Card payments are scored in real time by a model.'
+    assert chunk_text(text, strategy='use_case') == [text]
+    assert chunk_text('Short. ' + text, strategy='use_case', min_tokens=20) == []
+
+def test_window_chunking_overlaps():
+    words = [f"w{i}" for i in range(10)]
+    chunks = chunk_text(' '.join(words), strategy='window', window_tokens=4, window_overlap=2)
+    assert chunks == ['w0 w1 w2 w3', 'w2 w3 w4 w5', 'w4 w5 w6 w7', 'w6 w7 w8 w9']
+
+def test_sentence_chunking_without_punkt_data(monkeypatch):
+    def missing(text):
+        raise LookupError('punkt_tab')
+
+    monkeypatch.setattr(chunking, 'sent_tokenize', missing)
+    monkeypatch.setattr(chunking, '_punkt_missing', False)
+    text = 'Fraud detection. Card payments are scored in real time! Is it fast? Yes.'
+    assert chunk_text(text) == ['Fraud detection.', 'Card payments are scored in real time!', 'Is it fast?', 'Yes.']
+
+def test_collapse_keeps_metadata_of_every_merged_row():
+    records = [
+        make_record('Chatbot for customer service.', industry='Retail', row_index=1),
+        make_record('Demand forecasting.', industry='Retail', row_index=2),
+        make_record('Chatbot for customer service!', industry='Banking', role='CFO', row_index=7),
+    ]
+    vectors = np.array([[1, 0, 0], [0, 1, 0], [1, 0.01, 0]], dtype='float32')
+    kept_rows, kept = collapse_records(vectors, records, threshold=0.97)
+    assert kept_rows.tolist() == [0, 1]
+    assert [record['content'] for record in kept] == [records[0]['content'], records[1]['content']]
+    assert kept[0]['metadata']['merged_rows'] == [
+        {'industry': 'Banking', 'role': 'CFO', 'sheet_name': 'Sheet1', 'row_index': 7},
+    ]
+    assert 'merged_rows' not in records[0]['metadata']
+
+    metadata_index = build_metadata_index(kept)
+    assert metadata_index['industry'] == {'retail': [0, 1], 'banking': [0]}
+    assert metadata_index['role'] == {'ceo': [0, 1], 'cfo': [0]}
+
+    kept_vectors = vectors[kept_rows]
+    _, ids = FilteredSearcher(metadata_index, kept_vectors).search(kept_vectors[:1], {'industry': 'Banking'}, k=2)
+    assert list(ids[0]) == [0, -1]
+
+def test_collapse_below_threshold_keeps_everything():
+    records = [make_record('a'), make_record('b')]
+    kept_rows, kept = collapse_records(np.array([[1, 0], [0.8, 0.6]], dtype='float32'), records, threshold=0.97)
+    assert kept_rows.tolist() == [0, 1] and kept == records
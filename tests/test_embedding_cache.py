@@ -0,0 +1,60 @@
+# tests/test_embedding_cache.py
+
+import numpy as np
+from embedding_cache import EmbeddingCache, compute_row_hashes, diff_row_hashes
+
+def sheet_entries(rows, sheet_name='Sheet1'):
+    """
+    Builds data entries for rows of (Sr. No., [sentences]), numbering positions like process_sheet.
+    """
+    return [
+        {'content': sentence, 'metadata': {'sheet_name': sheet_name, 'row_index': position, 'sr_no': sr_no}}
+        for position, (sr_no, sentences) in enumerate(rows, 1)
+        for sentence in sentences
+    ]
+
+ROWS = [(1.0, ['Fraud detection.', 'Card payments.']), (2.0, ['Demand forecasting.']), (3.0, ['Chatbots.'])]
+
+def test_unchanged_rows_report_nothing():
+    hashes = compute_row_hashes(sheet_entries(ROWS))
+    assert set(hashes['Sheet1']) == {'1', '2', '3'}
+    assert diff_row_hashes(hashes, compute_row_hashes(sheet_entries(ROWS))) == {
+        'Sheet1': {'added': [], 'removed': [], 'changed': []},
+    }
+
+def test_inserting_a_row_reports_only_that_row():
+    previous = compute_row_hashes(sheet_entries(ROWS))
+    current = compute_row_hashes(sheet_entries([ROWS[0], (10.0, ['Route optimization.'])] + ROWS[1:]))
+    assert diff_row_hashes(previous, current)['Sheet1'] == {'added': ['10'], 'removed': [], 'changed': []}
+
+def test_deleting_and_editing_rows():
+    previous = compute_row_hashes(sheet_entries(ROWS))
+    current = compute_row_hashes(sheet_entries([(2.0, ['Demand forecasting for stores.']), ROWS[2]]))
+    assert diff_row_hashes(previous, current)['Sheet1'] == {'added': [], 'removed': ['1'], 'changed': ['2']}
+
+def test_rows_without_serial_number_are_keyed_by_content():
+    rows = [(None, ['Fraud detection.']), (float('nan'), ['Chatbots.'])]
+    previous = compute_row_hashes(sheet_entries(rows))
+    assert all(key.startswith('content:') for key in previous['Sheet1'])
+    current = compute_row_hashes(sheet_entries([(None, ['Route optimization.'])] + rows))
+    report = diff_row_hashes(previous, current)['Sheet1']
+    assert len(report['added']) == 1 and report['removed'] == [] and report['changed'] == []
+
+def test_repeated_serial_numbers_are_kept_apart():
+    hashes = compute_row_hashes(sheet_entries([(1, ['A.']), (1, ['B.'])]))
+    assert set(hashes['Sheet1']) == {'1', '1#2'}
+
+def test_embedding_cache_round_trip_and_prune(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'cache.sqlite'), 'stub-model')
+    try:
+        assert cache.get_many(['a', 'b']) == [None, None]
+        cache.put_many(['a', 'b'], np.eye(2, dtype='float32'))
+    finally:
+        cache.close()
+    cache = EmbeddingCache(str(tmp_path / 'cache.sqlite'), 'stub-model')
+    try:
+        vector, = cache.get_many(['a'])
+        assert np.array_equal(vector, [1, 0])
+        assert cache.prune() == 1
+    finally:
+        cache.close()
@@ -0,0 +1,55 @@
+# tests/test_embedding_store.py
+
+import json
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from embedding_store import convert_jsonl_to_store, load_embedding_store, load_embeddings, write_embeddings_jsonl
+
+def entries(n, dim=4):
+    rng = np.random.default_rng(0)
+    for i in range(n):
+        yield {'content': f"chunk {i}", 'metadata': {'row_index': i}, 'embedding': rng.standard_normal(dim).tolist()}
+
+def test_jsonl_round_trip_through_the_memory_mapped_store(tmp_path):
+    jsonl, matrix, meta = tmp_path / 'e.jsonl', tmp_path / 'e.npy', tmp_path / 'e_meta.json'
+    expected = list(entries(10))
+    assert write_embeddings_jsonl(iter(expected), str(jsonl)) == 10
+    assert convert_jsonl_to_store(str(jsonl), str(matrix), str(meta), block_size=3) == 10
+
+    vectors, records = load_embedding_store(str(matrix), str(meta))
+    assert isinstance(vectors, np.memmap)
+    assert np.allclose(vectors, np.asarray([item['embedding'] for item in expected], dtype='float32'))
+    assert records[7] == {'content': 'chunk 7', 'metadata': {'row_index': 7}}
+
+def test_entries_without_embeddings_are_left_out(tmp_path):
+    jsonl = tmp_path / 'e.jsonl'
+    items = list(entries(3))
+    items[1]['embedding'] = []
+    assert write_embeddings_jsonl(items, str(jsonl)) == 2
+    assert [json.loads(line)['content'] for line in jsonl.read_text().splitlines()] == ['chunk 0', 'chunk 2']
+
+def test_load_embeddings_converts_jsonl_once(tmp_path):
+    jsonl, matrix, meta = tmp_path / 'e.jsonl', tmp_path / 'e.npy', tmp_path / 'e_meta.json'
+    write_embeddings_jsonl(entries(5), str(jsonl))
+    vectors, records = load_embeddings(str(tmp_path / 'missing.json'), str(matrix), str(meta), str(jsonl))
+    assert vectors.shape == (5, 4) and len(records) == 5 and matrix.exists()
+
+def test_concurrent_conversions_do_not_share_temporary_files(tmp_path):
+    jsonl, matrix, meta = tmp_path / 'e.jsonl', tmp_path / 'e.npy', tmp_path / 'e_meta.json'
+    write_embeddings_jsonl(entries(50), str(jsonl))
+    with open(jsonl, 'a') as f:
+        f.write('\n')  # a blank line takes the resize path
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        counts = list(pool.map(lambda _: convert_jsonl_to_store(str(jsonl), str(matrix), str(meta), block_size=7), range(4)))
+    assert counts == [50] * 4
+    vectors, records = load_embedding_store(str(matrix), str(meta))
+    assert vectors.shape == (50, 4) and records[-1]['content'] == 'chunk 49'
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['e.jsonl', 'e.npy', 'e_meta.json']
+
+def test_inconsistent_store_is_rejected(tmp_path):
+    matrix, meta = tmp_path / 'e.npy', tmp_path / 'e_meta.json'
+    np.save(matrix, np.zeros((2, 4), dtype='float32'))
+    meta.write_text(json.dumps([{'content': 'a', 'metadata': {}}]))
+    with pytest.raises(ValueError):
+        load_embedding_store(str(matrix), str(meta))
@@ -0,0 +1,48 @@
+# tests/test_exact_search.py
+
+import faiss
+import numpy as np
+import pytest
+from utils import ExactSearch
+
+def corpus(n=300, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype('float32'), rng.standard_normal((7, dim)).astype('float32')
+
+def faiss_search(vectors, queries, metric, k):
+    if metric == 'cosine':
+        vectors, queries = vectors.copy(), queries.copy()
+        faiss.normalize_L2(vectors)
+        faiss.normalize_L2(queries)
+        index = faiss.IndexFlatIP(vectors.shape[1])
+    else:
+        index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index.search(queries, k)
+
+@pytest.mark.parametrize('metric', ['l2', 'cosine'])
+@pytest.mark.parametrize('chunk_size', [16384, 64])
+def test_matches_faiss_flat_index(metric, chunk_size):
+    vectors, queries = corpus()
+    scores, ids = ExactSearch(vectors, metric=metric, chunk_size=chunk_size, num_threads=2).search(queries, 10)
+    expected_scores, expected_ids = faiss_search(vectors, queries, metric, 10)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-4, atol=1e-4)
+
+@pytest.mark.parametrize('metric', ['l2', 'cosine'])
+def test_k_larger_than_corpus_is_padded_like_faiss(metric):
+    vectors, queries = corpus(n=5)
+    scores, ids = ExactSearch(vectors, metric=metric, chunk_size=2).search(queries, 8)
+    expected_scores, expected_ids = faiss_search(vectors, queries, metric, 8)
+    np.testing.assert_array_equal(ids, expected_ids)
+    assert (ids[:, 5:] == -1).all()
+    np.testing.assert_allclose(scores[:, :5], expected_scores[:, :5], rtol=1e-4, atol=1e-4)
+    # FAISS pads with the largest float, ExactSearch with infinity; both sort after every real score
+    assert np.isinf(scores[:, 5:]).all()
+    assert (np.sign(scores[:, 5:]) == np.sign(expected_scores[:, 5:])).all()
+
+def test_single_query_vector():
+    vectors, queries = corpus()
+    _, ids = ExactSearch(vectors).search(queries[0], 3)
+    assert ids.shape == (1, 3)
+    assert ids[0].tolist() == faiss_search(vectors, queries[:1], 'l2', 3)[1][0].tolist()
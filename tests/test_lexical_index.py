@@ -0,0 +1,69 @@
+# tests/test_lexical_index.py
+
+import faiss
+from conftest import make_record
+from lexical_index import BM25Index, LexicalSearcher, build_lexical_index, tokenize
+from retrieval import Retriever
+
+RECORDS = [make_record(text) for text in [
+    'AI use case: fraud detection for card payments in banking.',
+    'AI use case: demand forecasting for retail stores.',
+    'AI use case: predictive maintenance of turbines.',
+    'AI use case: chatbot for customer service.',
+    'AI use case: document processing for insurance claims.',
+    'AI use case: weather forecasting for crop planning.',
+    'AI use case: route optimization for delivery fleets.',
+    'AI use case: churn prediction for telecom subscribers.',
+    'AI use case: quality inspection with computer vision.',
+    'AI use case: energy demand forecasting for utilities.',
+]]
+
+def make_searcher(**options):
+    return LexicalSearcher(BM25Index(build_lexical_index(RECORDS)), **options)
+
+def test_tokenize_drops_stopwords():
+    assert tokenize('Show me the AI use cases for Fraud-Detection') == ['ai', 'use', 'cases', 'fraud', 'detection']
+
+def test_bm25_ranks_records_with_more_query_terms_first():
+    scores, ids, matched = BM25Index(build_lexical_index(RECORDS)).search(['demand', 'forecasting', 'retail'], k=3)
+    assert ids[0] == 1 and matched[0] == 3
+    assert list(scores) == sorted(scores, reverse=True)
+
+def test_fast_path_answers_distinctive_multi_term_queries():
+    assert make_searcher().exact_matches('fraud detection', k=5) == [0]
+    assert make_searcher().exact_matches('turbine maintenance', k=5) is None  # "turbine" is not a corpus term
+
+def test_fast_path_needs_every_term_distinctive():
+    # "ai" and "use" appear in every record
+    assert make_searcher().exact_matches('ai fraud', k=5) is None
+
+def test_fast_path_rejects_single_shared_word():
+    # An off-topic question sharing one corpus word must go through the vector threshold
+    assert make_searcher().exact_matches('weather', k=5) is None
+    assert make_searcher(min_terms=1).exact_matches('weather', k=5) == [5]
+
+def test_fast_path_rejects_long_queries():
+    assert make_searcher(max_terms=2).exact_matches('fraud detection card payments', k=5) is None
+
+def test_fusion_holds_lexical_hits_to_the_distance_threshold(encoder):
+    vectors = encoder.encode([record['content'] for record in RECORDS]).astype('float32')
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    searcher = make_searcher()
+    query = 'will the weather be sunny on saturday'
+    assert searcher.fuse(query, [], k=5) == [5]
+
+    retriever = Retriever(index, RECORDS, encoder, lexical_searcher=searcher, vectors=vectors)
+    assert retriever.relevant_ids(query, k=5, threshold=0.7)[1] == []
+    assert retriever.relevant_ids(query, k=5, threshold=4.0)[1][0] == 5
+
+def test_lexical_lookups_do_not_count_as_query_cache_misses(encoder):
+    vectors = encoder.encode([record['content'] for record in RECORDS]).astype('float32')
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    retriever = Retriever(index, RECORDS, encoder, lexical_searcher=make_searcher(), vectors=vectors)
+    retriever.relevant_ids('fraud detection', k=5)
+    retriever.relevant_ids('fraud detection', k=5)
+    retriever.relevant_ids('customer service chatbot for banks', k=5)
+    assert retriever.query_cache.stats()['misses'] == 1
+    assert retriever.lexical_cache.stats()['hits'] == 1
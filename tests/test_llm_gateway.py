@@ -0,0 +1,96 @@
+# tests/test_llm_gateway.py
+
+import asyncio
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+from llm_gateway import LLMGateway, LLMOverloadedError, LLMTimeoutError
+from llm_stub_server import StubLLMServer
+
+MESSAGES = [SystemMessage(content='Answer briefly.'), HumanMessage(content='fraud detection')]
+
+class ScriptedStub(StubLLMServer):
+    """Stub whose failure and slowness draws are given up front instead of random."""
+
+    def __init__(self, draws=(), **kwargs):
+        super().__init__(**kwargs)
+        self.draws = list(draws)
+
+    def _draw(self):
+        with self._lock:
+            self.requests += 1
+            return self.draws.pop(0) if self.draws else (1.0, 1.0)
+
+@pytest.fixture
+def start_stub():
+    servers = []
+
+    def start(draws=(), **kwargs):
+        server = ScriptedStub(draws, **{'latency': 0.0, **kwargs}).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
+
+def make_gateway(stub, **kwargs):
+    return LLMGateway(stub.url, 'test-key', 'stub-model', **{'backoff_base': 0.01, 'timeout': 5.0, **kwargs})
+
+def test_plain_completion(start_stub):
+    stub = start_stub()
+    answer = make_gateway(stub).invoke(MESSAGES)
+    assert answer.content.startswith('Here are some AI use cases related to: fraud detection\n1.')
+    assert stub.requests == 1
+
+def test_streamed_completion(start_stub):
+    stub = start_stub()
+    gateway = make_gateway(stub)
+    chunks = [chunk.content for chunk in gateway.stream(MESSAGES)]
+    assert len(chunks) > 1
+    assert ''.join(chunks) == stub.answer([{'role': 'user', 'content': 'fraud detection'}])
+    assert gateway.stats()['outcomes'] == {'ok': 1}
+
+@pytest.mark.parametrize('failure', ['error_rate', 'rate_limit_rate'])
+def test_retries_on_429_and_500(start_stub, failure):
+    # The first two calls fail (500 or 429), the third succeeds
+    stub = start_stub([(0.0, 1.0), (0.0, 1.0)], **{failure: 0.5})
+    gateway = make_gateway(stub, max_retries=2)
+    assert 'fraud detection' in gateway.invoke(MESSAGES).content
+    assert stub.requests == 3
+    assert gateway.stats()['retries'] == 2
+
+def test_streamed_completion_retries_before_first_token(start_stub):
+    stub = start_stub([(0.0, 1.0)], rate_limit_rate=0.5)
+    gateway = make_gateway(stub)
+    assert 'fraud detection' in ''.join(chunk.content for chunk in gateway.stream(MESSAGES))
+    assert gateway.stats()['retries'] == 1
+
+def test_missed_deadline_raises_timeout(start_stub):
+    stub = start_stub(latency=1.0)
+    gateway = make_gateway(stub)
+    with pytest.raises(LLMTimeoutError):
+        gateway.invoke(MESSAGES, timeout=0.2)
+    assert gateway.stats()['outcomes'] == {'timeout': 1}
+
+def test_full_queue_raises_overloaded(start_stub):
+    stub = start_stub(latency=0.3)
+    gateway = make_gateway(stub, max_concurrency=1, max_queue=0)
+
+    async def run():
+        first = asyncio.ensure_future(gateway.achat(MESSAGES))
+        await asyncio.sleep(0.05)
+        with pytest.raises(LLMOverloadedError):
+            await gateway.achat(MESSAGES)
+        answer = await first
+        await gateway.aclose()
+        return answer
+    assert 'fraud detection' in asyncio.run(run())
+    assert gateway.stats()['outcomes'] == {'ok': 1, 'rejected': 1}
+
+def test_hedged_request_wins(start_stub):
+    # The first call is slow; the hedge started after 0.1s answers first
+    stub = start_stub([(1.0, 0.0), (1.0, 1.0)], slow_rate=0.5, slow_latency=2.0)
+    gateway = make_gateway(stub, max_concurrency=2, hedge_after=0.1)
+    assert 'fraud detection' in gateway.invoke(MESSAGES, timeout=1.0).content
+    stats = gateway.stats()
+    assert (stats['hedges'], stats['hedge_wins']) == (1, 1)
+    assert stub.requests == 2
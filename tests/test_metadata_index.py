@@ -0,0 +1,78 @@
+# tests/test_metadata_index.py
+
+import numpy as np
+import pytest
+from conftest import make_record
+from metadata_index import (
+    FilteredSearcher, build_metadata_index, load_metadata_index, save_metadata_index, validate_filters,
+)
+
+@pytest.mark.parametrize('filters', [
+    {'industry': 'Retail'},
+    {'industry': ['Retail', 'Banking & Financial Services'], 'role': 'CEO'},
+])
+def test_validate_filters_accepts_strings_and_lists_of_strings(filters):
+    assert validate_filters(filters) is filters
+
+@pytest.mark.parametrize('filters', [
+    ['industry'],
+    {'region': 'EU'},
+    {'industry': 5},
+    {'industry': ''},
+    {'industry': '   '},
+    {'industry': []},
+    {'industry': ['', 'retail']},
+    {'industry': ['retail', None]},
+    {'industry': {'name': 'retail'}},
+])
+def test_validate_filters_rejects_other_values(filters):
+    with pytest.raises(ValueError):
+        validate_filters(filters)
+
+def test_partition_key_is_order_and_case_insensitive():
+    first = FilteredSearcher.partition_key({'industry': ['Retail', 'Banking'], 'role': 'CEO'})
+    second = FilteredSearcher.partition_key({'role': ' ceo ', 'industry': ['banking', 'RETAIL']})
+    assert first == second
+    assert first != FilteredSearcher.partition_key({'industry': 'Retail'})
+
+def test_partition_key_ignores_non_string_values():
+    assert FilteredSearcher.partition_key({'industry': ['Retail', None, '']}) == (('industry', ('retail',)),)
+
+def test_filtered_search_returns_only_matching_records(encoder):
+    records = [
+        make_record('Fraud detection for card payments', industry='Banking'),
+        make_record('Demand forecasting for stores', industry='Retail'),
+        make_record('Fraud detection at the checkout', industry='Retail', role='CFO'),
+    ]
+    vectors = encoder.encode([record['content'] for record in records])
+    searcher = FilteredSearcher(build_metadata_index(records), vectors)
+    query = encoder.encode(['fraud detection'])
+
+    _, ids = searcher.search(query, {'industry': 'retail'}, k=3)
+    assert set(ids[0][ids[0] >= 0]) == {1, 2}
+    assert ids[0][0] == 2
+
+    _, ids = searcher.search(query, {'industry': 'retail', 'role': 'cfo'}, k=3)
+    assert list(ids[0]) == [2, -1, -1]
+
+    distances, ids = searcher.search(query, {'industry': 'pharma'}, k=2)
+    assert (ids == -1).all() and np.isinf(distances).all()
+
+def test_detect_filters_finds_industry_in_query():
+    records = [make_record('x', industry='Banking & Financial Services'), make_record('y', industry='Retail')]
+    searcher = FilteredSearcher(build_metadata_index(records), np.zeros((2, 4), dtype='float32'))
+    assert searcher.detect_filters('AI use cases in banking') == {'industry': ['banking & financial services']}
+    assert searcher.detect_filters('What is the weather?') == {}
+
+def test_stale_metadata_index_file_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'filters.json')
+    old = [make_record('a', industry='Retail'), make_record('b', industry='Retail'), make_record('c', industry='Banking')]
+    save_metadata_index(build_metadata_index(old), len(old), path)
+    assert load_metadata_index(path, old)['industry'] == {'retail': [0, 1], 'banking': [2]}
+    # A smaller corpus must not get posting lists with ids past its end
+    new = [make_record('d', industry='Banking')]
+    metadata_index = load_metadata_index(path, new)
+    assert metadata_index['industry'] == {'banking': [0]}
+    _, ids = FilteredSearcher(metadata_index, np.zeros((1, 4), dtype='float32')).search(
+        np.zeros((1, 4), dtype='float32'), {'industry': 'Retail'}, k=1)
+    assert ids.tolist() == [[-1]]
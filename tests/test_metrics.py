@@ -0,0 +1,40 @@
+# tests/test_metrics.py
+
+from metrics import MetricsRegistry, RequestTrace
+
+def test_prometheus_text_output():
+    registry = MetricsRegistry()
+    requests = registry.counter('pai_requests', 'Requests served.', ('route',))
+    sessions = registry.gauge('pai_sessions', 'Live sessions.')
+    latency = registry.histogram('pai_latency_seconds', 'Request latency.', buckets=(0.1, 1))
+    requests.inc(route='/chat')
+    requests.inc(2, route='/chat')
+    sessions.set(4)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    registry.add_collector(lambda: [('pai_cache_hits', 'counter', 'Cache hits.', [({'cache': 'a"b'}, 7)])])
+
+    assert registry.render().splitlines() == [
+        '# HELP pai_requests Requests served.',
+        '# TYPE pai_requests counter',
+        'pai_requests_total{route="/chat"} 3',
+        '# HELP pai_sessions Live sessions.',
+        '# TYPE pai_sessions gauge',
+        'pai_sessions 4',
+        '# HELP pai_latency_seconds Request latency.',
+        '# TYPE pai_latency_seconds histogram',
+        'pai_latency_seconds_bucket{le="0.1"} 1',
+        'pai_latency_seconds_bucket{le="1"} 2',
+        'pai_latency_seconds_bucket{le="+Inf"} 2',
+        'pai_latency_seconds_sum 0.55',
+        'pai_latency_seconds_count 2',
+        '# HELP pai_cache_hits Cache hits.',
+        '# TYPE pai_cache_hits counter',
+        'pai_cache_hits_total{cache="a\\"b"} 7',
+    ]
+
+def test_server_timing_header():
+    trace = RequestTrace()
+    trace.add('encode', 0.0021)
+    trace.add('encode', 0.001)
+    assert trace.server_timing().startswith('encode;dur=3.1')
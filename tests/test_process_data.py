@@ -0,0 +1,42 @@
+# tests/test_process_data.py
+
+import numpy as np
+import pytest
+
+pytest.importorskip('sentence_transformers')
+from process_data import collapse_saved_duplicates, hash_rows, iter_embeddings, save_embeddings
+from embedding_cache import RowHasher
+from embedding_store import load_embedding_store
+
+def data_entries(texts, industry='Retail'):
+    for position, text in enumerate(texts, 1):
+        yield {'content': text, 'metadata': {'sheet_name': 'S', 'row_index': position, 'sr_no': position, 'industry': industry}}
+
+def test_embeddings_are_saved_from_a_stream(tmp_path, encoder):
+    paths = [str(tmp_path / name) for name in ('e.jsonl', 'e.npy', 'e_meta.json')]
+    consumed = []
+    texts = [f"use case number {i}" for i in range(50)]
+    stream = iter_embeddings(data_entries(texts), encoder, batch_size=8)
+    hasher = RowHasher()
+
+    def watch(items):
+        for item in items:
+            consumed.append(item['content'])
+            yield item
+
+    assert save_embeddings(hash_rows(watch(stream), hasher), *paths) == 50
+    assert consumed == texts
+    assert len(hasher.hashes()['S']) == 50
+    vectors, records = load_embedding_store(*paths[1:])
+    assert np.allclose(vectors[3], encoder.encode(texts[3]))
+
+def test_collapse_saved_duplicates_rewrites_the_store(tmp_path, encoder):
+    paths = [str(tmp_path / name) for name in ('e.jsonl', 'e.npy', 'e_meta.json')]
+    entries = list(iter_embeddings(data_entries(['chatbot for service', 'demand forecasting']), encoder))
+    entries += list(iter_embeddings(data_entries(['chatbot for service'], industry='Banking'), encoder))
+    save_embeddings(entries, *paths)
+
+    assert collapse_saved_duplicates(0.97, *paths) == 2
+    vectors, records = load_embedding_store(*paths[1:])
+    assert vectors.shape[0] == 2
+    assert records[0]['metadata']['merged_rows'][0]['industry'] == 'Banking'
@@ -0,0 +1,60 @@
+# tests/test_prompt_builder.py
+
+from langchain_core.messages import AIMessage, HumanMessage
+from conftest import make_record
+from prompt_builder import PromptBuilder, TokenCounter
+
+class WordCounter(TokenCounter):
+    """One token per word, so budgets in the tests are easy to reason about."""
+
+    def __init__(self):
+        self._encoding = None
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return ' '.join(text.split()[:max(max_tokens, 0)])
+
+def record(content, title):
+    return {'content': content, 'metadata': {**make_record(content)['metadata'], 'title_of_use_case': title}}
+
+CONTEXT = [record('Card payments are scored by a fraud model.', 'Fraud detection')]
+
+def test_context_and_history_fit_the_budget():
+    builder = PromptBuilder('system prompt', token_budget=200, context_budget=100, counter=WordCounter())
+    history = [HumanMessage(content='hi'), AIMessage(content='hello')]
+    messages, usage = builder.build('fraud detection?', history, CONTEXT)
+    assert 'Card payments are scored' in messages[0].content
+    assert messages[1:3] == history
+    assert usage['context_blocks'] == 1
+    assert not usage['user_message_truncated']
+    assert usage['prompt_tokens'] <= usage['token_budget']
+
+def test_long_user_message_keeps_the_context():
+    builder = PromptBuilder('system prompt', token_budget=60, context_budget=30, counter=WordCounter())
+    long_message = ' '.join(['word'] * 500)
+    history = [HumanMessage(content='hi'), AIMessage(content='hello')]
+    messages, usage = builder.build(long_message, history, CONTEXT)
+    assert usage['context_blocks'] == 1
+    assert 'Card payments are scored' in messages[0].content
+    assert usage['user_message_truncated']
+    assert len(messages[-1].content.split()) < 500
+    assert usage['history_messages'] == 0
+    assert usage['prompt_tokens'] <= usage['token_budget']
+
+def test_budget_smaller_than_system_prompt_never_goes_negative():
+    builder = PromptBuilder('a long system prompt with many words', token_budget=5, context_budget=30, counter=WordCounter())
+    _, usage = builder.build('fraud', (), CONTEXT)
+    assert usage['context_tokens'] >= 0
+    assert usage['context_blocks'] == 0
+
+def test_approximate_truncate_stays_within_limit():
+    counter = TokenCounter()
+    counter._encoding = None
+    text = 'Fraud detection, for card payments: scored in real time.'
+    for limit in range(0, counter.count(text) + 2):
+        prefix = counter.truncate(text, limit)
+        assert text.startswith(prefix)
+        assert counter.count(prefix) <= limit
+    assert counter.truncate(text, counter.count(text)) == text
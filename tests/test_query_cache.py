@@ -0,0 +1,48 @@
+# tests/test_query_cache.py
+
+from query_cache import QueryCache, normalize_query
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = QueryCache(max_size=4, ttl=10, clock=clock)
+    cache.put('fraud', 1)
+    clock.now = 9.9
+    assert cache.get('fraud') == 1
+    clock.now = 10.0
+    assert cache.get('fraud') is None
+    assert len(cache) == 0
+    assert cache.stats()['expirations'] == 1
+
+def test_no_ttl_never_expires():
+    clock = FakeClock()
+    cache = QueryCache(max_size=4, ttl=None, clock=clock)
+    cache.put('fraud', 1)
+    clock.now = 1e9
+    assert cache.get('fraud') == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_size=2, ttl=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert (stats['hits'], stats['misses']) == (3, 1)
+
+def test_zero_size_disables_caching():
+    cache = QueryCache(max_size=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+
+def test_normalize_query():
+    assert normalize_query('  Fraud \n Detection ') == 'fraud detection'
@@ -0,0 +1,39 @@
+# tests/test_response_format.py
+
+import random
+from response_format import NumberedListStreamFormatter, format_numbered_lists
+
+RESPONSE = (
+    "Here are some AI use cases:\n"
+    "1.   Fraud detection for card payments.\n"
+    "2.\tDemand forecasting in 2024.\n"
+    "10.  Drug discovery.\n"
+    "3.5 million rows were scored.\n"
+    "Version 2. is out\n"
+    "12"
+)
+
+def stream(chunks):
+    formatter = NumberedListStreamFormatter()
+    return ''.join(formatter.feed(chunk) for chunk in chunks) + formatter.flush()
+
+def test_format_numbered_lists():
+    assert format_numbered_lists("1.    Fraud\n2. Demand\nno list") == "1. Fraud\n2. Demand\nno list"
+
+def test_stream_matches_whole_text_for_any_chunking():
+    expected = format_numbered_lists(RESPONSE)
+    assert stream([RESPONSE]) == expected
+    assert stream(list(RESPONSE)) == expected
+    rng = random.Random(0)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(RESPONSE)), rng.randint(1, 12)))
+        chunks = [RESPONSE[start:end] for start, end in zip([0, *cuts], [*cuts, len(RESPONSE)])]
+        assert stream(chunks) == expected
+
+def test_plain_text_is_released_immediately():
+    formatter = NumberedListStreamFormatter()
+    assert formatter.feed('Hello') == 'Hello'
+    assert formatter.feed(' world\n1') == ' world\n'
+    assert formatter.feed('.  ') == ''
+    assert formatter.feed('Fraud') == '1. Fraud'
+    assert formatter.flush() == ''
@@ -0,0 +1,66 @@
+# tests/test_retrieval.py
+
+import faiss
+from conftest import make_record
+from metadata_index import FilteredSearcher, build_metadata_index
+from retrieval import Retriever
+
+RECORDS = [
+    make_record('Fraud detection for card payments', industry='Banking'),
+    make_record('Demand forecasting for stores', industry='Retail'),
+    make_record('Drug discovery with molecule screening', industry='Pharma'),
+]
+
+def make_retriever(encoder, detect_filters=False):
+    vectors = encoder.encode([record['content'] for record in RECORDS]).astype('float32')
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    filtered_searcher = FilteredSearcher(build_metadata_index(RECORDS), vectors)
+    retriever = Retriever(index, RECORDS, encoder, filtered_searcher=filtered_searcher, detect_filters=detect_filters)
+    encoder.calls = 0
+    return retriever
+
+def test_search_caches_results(encoder):
+    retriever = make_retriever(encoder)
+    first = retriever.search('fraud detection', k=2)
+    second = retriever.search('  Fraud   Detection ', k=2)
+    assert encoder.calls == 1
+    assert second is first
+    assert first[1][0] == 0
+
+def test_detected_filter_fallback_encodes_once(encoder):
+    retriever = make_retriever(encoder, detect_filters=True)
+    # "pharma" narrows the search to the pharma record, which is not relevant, so the whole corpus is searched
+    _, ids = retriever.relevant_ids('pharma fraud detection card payments', k=2, threshold=0.9)
+    assert ids == [0]
+    assert encoder.calls == 1
+
+def test_detected_filter_hit_stays_in_partition(encoder):
+    retriever = make_retriever(encoder, detect_filters=True)
+    _, ids = retriever.relevant_ids('pharma drug discovery', k=3, threshold=1.2)
+    assert ids == [2]
+
+class CountingIndex:
+    def __init__(self, index):
+        self.index = index
+        self.searches = []
+
+    def search(self, queries, k):
+        self.searches.append(len(queries))
+        return self.index.search(queries, k)
+
+def test_search_queries_encodes_and_searches_in_one_batch(encoder):
+    retriever = make_retriever(encoder, detect_filters=True)
+    retriever.index = CountingIndex(retriever.index)
+    queries = ['fraud detection card payments', 'demand forecasting for stores', 'pharma fraud detection card payments']
+    expected = [make_retriever(encoder, detect_filters=True).relevant_ids(query, k=2, threshold=0.9)[1] for query in queries]
+    encoder.calls = 0
+
+    assert retriever.search_queries(queries + queries[:1], k=2) == 3
+    assert encoder.calls == 1
+    assert retriever.index.searches == [3]
+    # Threshold, detected filters and their fallback are applied per query to the cached results
+    assert [retriever.relevant_ids(query, k=2, threshold=0.9)[1] for query in queries] == expected
+    assert expected[2] == [0]
+    assert encoder.calls == 1
+    assert retriever.index.searches == [3]
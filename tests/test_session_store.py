@@ -0,0 +1,106 @@
+# tests/test_session_store.py
+
+import sqlite3
+from session_store import SessionStore
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def turn(store, session_id, user, answer):
+    session = store.get(session_id)
+    with session.lock:
+        store.refresh(session)
+        session.memory.chat_memory.add_user_message(user)
+        session.memory.chat_memory.add_ai_message(answer)
+        store.save(session)
+    return session
+
+def contents(session):
+    return [message.content for message in session.messages]
+
+def test_sessions_are_isolated_and_capped():
+    store = SessionStore(max_messages=4)
+    turn(store, 'a', 'q1', 'a1')
+    turn(store, 'a', 'q2', 'a2')
+    session = turn(store, 'a', 'q3', 'a3')
+    assert contents(session) == ['q2', 'a2', 'q3', 'a3']
+    assert store.get('b').messages == []
+
+def test_lru_and_idle_eviction():
+    clock = Clock()
+    store = SessionStore(max_sessions=2, idle_ttl=60, clock=clock)
+    first = store.get('a')
+    store.get('b')
+    store.get('c')
+    assert store.stats()['sessions'] == 2 and store.get('a') is not first
+    clock.now += 61
+    assert store.get('a').messages == [] and store.stats()['sessions'] == 1
+
+def test_workers_append_to_each_others_turns(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite')
+    worker_a, worker_b = SessionStore(persist_path=path), SessionStore(persist_path=path)
+    turn(worker_a, 's', 'q1', 'a1')
+    stale = worker_b.get('s')
+    turn(worker_a, 's', 'q2', 'a2')
+
+    # Worker B's copy is behind; its turn is appended to the stored one, not written over it
+    with stale.lock:
+        stale.memory.chat_memory.add_user_message('q3')
+        stale.memory.chat_memory.add_ai_message('a3')
+        worker_b.save(stale)
+    assert contents(stale) == ['q1', 'a1', 'q2', 'a2', 'q3', 'a3']
+    assert contents(turn(worker_a, 's', 'q4', 'a4')) == ['q1', 'a1', 'q2', 'a2', 'q3', 'a3', 'q4', 'a4']
+
+def test_refresh_picks_up_another_workers_turn(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite')
+    worker_a, worker_b = SessionStore(persist_path=path), SessionStore(persist_path=path)
+    turn(worker_a, 's', 'q1', 'a1')
+    session = worker_b.get('s')
+    turn(worker_a, 's', 'q2', 'a2')
+    with session.lock:
+        assert worker_b.refresh(session)
+        assert not worker_b.refresh(session)
+    assert contents(session) == ['q1', 'a1', 'q2', 'a2']
+
+def test_reset_drops_a_turn_in_flight_in_another_worker(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite')
+    worker_a, worker_b = SessionStore(persist_path=path), SessionStore(persist_path=path)
+    turn(worker_a, 's', 'q1', 'a1')
+    in_flight = worker_b.get('s')
+    worker_a.reset('s')
+    with in_flight.lock:
+        in_flight.memory.chat_memory.add_user_message('q2')
+        in_flight.memory.chat_memory.add_ai_message('a2')
+        worker_b.save(in_flight)
+    assert in_flight.messages == []
+    assert SessionStore(persist_path=path).get('s').messages == []
+    # The session is usable again after the reset
+    assert contents(turn(worker_b, 's', 'q3', 'a3')) == ['q3', 'a3']
+    assert contents(SessionStore(persist_path=path).get('s')) == ['q3', 'a3']
+
+def test_files_without_version_columns_are_upgraded(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite')
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE sessions (session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)")
+    db.commit()
+    db.close()
+    store = SessionStore(persist_path=path)
+    assert contents(turn(store, 's', 'q1', 'a1')) == ['q1', 'a1']
+
+def test_expired_rows_are_purged_on_schedule(tmp_path):
+    clock = Clock()
+    path = str(tmp_path / 'sessions.sqlite')
+    store = SessionStore(idle_ttl=60, persist_path=path, purge_interval=30, clock=clock)
+    turn(store, 'old', 'q1', 'a1')
+    store.reset('gone')
+    clock.now += 40
+    turn(store, 'recent', 'q2', 'a2')  # the first purge runs here, before anything expired
+    clock.now += 40
+    store.get('recent')  # 'old' and the 'gone' tombstone are now 80s idle
+    db = sqlite3.connect(path)
+    assert [row[0] for row in db.execute("SELECT session_id FROM sessions")] == ['recent']
+    db.close()
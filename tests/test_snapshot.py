@@ -0,0 +1,65 @@
+# tests/test_snapshot.py
+
+import os
+import faiss
+import pytest
+from conftest import make_record
+from query_cache import QueryCache
+from retrieval import Retriever
+from snapshot import CorpusSnapshot, SnapshotManager, SnapshotMismatchError, write_snapshot_marker
+
+RECORDS = [make_record('Fraud detection for card payments'), make_record('Demand forecasting for stores')]
+
+def make_loader(encoder):
+    vectors = encoder.encode([record['content'] for record in RECORDS]).astype('float32')
+
+    def loader(version):
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        retriever = Retriever(index, RECORDS, encoder, query_cache=QueryCache())
+        return CorpusSnapshot(version, RECORDS, vectors, index, retriever)
+    return loader
+
+def test_counters_survive_reloads(encoder, tmp_path):
+    marker = tmp_path / 'snapshot.json'
+    manager = SnapshotManager(make_loader(encoder), marker_file=str(marker), poll_interval=0, retire_delay=0)
+    manager.current.retriever.search('fraud detection', k=1)
+    manager.current.retriever.search('fraud detection', k=1)
+    assert manager.counters()['hits', 'query'] == 1
+    assert manager.counters()['misses', 'query'] == 1
+
+    write_snapshot_marker(str(marker))
+    manager.reload(wait=True)
+    # The new snapshot starts with an empty cache, the process-level totals don't
+    assert manager.current.retriever.query_cache.stats()['misses'] == 0
+    manager.current.retriever.search('demand forecasting', k=1)
+    totals = manager.counters()
+    assert totals['hits', 'query'] == 1
+    assert totals['misses', 'query'] == 2
+
+def write_artifacts(directory, content):
+    paths = [str(directory / name) for name in ('embeddings.npy', 'embeddings.index')]
+    for path in paths:
+        with open(path, 'w') as f:
+            f.write(content)
+    return paths
+
+def test_artifacts_replaced_after_the_marker_are_not_loaded(encoder, tmp_path):
+    marker = str(tmp_path / 'snapshot.json')
+    paths = write_artifacts(tmp_path, 'run 1')
+    first = write_snapshot_marker(marker, artifacts=paths)
+    manager = SnapshotManager(make_loader(encoder), marker_file=marker, poll_interval=0, startup_timeout=0)
+    assert manager.current.version == first
+
+    # The next ingestion has replaced the store but not yet published its marker
+    write_artifacts(tmp_path, 'run 2, longer')
+    manager.reload(wait=True)
+    assert manager.current.version == first
+    assert manager.failures == 1
+    with pytest.raises(SnapshotMismatchError):
+        SnapshotManager(make_loader(encoder), marker_file=marker, poll_interval=0, startup_timeout=0)
+
+    os.remove(paths[1])
+    second = write_snapshot_marker(marker, artifacts=paths[:1])
+    manager.reload(wait=True)
+    assert manager.current.version == second
@@ -0,0 +1,45 @@
+# tests/test_suggestion_graph.py
+
+import numpy as np
+from conftest import make_record
+from suggestion_graph import SuggestionIndex, build_suggestion_graph
+
+def titled(content, title):
+    record = make_record(content)
+    record['metadata']['title_of_use_case'] = title
+    return record
+
+RECORDS = [
+    titled('Fraud detection for card payments', 'Fraud detection'),
+    titled('Scoring card payments in real time', 'Fraud detection'),
+    titled('Demand forecasting for stores', 'Demand forecasting'),
+    titled('Drug discovery with molecule screening', 'Drug discovery'),
+    make_record('Untitled chunk about chatbots'),
+]
+
+class RowReads:
+    """Corpus matrix that records which rows are read."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.rows = set()
+
+    def __getitem__(self, ids):
+        self.rows.update(np.atleast_1d(np.arange(len(self.vectors))[ids]).tolist())
+        return self.vectors[ids]
+
+def test_title_index_uses_the_saved_title_vectors(encoder):
+    vectors = encoder.encode([record['content'] for record in RECORDS]).astype('float32')
+    graph = build_suggestion_graph(vectors, RECORDS)
+    assert [title['title'] for title in graph['titles']] == ['Fraud detection', 'Demand forecasting', 'Drug discovery']
+
+    index = SuggestionIndex(graph, RECORDS)
+    query = encoder.encode('demand forecasting stores')
+    assert index.suggest('something new', query)[0] == 'Demand forecasting for stores'
+
+    # Tables written before title vectors were saved read only the rows of titled chunks
+    legacy = {**graph, 'titles': [{key: value for key, value in title.items() if key != 'vector'} for title in graph['titles']]}
+    corpus = RowReads(vectors)
+    rebuilt = SuggestionIndex(legacy, RECORDS, corpus)
+    np.testing.assert_allclose(rebuilt.title_index.matrix, index.title_index.matrix, atol=1e-6)
+    assert corpus.rows == {0, 1, 2, 3}
@@ -1,9 +1,140 @@
 # utils.py
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+# Similarity metrics supported by ExactSearch
+METRICS = ('l2', 'cosine')
+
+def top_k(scores, k, largest=True):
+    """
+    Selects the k best scores of every row without sorting the whole row.
+
+    :param scores: Matrix of shape (n, m).
+    :param k: Number of entries to select (at most m).
+    :param largest: Select the largest scores (similarities) instead of the smallest (distances).
+    :return: Tuple of (selected scores, column positions), both of shape (n, k) and best first.
+    """
+    keys = -scores if largest else scores
+    if k < scores.shape[1]:
+        positions = np.argpartition(keys, k - 1, axis=1)[:, :k]
+    else:
+        positions = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(np.take_along_axis(keys, positions, axis=1), axis=1, kind='stable')
+    positions = np.take_along_axis(positions, order, axis=1)
+    return np.take_along_axis(scores, positions, axis=1), positions
+
+class ExactSearch:
+    """
+    Exact nearest-neighbour search over an in-memory matrix with NumPy only.
+
+    The corpus is kept as one contiguous float32 matrix (unit rows for cosine,
+    with precomputed squared norms for L2). Queries are scored against blocks
+    of ``chunk_size`` rows in parallel threads, each block keeps only its own
+    top-k, and the blocks' candidates are merged, so neither the full score
+    matrix nor a full sort is ever needed. ``search`` follows the FAISS
+    convention (squared L2 distances ascending like IndexFlatL2, similarities
+    descending like IndexFlatIP, -1 padded ids), so it can stand in for a flat
+    FAISS index or check one.
+    """
+
+    def __init__(self, vectors, metric='l2', chunk_size=16384, num_threads=None):
+        """
+        :param vectors: Corpus matrix of shape (n, dim).
+        :param metric: 'l2' (squared Euclidean distance) or 'cosine' (cosine similarity).
+        :param chunk_size: Corpus rows scored per matrix product.
+        :param num_threads: Threads scoring blocks in parallel (defaults to the CPU count).
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}'. Expected one of {list(METRICS)}.")
+        self.metric = metric
+        self.chunk_size = chunk_size
+        self.num_threads = num_threads or os.cpu_count() or 1
+        matrix = np.array(vectors, dtype='float32', order='C', ndmin=2)
+        if metric == 'cosine':
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms > 0, norms, 1)
+            self.squared_norms = None
+        else:
+            self.squared_norms = np.einsum('ij,ij->i', matrix, matrix)
+        self.matrix = matrix
+        self.ntotal, self.d = matrix.shape
+
+    def _prepare_queries(self, queries):
+        queries = np.array(queries, dtype='float32', order='C', ndmin=2)
+        if queries.shape[1] != self.d:
+            raise ValueError(f"Queries have dimension {queries.shape[1]}, expected {self.d}.")
+        if self.metric == 'cosine':
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries /= np.where(norms > 0, norms, 1)
+        return queries
+
+    def _score_block(self, queries, start, stop):
+        products = queries @ self.matrix[start:stop].T
+        if self.metric == 'cosine':
+            return products
+        # |q - x|^2 = |q|^2 - 2 q.x + |x|^2, clamped against rounding below zero
+        distances = self.squared_norms[start:stop] - 2 * products
+        distances += np.einsum('ij,ij->i', queries, queries)[:, None]
+        return np.maximum(distances, 0, out=distances)
+
+    def _search_block(self, queries, start, k):
+        stop = min(start + self.chunk_size, self.ntotal)
+        scores, positions = top_k(self._score_block(queries, start, stop), min(k, stop - start), self.metric == 'cosine')
+        return scores, positions + start
+
+    def search(self, queries, k=5):
+        """
+        Finds the k nearest corpus rows of each query.
+
+        :param queries: Query vector or matrix of shape (n, dim).
+        :param k: Number of neighbours per query.
+        :return: Tuple of (scores, ids) of shape (n, k), best first and -1 padded beyond the corpus size.
+        """
+        queries = self._prepare_queries(queries)
+        largest = self.metric == 'cosine'
+        starts = range(0, self.ntotal, self.chunk_size)
+        if len(starts) > 1 and self.num_threads > 1:
+            with ThreadPoolExecutor(max_workers=min(self.num_threads, len(starts))) as executor:
+                blocks = list(executor.map(lambda start: self._search_block(queries, start, k), starts))
+        else:
+            blocks = [self._search_block(queries, start, k) for start in starts]
+
+        if len(blocks) == 1:
+            scores, ids = blocks[0]
+        else:
+            candidate_scores = np.concatenate([block[0] for block in blocks], axis=1)
+            candidate_ids = np.concatenate([block[1] for block in blocks], axis=1)
+            scores, positions = top_k(candidate_scores, min(k, candidate_scores.shape[1]), largest)
+            ids = np.take_along_axis(candidate_ids, positions, axis=1)
+
+        missing = k - ids.shape[1]
+        if missing > 0:
+            fill = -np.inf if largest else np.inf
+            scores = np.pad(scores, ((0, 0), (0, missing)), constant_values=fill)
+            ids = np.pad(ids, ((0, 0), (0, missing)), constant_values=-1)
+        return scores.astype('float32', copy=False), ids.astype('int64', copy=False)
+
+    def similarities(self, query):
+        """
+        Scores one query against every corpus row, in corpus order.
+
+        :param query: Query vector.
+        :return: 1-D array of cosine similarities or squared L2 distances.
+        """
+        return self._score_block(self._prepare_queries(query), 0, self.ntotal)[0]
 
 def calculate_similarity(query_embedding, data_embeddings):
-    query_embedding = np.array(query_embedding).reshape(1, -1)
-    data_embeddings = np.array([item['embedding'] for item in data_embeddings])
-    similarities = cosine_similarity(query_embedding, data_embeddings)[0]
-    return similarities
+    """
+    Computes the cosine similarity of a query with every data entry.
+
+    Kept for callers of the old helper; build an ExactSearch once and call
+    ``search`` instead of calling this per query.
+
+    :param query_embedding: Query vector.
+    :param data_embeddings: List of data entries with an 'embedding', or a matrix of vectors.
+    :return: 1-D array of cosine similarities, in the order of the data entries.
+    """
+    if len(data_embeddings) and isinstance(data_embeddings[0], dict):
+        data_embeddings = [item['embedding'] for item in data_embeddings]
+    return ExactSearch(data_embeddings, metric='cosine').similarities(query_embedding)
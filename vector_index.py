@@ -0,0 +1,338 @@
+# vector_index.py
+
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import faiss
+
+# Default file names of the persisted search index written by process_data.py
+INDEX_FILE = 'embeddings.index'
+INDEX_CONFIG_FILE = 'embeddings_index.json'
+
+# Supported index types, vector storage modes and their default tuning parameters
+INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+STORAGE_TYPES = ('float32', 'float16', 'int8', 'pq')
+DEFAULT_INDEX_CONFIG = {
+    'index_type': 'flat',
+    'storage': 'float32',   # how vectors are encoded inside the index
+    'pq_m': 48,             # PQ: sub-quantizers per vector (must divide the dimension)
+    'pq_nbits': 8,          # PQ: bits per sub-quantizer code
+    'nlist': 100,           # IVF: number of coarse clusters
+    'nprobe': 10,           # IVF: clusters visited per query
+    'hnsw_m': 32,           # HNSW: neighbours per graph node
+    'ef_construction': 40,  # HNSW: candidate list size while building
+    'ef_search': 64,        # HNSW: candidate list size while searching
+}
+
+# FAISS wants roughly this many training points per IVF cluster
+MIN_POINTS_PER_CENTROID = 39
+
+def make_index_config(**overrides):
+    """
+    Builds a complete index configuration from the defaults and the given overrides.
+
+    :param overrides: Configuration values to change; None values are ignored.
+    :return: Dictionary with every configuration key.
+    """
+    config = dict(DEFAULT_INDEX_CONFIG)
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    if config['index_type'] not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{config['index_type']}'. Expected one of {INDEX_TYPES}.")
+    if config['storage'] not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage '{config['storage']}'. Expected one of {STORAGE_TYPES}.")
+    return config
+
+def storage_factory_string(config, dim, num_vectors):
+    """
+    Translates the storage mode into the vector encoding part of a factory string.
+
+    :param config: Index configuration from make_index_config.
+    :param dim: Vector dimension.
+    :param num_vectors: Number of vectors the index will be trained on.
+    :return: Encoding such as 'Flat', 'SQfp16', 'SQ8' or 'PQ48x8'.
+    """
+    storage = config['storage']
+    if storage == 'float16':
+        return 'SQfp16'
+    if storage == 'int8':
+        return 'SQ8'
+    if storage == 'pq':
+        if dim % config['pq_m']:
+            raise ValueError(f"pq_m={config['pq_m']} does not divide the embedding dimension {dim}.")
+        # Each PQ codebook needs about MIN_POINTS_PER_CENTROID training points per centroid
+        max_nbits = int(np.log2(max(num_vectors // MIN_POINTS_PER_CENTROID, 2)))
+        nbits = max(1, min(config['pq_nbits'], max_nbits))
+        if nbits != config['pq_nbits']:
+            logging.warning(f"Reducing pq_nbits from {config['pq_nbits']} to {nbits} for {num_vectors} vectors.")
+            config['pq_nbits'] = nbits
+        return f"PQ{config['pq_m']}x{nbits}"
+    return 'Flat'
+
+def index_factory_string(config, dim, num_vectors):
+    """
+    Translates an index configuration into a faiss.index_factory description.
+
+    :param config: Index configuration from make_index_config.
+    :param dim: Vector dimension.
+    :param num_vectors: Number of vectors the index will be trained on.
+    :return: Factory string such as 'Flat', 'IVF100,SQ8' or 'HNSW32_SQfp16'.
+    """
+    storage = storage_factory_string(config, dim, num_vectors)
+    if config['index_type'] == 'ivf':
+        nlist = max(1, min(config['nlist'], num_vectors // MIN_POINTS_PER_CENTROID))
+        if nlist != config['nlist']:
+            logging.warning(f"Reducing nlist from {config['nlist']} to {nlist} for {num_vectors} vectors.")
+            config['nlist'] = nlist
+        return f"IVF{nlist},{storage}"
+    if config['index_type'] == 'hnsw':
+        return f"HNSW{config['hnsw_m']}" if storage == 'Flat' else f"HNSW{config['hnsw_m']}_{storage}"
+    return storage
+
+def apply_search_params(index, config):
+    """
+    Sets the query-time parameters (IVF nprobe, HNSW efSearch) on an index.
+
+    :param index: FAISS index.
+    :param config: Index configuration from make_index_config.
+    """
+    try:
+        faiss.extract_index_ivf(index).nprobe = config['nprobe']
+    except RuntimeError:
+        pass
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = config['ef_search']
+
+def build_index(vectors, config=None):
+    """
+    Builds, trains and fills a FAISS L2 index for the given vectors.
+
+    :param vectors: float32 matrix of shape (n, dim).
+    :param config: Index configuration from make_index_config (defaults to flat).
+    :return: Tuple of (FAISS index, configuration actually used).
+    """
+    config = make_index_config(**(config or {}))
+    factory = index_factory_string(config, vectors.shape[1], vectors.shape[0])
+    index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_L2)
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efConstruction = config['ef_construction']
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index, config)
+    config['factory'] = factory
+    logging.info(f"Built '{factory}' index with {index.ntotal} vectors.")
+    return index, config
+
+def save_index(index, config, index_file=INDEX_FILE, config_file=INDEX_CONFIG_FILE):
+    """
+    Writes a FAISS index and its configuration to disk.
+
+    :param index: FAISS index.
+    :param config: Configuration used to build the index.
+    :param index_file: Path of the FAISS index file.
+    :param config_file: Path of the JSON configuration file.
+    """
+    # Renamed into place so servers that memory-map the old index keep a valid copy
+    faiss.write_index(index, f"{index_file}.tmp")
+    with open(f"{config_file}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(dict(config, ntotal=int(index.ntotal), dim=int(index.d)), f, indent=2)
+    os.replace(f"{index_file}.tmp", index_file)
+    os.replace(f"{config_file}.tmp", config_file)
+    logging.info(f"Saved search index to '{index_file}'.")
+
+def load_index(index_file=INDEX_FILE, config_file=INDEX_CONFIG_FILE, mmap=True):
+    """
+    Loads a persisted FAISS index ready to search.
+
+    With ``mmap`` the index data is memory-mapped read-only, so worker processes
+    share it through the page cache instead of each holding a private copy.
+
+    :param index_file: Path of the FAISS index file.
+    :param config_file: Path of the JSON configuration file.
+    :param mmap: Memory-map the index data when FAISS supports it.
+    :return: Tuple of (FAISS index, configuration).
+    """
+    if not os.path.exists(index_file):
+        raise FileNotFoundError(index_file)
+    index = None
+    if mmap:
+        try:
+            flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+            index = faiss.read_index(index_file, flags)
+        except RuntimeError as e:
+            logging.info(f"Memory-mapping '{index_file}' is not supported ({e}); reading it into memory.")
+    if index is None:
+        index = faiss.read_index(index_file)
+
+    config = make_index_config()
+    if os.path.exists(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    apply_search_params(index, config)
+    return index, config
+
+def load_search_index(vectors, index_file=INDEX_FILE, config_file=INDEX_CONFIG_FILE):
+    """
+    Loads the persisted search index, building a flat index in memory if there is none.
+
+    :param vectors: float32 matrix the index must cover.
+    :param index_file: Path of the FAISS index file.
+    :param config_file: Path of the JSON configuration file.
+    :return: FAISS index.
+    """
+    try:
+        index, config = load_index(index_file, config_file)
+    except FileNotFoundError:
+        logging.info(f"Search index '{index_file}' not found, building a flat index.")
+        return build_index(vectors)[0]
+    if index.ntotal != vectors.shape[0] or index.d != vectors.shape[1]:
+        logging.warning(
+            f"Search index '{index_file}' ({index.ntotal} x {index.d}) does not match the embeddings "
+            f"({vectors.shape[0]} x {vectors.shape[1]}); building a flat index instead."
+        )
+        return build_index(vectors)[0]
+    logging.info(f"Loaded '{config.get('factory', config['index_type'])}' search index from '{index_file}'.")
+    return index
+
+def index_memory_bytes(index):
+    """
+    Returns the number of bytes an index occupies once loaded.
+
+    :param index: FAISS index.
+    :return: Size of the serialized index in bytes.
+    """
+    return int(faiss.serialize_index(index).size)
+
+def make_eval_queries(vectors, num_queries=200, seed=0):
+    """
+    Creates synthetic queries that fall between corpus vectors.
+
+    Each query is the midpoint of two random corpus vectors, so its neighbours
+    are not trivially itself.
+
+    :param vectors: float32 matrix of the corpus.
+    :param num_queries: Number of queries to create.
+    :param seed: Random seed for reproducible reports.
+    :return: float32 matrix of shape (num_queries, dim).
+    """
+    rng = np.random.default_rng(seed)
+    pairs = rng.integers(0, vectors.shape[0], size=(num_queries, 2))
+    return np.ascontiguousarray((vectors[pairs[:, 0]] + vectors[pairs[:, 1]]) / 2, dtype='float32')
+
+def measure_search(index, queries, k):
+    """
+    Runs queries one at a time, like the server does, and times each search.
+
+    :param index: FAISS index.
+    :param queries: float32 matrix of queries.
+    :param k: Number of neighbours per query.
+    :return: Tuple of (ids matrix, per-query latencies in milliseconds).
+    """
+    ids = np.empty((queries.shape[0], k), dtype='int64')
+    latencies = np.empty(queries.shape[0])
+    for i in range(queries.shape[0]):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        ids[i] = found[0]
+    return ids, latencies
+
+def evaluate_index(index, vectors, k=5, queries=None, reference=None):
+    """
+    Measures recall@k and latency of an index against exact flat search.
+
+    :param index: FAISS index to evaluate.
+    :param vectors: float32 matrix the index was built from.
+    :param k: Number of neighbours per query.
+    :param queries: Optional query matrix (defaults to make_eval_queries).
+    :param reference: Optional (ids, latencies) of the flat index, to avoid recomputing it.
+    :return: Dictionary with recall, latency and memory statistics.
+    """
+    if queries is None:
+        queries = make_eval_queries(vectors)
+    if reference is None:
+        reference = measure_search(build_index(vectors)[0], queries, k)
+    exact_ids, flat_latencies = reference
+    ids, latencies = measure_search(index, queries, k)
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(ids, exact_ids))
+    memory_bytes = index_memory_bytes(index)
+    return {
+        'recall_at_k': hits / exact_ids.size,
+        'memory_bytes': memory_bytes,
+        'bytes_per_vector': memory_bytes / max(index.ntotal, 1),
+        'float32_bytes': int(vectors.shape[0] * vectors.shape[1] * 4),
+        'k': k,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'flat_latency_ms_p50': float(np.percentile(flat_latencies, 50)),
+    }
+
+def recall_latency_report(vectors, configs, k=5, num_queries=200):
+    """
+    Builds each configuration and reports its recall and latency against the flat index.
+
+    :param vectors: float32 matrix of the corpus.
+    :param configs: List of index configuration overrides.
+    :param k: Number of neighbours per query.
+    :param num_queries: Number of synthetic queries.
+    :return: List of report rows, one per configuration.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    queries = make_eval_queries(vectors, num_queries)
+    reference = measure_search(build_index(vectors)[0], queries, k)
+    rows = []
+    for overrides in configs:
+        start = time.perf_counter()
+        index, config = build_index(vectors, overrides)
+        build_seconds = time.perf_counter() - start
+        row = {'config': config, 'build_seconds': build_seconds}
+        row.update(evaluate_index(index, vectors, k, queries, reference))
+        rows.append(row)
+        logging.info(
+            f"{config['factory']:<18} nprobe={config['nprobe']:<4} ef_search={config['ef_search']:<4} "
+            f"recall@{k}={row['recall_at_k']:.3f} p50={row['latency_ms_p50']:.3f}ms "
+            f"p99={row['latency_ms_p99']:.3f}ms (flat p50={row['flat_latency_ms_p50']:.3f}ms) "
+            f"memory={row['memory_bytes'] / 2**20:.2f}MiB ({row['bytes_per_vector']:.0f} B/vector)"
+        )
+    return rows
+
+def default_sweep():
+    """
+    Returns the parameter sweep used by the command line report.
+
+    :return: List of index configuration overrides.
+    """
+    sweep = [{'index_type': 'flat'}]
+    sweep += [{'index_type': 'ivf', 'nprobe': nprobe} for nprobe in (1, 4, 10, 32)]
+    sweep += [{'index_type': 'hnsw', 'ef_search': ef} for ef in (16, 32, 64, 128)]
+    sweep += [{'index_type': 'flat', 'storage': storage} for storage in ('float16', 'int8', 'pq')]
+    sweep += [{'index_type': 'ivf', 'storage': storage} for storage in ('int8', 'pq')]
+    sweep += [{'index_type': 'hnsw', 'storage': 'int8'}]
+    return sweep
+
+def main(argv=None):
+    """
+    Prints a recall, latency and memory report for the index and storage types on the current embeddings.
+
+    :param argv: Optional list of command line arguments.
+    """
+    from embedding_store import load_embeddings
+
+    parser = argparse.ArgumentParser(description="Recall, latency and memory report for the search index types.")
+    parser.add_argument('--k', type=int, default=5, help="Number of neighbours per query.")
+    parser.add_argument('--queries', type=int, default=200, help="Number of synthetic queries.")
+    parser.add_argument('--output', default='index_report.json', help="Where to write the JSON report.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    vectors, _ = load_embeddings()
+    rows = recall_latency_report(vectors, default_sweep(), args.k, args.queries)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=2)
+    logging.info(f"Wrote report to '{args.output}'.")
+
+if __name__ == "__main__":
+    main()